@@ -0,0 +1,177 @@
+import asyncio
+import csv
+import json
+from dataclasses import asdict, dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import Iterator
+
+from pydantic import ValidationError
+from sqlalchemy import insert, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.utils import hash_password
+from ..db.models import User
+from .schemas import UserCreate
+
+
+@dataclass
+class ImportReport:
+    inserted: int = 0
+    conflicts: list[dict] = field(default_factory=list)
+    invalid: list[dict] = field(default_factory=list)
+
+    def model_dump(self) -> dict:
+        return asdict(self)
+
+
+def iter_user_records(path: Path, report: ImportReport) -> Iterator[tuple[int, dict]]:
+    """
+    Streams user records from a CSV file with a header row, or from a JSONL file.
+
+    JSONL lines that are not valid JSON are recorded as invalid in `report` and
+    skipped, so they don't abort an import whose earlier batches are committed.
+
+    Yields:
+        tuple[int, dict]: The line number and the raw record.
+    """
+    with path.open(newline="", encoding="utf-8") as file:
+        if path.suffix.lower() == ".csv":
+            reader = csv.DictReader(file)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for line_number, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    # Shaped like the validation errors of the other invalid rows
+                    report.invalid.append(
+                        {
+                            "line": line_number,
+                            "errors": [
+                                {
+                                    "type": "json_invalid",
+                                    "loc": (),
+                                    "msg": f"Invalid JSON: {e.msg}",
+                                }
+                            ],
+                        }
+                    )
+                    continue
+                yield line_number, record
+
+
+async def insert_users(session: AsyncSession, rows: list[dict]) -> set[str]:
+    """
+    Inserts user rows, skipping those whose username or email is taken.
+
+    SQLite and Postgres skip them with `ON CONFLICT DO NOTHING` in a single
+    statement. Other databases have no portable equivalent, so the taken names
+    and emails are looked up first and the remaining rows inserted with an
+    executemany; a user created concurrently then fails the batch instead.
+
+    Returns:
+        set[str]: The usernames that were inserted.
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        result = await session.execute(
+            dialect_insert(User).on_conflict_do_nothing().returning(User.username),
+            rows,
+        )
+        return set(result.scalars().all())
+
+    taken = await session.execute(
+        select(User.username, User.email).filter(
+            or_(
+                User.username.in_([row["username"] for row in rows]),
+                User.email.in_([row["email"] for row in rows]),
+            )
+        )
+    )
+    taken_usernames, taken_emails = set(), set()
+    for username, email in taken:
+        taken_usernames.add(username)
+        taken_emails.add(email)
+    rows = [
+        row
+        for row in rows
+        if row["username"] not in taken_usernames and row["email"] not in taken_emails
+    ]
+    if rows:
+        await session.execute(insert(User), rows)
+    return {row["username"] for row in rows}
+
+
+async def import_user_batch(
+    session: AsyncSession, records: list[tuple[int, dict]], report: ImportReport
+) -> None:
+    """
+    Validates, hashes and inserts one batch of users in a single statement.
+
+    Rows that collide with an existing username or email are skipped and
+    recorded as conflicts instead of failing the batch.
+    """
+    users: list[tuple[int, UserCreate]] = []
+    seen: set[str] = set()
+    for line_number, record in records:
+        try:
+            user = UserCreate.model_validate(record)
+        except ValidationError as e:
+            report.invalid.append(
+                {
+                    "line": line_number,
+                    "errors": e.errors(
+                        include_url=False, include_context=False, include_input=False
+                    ),
+                }
+            )
+            continue
+        if user.username in seen or user.email in seen:
+            report.conflicts.append(
+                {"line": line_number, "username": user.username, "email": user.email}
+            )
+            continue
+        seen.update((user.username, user.email))
+        users.append((line_number, user))
+    if not users:
+        return
+
+    # Hashes run concurrently on the password executor
+    password_hashes = await asyncio.gather(
+        *(hash_password(user.password) for _, user in users)
+    )
+    rows = [
+        {"username": user.username, "email": user.email, "password_hash": hashed}
+        for (_, user), hashed in zip(users, password_hashes)
+    ]
+    inserted = await insert_users(session, rows)
+    await session.commit()
+
+    report.inserted += len(inserted)
+    for line_number, user in users:
+        if user.username not in inserted:
+            report.conflicts.append(
+                {"line": line_number, "username": user.username, "email": user.email}
+            )
+
+
+async def import_users(
+    session: AsyncSession, path: Path, batch_size: int = 500
+) -> ImportReport:
+    """
+    Streams users from `path` into the database in batches of `batch_size`.
+
+    Returns:
+        ImportReport: Counts of inserted rows plus the conflicting and invalid records.
+    """
+    report = ImportReport()
+    records = iter_user_records(path, report)
+    while batch := list(islice(records, batch_size)):
+        await import_user_batch(session, batch, report)
+    return report
@@ -1,50 +1,135 @@
+from datetime import datetime, timezone
 from uuid import UUID
 
+from sqlalchemy import update
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import raiseload
+from sqlalchemy.orm.attributes import set_committed_value
 
+from ..db.config import AsyncSessionLocal, mark_recent_write
 from ..db.models import User
+from ..planner.crud import get_plans_by_user_id
+from .principal import Principal, invalidate_principal
+
+
+def duplicate_user_error(error: IntegrityError) -> IntegrityError:
+    """
+    Maps a unique-constraint violation on `users` to the error the views report.
+    """
+    message = str(error.orig).lower()
+    if "username" in message:
+        return IntegrityError(None, None, ValueError("Username already exists"))
+    if "email" in message:
+        return IntegrityError(None, None, ValueError("Email already exists"))
+    return error
 
 
 async def create_user(
     session: AsyncSession, username: str, email: str, password: str
 ) -> User:
-    if await get_user_by_username(session, username):
-        raise IntegrityError(None, None, ValueError("Username already exists"))
-    if await get_user_by_email(session, email):
-        raise IntegrityError(None, None, ValueError("Email already exists"))
-    user = User(username=username, email=email)
+    # A single INSERT: the unique indexes on username and email reject duplicates,
+    # which also closes the race between concurrent signups
+    user = User(username=username, email=email, plans=[])
     await user.set_password(password)
     session.add(user)
-    await session.commit()
-    await session.refresh(user)
+    # Signup is anonymous, so only the client's cookie is marked
+    await mark_recent_write(session)
+    try:
+        await session.commit()
+    except IntegrityError as e:
+        await session.rollback()
+        raise duplicate_user_error(e) from e
     return user
 
 
 async def get_user_by_username(session: AsyncSession, username: str) -> User | None:
-    result = await session.execute(select(User).filter(User.username == username))
+    result = await session.execute(
+        select(User).filter(User.username == username).options(raiseload("*"))
+    )
     return result.scalar_one_or_none()
 
 
 async def get_user_by_email(session: AsyncSession, email: str) -> User | None:
-    result = await session.execute(select(User).filter(User.email == email))
+    result = await session.execute(
+        select(User).filter(User.email == email).options(raiseload("*"))
+    )
     return result.scalar_one_or_none()
 
 
 async def get_user_by_id(session: AsyncSession, user_id: UUID) -> User | None:
-    result = await session.execute(select(User).filter(User.id == user_id))
+    result = await session.execute(
+        select(User).filter(User.id == user_id).options(raiseload("*"))
+    )
     return result.scalar_one_or_none()
 
 
+async def get_principal_by_id(session: AsyncSession, user_id: UUID) -> Principal | None:
+    result = await session.execute(
+        select(User.id, User.username, User.is_active, User.tokens_valid_after).filter(
+            User.id == user_id
+        )
+    )
+    row = result.one_or_none()
+    return Principal(*row) if row else None
+
+
+def revocation_time() -> datetime:
+    # Naive UTC like the other timestamps, but from Python rather than the
+    # database, whose clock may only have second precision
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+async def revoke_tokens(session: AsyncSession, user_id: UUID) -> None:
+    """
+    Revokes every token issued to a user so far, e.g. on logout.
+
+    Recorded on the user rather than in memory, so every worker rejects the
+    tokens and no revocation is forgotten before the tokens expire.
+    """
+    await session.execute(
+        update(User).filter_by(id=user_id).values(tokens_valid_after=revocation_time())
+    )
+    await mark_recent_write(session, user_id)
+    await session.commit()
+    invalidate_principal(user_id)
+
+
+async def save_password_hash(user: User) -> None:
+    """
+    Saves a user's rehashed password in a short write session of its own.
+    """
+    async with AsyncSessionLocal() as write_session:
+        await write_session.execute(
+            update(User).filter_by(id=user.id).values(password_hash=user.password_hash)
+        )
+        await mark_recent_write(write_session, user.id)
+        await write_session.commit()
+    set_committed_value(user, "password_hash", user.password_hash)
+
+
 async def authenticate_user(
     session: AsyncSession,
     email: str,
     password: str,
 ) -> User | None:
+    """
+    Checks a user's credentials, on a read session.
+
+    The password check is slow by design, so the transaction is ended before it
+    runs, and only a rehashed password is written, through its own session. A
+    login never holds a connection, let alone the single SQLite writer, through
+    bcrypt.
+    """
     user = await get_user_by_email(session, email)
     if user is None:
         return None
+    await session.commit()
     if not await user.check_password(password):
         return None
+    if user in session.dirty:
+        await save_password_hash(user)
+    # The login response includes the user's plans, so load them only on success
+    set_committed_value(user, "plans", await get_plans_by_user_id(session, user.id))
     return user
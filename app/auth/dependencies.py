@@ -1,36 +1,54 @@
 from typing import Annotated
+from uuid import UUID
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from fastapi import Depends, Request
 
-from .crud import authenticate_user, get_user_by_id
+from .crud import authenticate_user, get_principal_by_id
 from .forms import LoginForm
+from .principal import Principal, get_principal_cache
 
-from ..core.config import get_settings
-from ..db.config import get_async_session
+from ..db.config import get_read_session
 from ..db.models import User
 
 
 async def authenticate(
     form: Annotated[LoginForm, Depends()],
-    session: Annotated[AsyncSession, Depends(get_async_session)],
+    session: Annotated[AsyncSession, Depends(get_read_session)],
 ) -> User | None:
     return await authenticate_user(session, form.email, form.password)
 
 
+async def resolve_principal(session: AsyncSession, user_id: UUID) -> Principal | None:
+    """
+    Resolves a user ID to its principal, hitting the database only on a cache miss.
+    """
+    cache = get_principal_cache()
+    principal = cache.get(user_id)
+    if principal is None:
+        principal = await get_principal_by_id(session, user_id)
+        if principal is not None:
+            cache.set(user_id, principal)
+    return principal
+
+
 async def get_current_user(
-    session: Annotated[AsyncSession, Depends(get_async_session)], request: Request
-) -> User | None:
+    session: Annotated[AsyncSession, Depends(get_read_session)], request: Request
+) -> Principal | None:
     user_id = request.session.get("user_id")
     if user_id is None:
         return None
-    return await get_user_by_id(session, user_id)
+    try:
+        user_id = UUID(user_id)
+    except ValueError:
+        return None
+    return await resolve_principal(session, user_id)
 
 
 async def get_current_active_user(
-    current_user: Annotated[User | None, Depends(get_current_user)],
-) -> User | None:
+    current_user: Annotated[Principal | None, Depends(get_current_user)],
+) -> Principal | None:
     if current_user is None or not current_user.is_active:
         return None
     return current_user
@@ -0,0 +1,40 @@
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from uuid import UUID
+
+from ..core.cache import LRUCache
+from ..core.config import get_settings
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """
+    The minimal, immutable identity of an authenticated user.
+
+    Resolved on every authenticated request instead of the full `User` model,
+    which would pull in the user's relationships.
+    """
+
+    id: UUID
+    username: str
+    is_active: bool
+    tokens_valid_after: datetime | None
+
+
+@lru_cache
+def get_principal_cache() -> LRUCache[UUID, Principal]:
+    settings = get_settings()
+    return LRUCache(
+        maxsize=settings.principal_cache_size,
+        ttl=settings.principal_cache_ttl_seconds,
+    )
+
+
+def invalidate_principal(user_id: UUID) -> None:
+    """
+    Drops a cached principal so the next request reloads it from the database.
+
+    Must be called whenever a user's identity or active state changes.
+    """
+    get_principal_cache().pop(user_id)
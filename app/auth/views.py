@@ -6,11 +6,13 @@ from fastapi.responses import JSONResponse
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from .crud import create_user
+from .crud import create_user, revoke_tokens
 
 from ..db.config import get_async_session
 from ..db.models import User as UserModel
+from ..schemas.adapters import RawJSONResponse, dump_user
 from .dependencies import authenticate, get_current_active_user
+from .principal import Principal
 from .forms import SignupForm
 from .schemas import User as UserSchema
 
@@ -66,8 +68,9 @@ async def signup(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 content={"detail": "Email already exists"},
             )
+        raise
 
-    return user
+    return RawJSONResponse(dump_user(user), status_code=status.HTTP_201_CREATED)
 
 
 @router.post(
@@ -97,7 +100,7 @@ async def login(
     # Create a new session for the user
     request.session.update({"user_id": str(user.id)})
 
-    return user
+    return RawJSONResponse(dump_user(user))
 
 
 @router.post(
@@ -113,7 +116,8 @@ async def login(
 )
 async def logout(
     request: Request,
-    user: Annotated[UserModel | None, Depends(get_current_active_user)],
+    user: Annotated[Principal | None, Depends(get_current_active_user)],
+    async_session: Annotated[AsyncSession, Depends(get_async_session)],
 ):
     if user is None:
         return JSONResponse(
@@ -123,5 +127,6 @@ async def logout(
 
     # Remove the session for the user
     request.session.pop("user_id")
+    await revoke_tokens(async_session, user.id)
 
     return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -1,29 +1,91 @@
-from passlib.context import CryptContext
-
 from functools import lru_cache
+from typing import TYPE_CHECKING, Literal
 from pydantic_settings import BaseSettings
 
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
 
 class Settings(BaseSettings):
     allow_credentials: bool = True
     allowed_methods: list[str] = ["*"]
     allowed_origins: list[str] = ["*"]
+    answer_queue_batch_size: int = 200
+    answer_queue_flush_ms: float = 10
+    answer_queue_max_size: int = 5000
     app_name: str = "Health Planner API"
     app_version: str = "0.0.1"
-    database_url: str = "sqlite:///./test.db"
+    bcrypt_rounds: int = 12
+    database_read_url: str | None = None
+    database_url: str = "sqlite+aiosqlite:///./test.db"
+    db_echo: bool = False
+    db_max_overflow: int = 10
+    db_pool_pre_ping: bool = True
+    db_pool_recycle: int = 1800
+    db_pool_size: int = 5
+    db_pool_timeout: float = 30
+    db_prepared_statement_cache_size: int = 100
+    db_raise_on_lazy_load: bool = False
+    db_statement_cache_size: int = 100
+    db_statement_repeat_action: Literal["warn", "raise"] = "warn"
+    db_statement_repeat_limit: int = 20
     debug: bool = True
     jwt_algorithm: str = "HS256"
+    jwt_cache_size: int = 10000
     jwt_expires_in_days: int = 7
     jwt_secret_key: str
+    log_level: str = "INFO"
+    log_queue_size: int = 10000
+    log_sample_rates: dict[str, float] = {"DEBUG": 0.1, "INFO": 1.0}
+    llm_daily_token_budget: int = 0
+    llm_usage_batch_size: int = 500
+    llm_usage_flush_ms: float = 1000
+    llm_usage_max_size: int = 10000
     openai_key: str
     openai_max_tokens: int = 250
     openai_model: str
     openai_organization_id: str
     openai_project_id: str
+    password_hash_executor: Literal["thread", "process"] = "thread"
+    password_hash_workers: int = 4
+    plan_cache_max_age: int = 86400
+    plan_cache_size: int = 1024
+    plan_cache_ttl_seconds: float = 30
+    plan_compression_level: int = 6
+    plan_compression_threshold: int = 512
+    plan_similarity_index_size: int = 50000
+    plan_similarity_max_distance: float = 0.02
+    principal_cache_size: int = 10000
+    principal_cache_ttl_seconds: float = 60
+    profile_dir: str = "profiles"
+    profile_sample_rate: float = 0
+    profile_token: str | None = None
+    read_your_writes_seconds: float = 10
+    retention_archive_after_days: int = 0
+    retention_batch_size: int = 500
+    retention_in_app: bool = True
+    retention_interval_seconds: float = 3600
+    retention_orphan_answer_hours: int = 0
+    search_text_config: str = "english"
+    server_graceful_timeout: float = 30
+    server_host: str = "0.0.0.0"
+    server_http: Literal["auto", "h11", "httptools"] = "auto"
+    server_keep_alive: int = 5
+    server_limit_concurrency: int | None = None
+    server_loop: Literal["auto", "asyncio", "uvloop"] = "auto"
+    server_port: int = 8000
+    server_workers: int = 1
+    server_ws: Literal["auto", "none", "websockets", "wsproto"] = "auto"
     session_expire_days: int = 7
     session_same_site: str = "lax"
     session_secret_key: str
     session_secure: bool = False
+    sqlite_busy_timeout: int = 5000
+    sqlite_cache_size_kib: int = 65536
+    sqlite_mmap_size: int = 268435456
+    sqlite_synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    sqlite_wal: bool = True
+    ws_token_expires_in_minutes: int = 5
 
     class Config:
         env_file = ".env"
@@ -34,4 +96,19 @@ def get_settings():
     return Settings()
 
 
-password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@lru_cache
+def get_password_context() -> "CryptContext":
+    # passlib is imported here rather than at the top, so importing the settings
+    # (as `manage.py` and the migrations do) does not load it
+    from passlib.context import CryptContext
+
+    # Pinning min and max rounds to the configured cost makes hashes created with
+    # any other cost "need update", so they are rehashed on the next login
+    rounds = get_settings().bcrypt_rounds
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
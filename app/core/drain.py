@@ -0,0 +1,38 @@
+import asyncio
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class InFlight:
+    """
+    Counts units of work in progress, so a shutdown can wait for them to finish.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def __len__(self) -> int:
+        return self.count
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        self.count += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self.count -= 1
+            if not self.count:
+                self._idle.set()
+
+    async def wait(self) -> None:
+        """
+        Waits until nothing is in progress.
+        """
+        await self._idle.wait()
+
+
+# Plan generations running in this worker, drained by `DrainingServer` on shutdown
+plan_generations = InFlight()
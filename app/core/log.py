@@ -0,0 +1,232 @@
+import copy
+import logging
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from uuid import uuid4
+
+import orjson
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import get_settings
+
+request_id: ContextVar[str | None] = ContextVar("request_id", default=None)
+session_id: ContextVar[str | None] = ContextVar("session_id", default=None)
+
+REQUEST_ID_HEADER = b"x-request-id"
+
+# Loggers that emit a record per request or message, sampled like `hot_path` records
+HOT_PATH_LOGGERS = ("uvicorn.access",)
+
+# Attributes every LogRecord has; anything else came from `extra`
+RESERVED_ATTRS = frozenset(logging.LogRecord("", 0, "", 0, "", None, None).__dict__) | {
+    "message",
+    "request_id",
+    "session_id",
+    "hot_path",
+    "sample_rate",
+    # uvicorn's copy of its message with terminal colours
+    "color_message",
+}
+
+_listener: QueueListener | None = None
+
+
+class ContextFilter(logging.Filter):
+    """
+    Stamps records with the current request and WebSocket session IDs.
+
+    Runs in the thread that logs, before the record is queued, since the context
+    variables are not visible from the writer thread.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        record.session_id = session_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of hot-path records, by level.
+
+    A record is on the hot path if it was logged with `extra={"hot_path": True}`
+    or by one of `loggers`. Levels without a rate, and warnings and above, are
+    always kept. Kept records carry the rate, so counts can be scaled back up.
+
+    Parameters:
+    - rates (dict[str, float]): The fraction of records kept per level name.
+    - loggers (tuple[str, ...]): Loggers whose every record is on the hot path.
+    """
+
+    def __init__(self, rates: dict[str, float], loggers: tuple[str, ...] = ()) -> None:
+        super().__init__()
+        self.rates = {
+            logging.getLevelName(level.upper()): rate for level, rate in rates.items()
+        }
+        self.loggers = loggers
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        if not getattr(record, "hot_path", False) and record.name not in self.loggers:
+            return True
+        rate = self.rates.get(record.levelno, 1.0)
+        if rate < 1.0:
+            if random.random() >= rate:
+                return False
+            record.sample_rate = rate
+        return True
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Queues records for the writer thread, dropping them if the queue is full
+    rather than blocking the event loop.
+    """
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Unlike the default, keeps the traceback apart from the message so the
+        # JSON formatter can emit it as its own field
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object per line, including any `extra` fields.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        document = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name in ("request_id", "session_id", "sample_rate"):
+            value = getattr(record, name, None)
+            if value is not None:
+                document[name] = value
+        for name, value in record.__dict__.items():
+            if name not in RESERVED_ATTRS:
+                document[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            document["exception"] = record.exc_text
+        return orjson.dumps(document, default=str).decode()
+
+
+def setup_logging() -> QueueListener:
+    """
+    Routes all logging, including uvicorn's and SQLAlchemy's, through a bounded
+    queue to a background thread that writes JSON lines to stdout.
+
+    The event loop only stamps, samples and enqueues a record; formatting and the
+    blocking write happen on the writer thread.
+
+    Returns:
+        QueueListener: The running writer; see `shutdown_logging`.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    settings = get_settings()
+    log_queue: queue.Queue = queue.Queue(settings.log_queue_size)
+    handler = BoundedQueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+    handler.addFilter(SamplingFilter(settings.log_sample_rates, HOT_PATH_LOGGERS))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(settings.log_level.upper())
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logger = logging.getLogger(name)
+        logger.handlers = []
+        logger.propagate = True
+    if settings.db_echo:
+        logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO)
+
+    writer = logging.StreamHandler(sys.stdout)
+    writer.setFormatter(JSONFormatter())
+    _listener = QueueListener(log_queue, writer, respect_handler_level=False)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """
+    Writes out the queued records and stops the writer thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware that gives every HTTP request a request ID, and every
+    WebSocket connection a session ID, for the records logged while handling it.
+
+    An `X-Request-ID` sent by a proxy is reused; the ID is returned in the same
+    header on HTTP responses.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        value = None
+        for name, header in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                value = header.decode("latin-1")[:128]
+                break
+        value = value or uuid4().hex
+
+        if scope["type"] == "websocket":
+            token = session_id.set(value)
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                session_id.reset(token)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (REQUEST_ID_HEADER, value.encode("latin-1")),
+                ]
+            await send(message)
+
+        token = request_id.set(value)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id.reset(token)
@@ -0,0 +1,330 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Iterator
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# The user's side of a chat is measured in seconds to minutes, not milliseconds
+WAIT_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+# Structured plan generation regularly takes tens of seconds
+LLM_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class CounterValue:
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class GaugeValue(CounterValue):
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class HistogramValue:
+    def __init__(self, upper_bounds: tuple[float, ...]) -> None:
+        self.upper_bounds = upper_bounds
+        # One slot per bucket plus +Inf; made cumulative only when rendered
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self) -> "Timer":
+        return Timer(self)
+
+
+class Timer:
+    """
+    Observes the time spent in a `with` block. A plain class rather than a
+    generator-based context manager, as it is entered on hot paths.
+    """
+
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: HistogramValue) -> None:
+        self.histogram = histogram
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class Metric:
+    """
+    A named metric, with one value per combination of label values.
+
+    A metric without labels can be recorded on directly; a labelled one is
+    recorded on through `labels`, whose result can be kept to skip the lookup on
+    hot paths.
+    """
+
+    kind = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        registry: "MetricsRegistry | None" = None,
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        (registry or metrics_registry).register(self)
+
+    def _new_value(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        value = self._values.get(values)
+        if value is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(
+                    f"{self.name} takes labels {self.labelnames}, got {values}"
+                )
+            with self._lock:
+                value = self._values.setdefault(values, self._new_value())
+        return value
+
+    def _samples(self, labels: tuple[str, ...], value) -> Iterator[str]:
+        yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value.value)}"
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for labels, value in list(self._values.items()):
+            yield from self._samples(labels, value)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_value(self) -> CounterValue:
+        return CounterValue()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _new_value(self) -> GaugeValue:
+        return GaugeValue()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self.labels().dec(amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+        registry: "MetricsRegistry | None" = None,
+    ) -> None:
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_value(self) -> HistogramValue:
+        return HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self) -> Timer:
+        return self.labels().time()
+
+    def _samples(self, labels: tuple[str, ...], value: HistogramValue) -> Iterator[str]:
+        with value._lock:
+            counts, total = list(value.counts), value.sum
+        names = (*self.labelnames, "le")
+        cumulative = 0
+        for upper_bound, count in zip((*self.buckets, float("inf")), counts):
+            cumulative += count
+            bucket_labels = _format_labels(names, (*labels, _format_value(upper_bound)))
+            yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+        label_text = _format_labels(self.labelnames, labels)
+        yield f"{self.name}_sum{label_text} {_format_value(total)}"
+        yield f"{self.name}_count{label_text} {cumulative}"
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """
+        Renders every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that records the latency of every HTTP request, labelled by
+    method, route template and status code.
+
+    Requests that match no route share one label, so unknown paths cannot grow the
+    number of series.
+    """
+
+    def __init__(self, app: ASGIApp, histogram: Histogram | None = None) -> None:
+        self.app = app
+        self.histogram = histogram or http_request_seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            self.histogram.labels(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status_code),
+            ).observe(time.perf_counter() - started)
+
+
+metrics_registry = MetricsRegistry()
+
+http_request_seconds = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency, by method, route and status code.",
+    ("method", "route", "status"),
+)
+db_operation_seconds = Histogram(
+    "planner_db_operation_duration_seconds",
+    "Time spent writing chat answers and plans.",
+    ("operation",),
+)
+plan_choice_seconds = Histogram(
+    "planner_plan_choice_duration_seconds",
+    "Time taken to classify a chat message as a meal, workout or combined request.",
+    buckets=LLM_BUCKETS,
+)
+question_wait_seconds = Histogram(
+    "planner_question_wait_seconds",
+    "Time between sending a question and receiving the user's answer.",
+    ("plan_type",),
+    buckets=WAIT_BUCKETS,
+)
+llm_request_seconds = Histogram(
+    "planner_llm_request_duration_seconds",
+    "OpenAI request latency, by client operation.",
+    ("operation",),
+    buckets=LLM_BUCKETS,
+)
+llm_tokens = Counter(
+    "planner_llm_tokens_total",
+    "OpenAI tokens used, by client operation and token type.",
+    ("operation", "type"),
+)
+db_statements_per_unit = Histogram(
+    "db_statements_per_unit",
+    "SQL statements executed per request, WebSocket message or write-behind flush.",
+    ("unit", "route"),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+db_time_per_unit_seconds = Histogram(
+    "db_time_per_unit_seconds",
+    "Time spent executing SQL per request, WebSocket message or write-behind flush.",
+    ("unit", "route"),
+)
+db_repeated_statements = Counter(
+    "db_repeated_statements_total",
+    "Units of work in which one statement shape ran more often than allowed.",
+    ("unit", "route"),
+)
+websocket_connects = Counter(
+    "planner_websocket_connects_total",
+    "Planner WebSocket chats accepted.",
+)
+websocket_disconnects = Counter(
+    "planner_websocket_disconnects_total",
+    "Planner WebSocket chats ended.",
+)
+websocket_active = Gauge(
+    "planner_websocket_active",
+    "Planner WebSocket chats currently open.",
+)
@@ -0,0 +1,106 @@
+import asyncio
+import cProfile
+import hmac
+import os
+import random
+import re
+from datetime import datetime, timezone
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+PROFILE_HEADER = b"x-profile-token"
+PROFILE_FILE_HEADER = b"x-profile-file"
+
+
+def profile_filename(scope: Scope) -> str:
+    """
+    Names a profile after the time, the request method and the matched route.
+    """
+    route = scope.get("route")
+    path = getattr(route, "path", scope["path"])
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", path).strip("-") or "root"
+    method = scope.get("method", "WS")
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    return f"{timestamp}-{method}-{slug}.prof"
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that runs selected HTTP requests, or whole WebSocket sessions,
+    under cProfile and writes each profile to `directory`.
+
+    A request is profiled when it carries the admin token in the `X-Profile-Token`
+    header, or when it is picked at `sample_rate`. The token is never accepted in
+    the query string, which access logs and proxies record. Only add this
+    middleware when one of those is configured; the application then pays
+    nothing when profiling is off.
+
+    cProfile records everything the event loop runs while it is enabled, so only
+    one profile is taken at a time and it includes whatever other requests ran
+    concurrently. Work handed to threads, such as OpenAI calls, appears as the
+    wait for the thread.
+
+    Parameters:
+    - app (ASGIApp): The application to wrap.
+    - directory (str): Where profiles are written.
+    - token (str | None): The admin token that requests a profile.
+    - sample_rate (float): The fraction of requests profiled without a token.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        directory: str,
+        token: str | None = None,
+        sample_rate: float = 0.0,
+    ) -> None:
+        self.app = app
+        self.directory = directory
+        self.token = token.encode() if token else None
+        self.sample_rate = sample_rate
+        self.active = False
+
+    def requested(self, scope: Scope) -> bool:
+        if self.token is not None:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER and hmac.compare_digest(value, self.token):
+                    return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] not in ("http", "websocket")
+            or self.active
+            or not self.requested(scope)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        filename = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal filename
+            if message["type"] == "http.response.start":
+                filename = profile_filename(scope)
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (PROFILE_FILE_HEADER, filename.encode()),
+                ]
+            await send(message)
+
+        self.active = True
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.disable()
+            self.active = False
+            path = os.path.join(self.directory, filename or profile_filename(scope))
+            await asyncio.to_thread(self.write, profiler, path)
+
+    def write(self, profiler: cProfile.Profile, path: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        # Renamed into place so nothing reads a half-written profile
+        profiler.dump_stats(f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import socket
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from .config import get_settings
+from .drain import plan_generations
+from .log import setup_logging, shutdown_logging
+
+logger = logging.getLogger(__name__)
+
+
+def default_worker_count() -> int:
+    """
+    One worker per CPU this process is allowed to run on.
+
+    Counts the CPUs in the scheduler affinity mask rather than on the host, so a
+    container or `taskset` pinned to a few cores doesn't start a worker for every
+    core of the machine.
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        # Not available on macOS or Windows
+        return os.cpu_count() or 1
+
+
+class DrainingServer(uvicorn.Server):
+    """
+    A uvicorn server that lets in-flight plan generations finish before it closes
+    connections.
+
+    uvicorn's own shutdown closes every WebSocket at once and then waits for the
+    handlers, so a plan being generated would still be saved but never reach its
+    user. This server first stops accepting connections and waits, up to the
+    graceful shutdown timeout, for running generations to be answered; only then
+    does the usual shutdown close the remaining connections, waiting up to the
+    same timeout again for their handlers.
+    """
+
+    async def serve(self, sockets: list[socket.socket] | None = None) -> None:
+        # Before uvicorn's startup messages, which would otherwise have no handler;
+        # the lifespan's own call is then a no-op
+        setup_logging()
+        await super().serve(sockets)
+
+    async def shutdown(self, sockets: list[socket.socket] | None = None) -> None:
+        for server in self.servers:
+            server.close()
+        if len(plan_generations):
+            logger.info(
+                "Waiting for plan generations to finish",
+                extra={"plan_generations": len(plan_generations)},
+            )
+            try:
+                await asyncio.wait_for(
+                    plan_generations.wait(), self.config.timeout_graceful_shutdown
+                )
+            except asyncio.TimeoutError:
+                logger.warning(
+                    "Graceful shutdown timed out with plan generations running",
+                    extra={"plan_generations": len(plan_generations)},
+                )
+        await super().shutdown(sockets)
+
+
+def run_retention_process() -> None:
+    """
+    Runs the periodic retention job in this process, for `run_server`.
+    """
+    # Imported here so the supervisor doesn't load the application
+    from ..planner.retention import serve_retention
+
+    setup_logging()
+    try:
+        asyncio.run(serve_retention())
+    finally:
+        shutdown_logging()
+
+
+def run_server(workers: int | None = None) -> None:
+    """
+    Serves the application with uvicorn, configured from the settings.
+
+    One worker is the default. Several workers share the listening socket, but
+    each keeps its own copy of the in-memory state, so with more than one:
+    - the plan body, principal and verified token caches are per worker, and a
+      change is only seen by other workers once their entry expires;
+    - the similarity index only learns the plans generated in its own worker;
+    - pending usage tokens only count towards the budget in the worker that
+      queued them, until the write-behind queue flushes;
+    - /metrics, /health/db and /health/startup report on the worker that
+      answered.
+    Revocations and the read-your-writes window are stored in the database and
+    the session cookie, so they hold across workers. The retention job runs in a
+    separate process rather than in every worker.
+
+    Parameters:
+    - workers (int | None): Overrides the configured number of worker processes.
+      The configured number may be 0 for one worker per CPU.
+    """
+    # Imported here so the supervisor doesn't load the application
+    from ..planner.retention import retention_enabled
+
+    settings = get_settings()
+    config = uvicorn.Config(
+        "app.main:app",
+        host=settings.server_host,
+        port=settings.server_port,
+        workers=workers or settings.server_workers or default_worker_count(),
+        loop=settings.server_loop,
+        http=settings.server_http,
+        ws=settings.server_ws,
+        timeout_keep_alive=settings.server_keep_alive,
+        limit_concurrency=settings.server_limit_concurrency,
+        timeout_graceful_shutdown=settings.server_graceful_timeout,
+        # Logging goes through the application's queue instead, see `serve`
+        log_config=None,
+    )
+    server = DrainingServer(config)
+    if config.workers <= 1:
+        server.run()
+        return
+
+    # Spawned processes read their settings from this environment
+    os.environ["RETENTION_IN_APP"] = "false"
+    retention = None
+    if retention_enabled():
+        retention = multiprocessing.get_context("spawn").Process(
+            target=run_retention_process, name="retention"
+        )
+        retention.start()
+
+    setup_logging()
+    try:
+        # Workers are spawned, import the application themselves and share the
+        # listening socket
+        Multiprocess(config, target=server.run, sockets=[config.bind_socket()]).run()
+    finally:
+        if retention is not None:
+            retention.terminate()
+            retention.join()
+        shutdown_logging()
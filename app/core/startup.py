@@ -0,0 +1,56 @@
+import time
+from dataclasses import asdict, dataclass, field
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+@dataclass
+class StartupTimings:
+    """
+    Cold start milestones, in seconds since the application module was imported.
+    """
+
+    imported_at: float = field(default_factory=time.perf_counter)
+    ready: float | None = None
+    first_request: float | None = None
+
+    def mark_ready(self) -> None:
+        self.ready = time.perf_counter() - self.imported_at
+
+    def mark_first_request(self) -> None:
+        self.first_request = time.perf_counter() - self.imported_at
+
+    def model_dump(self) -> dict:
+        timings = asdict(self)
+        del timings["imported_at"]
+        return timings
+
+
+class FirstRequestTimer:
+    """
+    ASGI middleware that records when the first HTTP response has been sent.
+
+    After that it only costs an attribute check per request.
+    """
+
+    def __init__(self, app: ASGIApp, timings: StartupTimings) -> None:
+        self.app = app
+        self.timings = timings
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.timings.first_request is not None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get(
+                "more_body", False
+            ):
+                if self.timings.first_request is None:
+                    self.timings.mark_first_request()
+
+        await self.app(scope, receive, send_wrapper)
+
+
+startup_timings = StartupTimings()
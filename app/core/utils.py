@@ -1,28 +1,154 @@
+import asyncio
+import hashlib
 import jwt
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 
-from .config import password_context, get_settings
+from .cache import LRUCache
+from .config import get_password_context, get_settings
+
+_password_executor: Executor | None = None
 
 
 def generate_password_hash(plain_password: str) -> str:
-    return password_context.hash(plain_password)
+    return get_password_context().hash(plain_password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return password_context.verify(plain_password, hashed_password)
+    return get_password_context().verify(plain_password, hashed_password)
+
+
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    return get_password_context().verify_and_update(plain_password, hashed_password)
+
+
+def start_password_executor() -> Executor:
+    """
+    Starts the bounded pool that password hashing and verification run on.
+
+    bcrypt is deliberately slow, so running it on the event loop would stall every
+    other request and WebSocket chat in the process.
+
+    Returns:
+        Executor: The running executor.
+    """
+    global _password_executor
+    if _password_executor is None:
+        settings = get_settings()
+        if settings.password_hash_executor == "process":
+            _password_executor = ProcessPoolExecutor(settings.password_hash_workers)
+        else:
+            _password_executor = ThreadPoolExecutor(
+                settings.password_hash_workers, thread_name_prefix="password-hash"
+            )
+    return _password_executor
+
+
+def shutdown_password_executor() -> None:
+    global _password_executor
+    if _password_executor is not None:
+        _password_executor.shutdown(wait=True)
+        _password_executor = None
+
+
+async def hash_password(plain_password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        start_password_executor(), generate_password_hash, plain_password
+    )
 
 
-def create_jwt_token(data: dict, secret_key: str, expires_in: int) -> str:
+async def check_password_hash(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    """
+    Verifies a password off the event loop.
+
+    Returns:
+        tuple[bool, str | None]: Whether the password matches, and a new hash if the
+        stored one was created with outdated settings and should be replaced.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        start_password_executor(),
+        verify_and_update_password,
+        plain_password,
+        hashed_password,
+    )
+
+
+@lru_cache
+def get_verified_token_cache() -> LRUCache[bytes, dict]:
+    """
+    Returns the cache of verified token claims, keyed by the SHA-256 digest of the
+    verification key and the token.
+    """
+    return LRUCache(maxsize=get_settings().jwt_cache_size)
+
+
+def create_jwt_token(data: dict, secret_key: str, expires_in: int | timedelta) -> str:
+    """
+    Creates a signed JWT.
+
+    Parameters:
+    - data (dict): The claims to include.
+    - secret_key (str): The signing key.
+    - expires_in (int | timedelta): The token lifetime, in days if given as an int.
+    """
+    if not isinstance(expires_in, timedelta):
+        expires_in = timedelta(days=expires_in)
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + timedelta(days=expires_in)
-    to_encode.update({"exp": expire})
+    expire = datetime.now(timezone.utc) + expires_in
+    to_encode.update({"exp": expire, "iat": time.time()})
     return jwt.encode(to_encode, secret_key, algorithm=get_settings().jwt_algorithm)
 
 
 def verify_jwt_token(token: str, secret_key: str) -> dict:
-    try:
-        return jwt.decode(token, secret_key, algorithms=[get_settings().jwt_algorithm])
-    except jwt.ExpiredSignatureError:
-        return {"error": "Token has expired"}
-    except jwt.InvalidTokenError:
-        return {"error": "Invalid token"}
+    """
+    Verifies a JWT and returns its claims, or a dict with an "error" key.
+
+    Verified claims are cached until the token expires, so reconnecting clients
+    skip the signature check. Revocation is not checked here: it is recorded on the
+    user, see `token_revoked`.
+    """
+    cache = get_verified_token_cache()
+    # The key is part of the digest, so a token verified with one key is never
+    # accepted for another
+    digest = hashlib.sha256(f"{secret_key}\0{token}".encode()).digest()
+    payload = cache.get(digest)
+    if payload is None:
+        try:
+            payload = jwt.decode(
+                token,
+                secret_key,
+                algorithms=[get_settings().jwt_algorithm],
+                options={"require": ["exp", "iat"]},
+            )
+        except jwt.ExpiredSignatureError:
+            return {"error": "Token has expired"}
+        except jwt.InvalidTokenError:
+            return {"error": "Invalid token"}
+        cache.set(
+            digest,
+            payload,
+            expires_at=time.monotonic() + payload["exp"] - time.time(),
+        )
+    return payload
+
+
+def token_revoked(payload: dict, tokens_valid_after: datetime | None) -> bool:
+    """
+    Whether a token's claims were issued before its user revoked their tokens.
+
+    Parameters:
+    - payload (dict): The verified claims.
+    - tokens_valid_after (datetime | None): The user's revocation time, in naive UTC.
+    """
+    if tokens_valid_after is None:
+        return False
+    revoked_at = tokens_valid_after.replace(tzinfo=timezone.utc).timestamp()
+    return payload["iat"] <= revoked_at
@@ -1,21 +1,185 @@
+import time
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache, partial
+from typing import Any, Callable
+from uuid import UUID
+
+from sqlalchemy import event, select, update
+from sqlalchemy.engine import URL, make_url
 from sqlalchemy.ext.asyncio import (
     create_async_engine,
     AsyncEngine,
+    AsyncSession,
     async_sessionmaker,
     AsyncAttrs,
 )
 from sqlalchemy.orm import DeclarativeBase
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from ..core.config import get_settings
+from .telemetry import InstrumentedAsyncQueuePool, instrument_statements
+
+
+def engine_options(url: str, writer: bool = True) -> tuple[URL, dict[str, Any]]:
+    """
+    Builds the engine URL and keyword arguments from the settings.
+
+    Pool sizing applies to every pooled database; the statement cache settings only
+    apply to asyncpg, where they must be lowered (or zeroed) behind PgBouncer.
+
+    SQLite URLs are switched to the async aiosqlite driver. SQLite allows a single
+    writer at a time, so the writer engine gets one connection: concurrent writers
+    queue for it in the pool instead of failing with "database is locked", while
+    reads run in parallel on a separate engine.
+
+    Parameters:
+    - url (str): The database URL.
+    - writer (bool): Whether the engine is used for writes, or only for reads.
+
+    Returns:
+        tuple[URL, dict[str, Any]]: The URL and the `create_async_engine` arguments.
+    """
+    settings = get_settings()
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.get_driver_name() != "aiosqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    # `db_echo` is applied to the "sqlalchemy.engine" logger by `setup_logging`,
+    # so SQL is logged through the queue instead of a handler writing to stdout
+    options: dict[str, Any] = {}
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory SQLite lives in a single connection, so it cannot be pooled
+        return url, options
+
+    options.update(
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+    )
+    if url.get_backend_name() == "sqlite":
+        options.update(pool_pre_ping=False)
+        if writer:
+            options.update(pool_size=1, max_overflow=0)
+    if url.get_driver_name() == "asyncpg":
+        url = url.update_query_dict(
+            {
+                "prepared_statement_cache_size": str(
+                    settings.db_prepared_statement_cache_size
+                )
+            }
+        )
+        options["connect_args"] = {
+            "statement_cache_size": settings.db_statement_cache_size
+        }
+    return url, options
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record, writer: bool) -> None:
+    settings = get_settings()
+    cursor = dbapi_connection.cursor()
+    if settings.sqlite_wal:
+        # WAL lets readers run while a write is in progress
+        cursor.execute("PRAGMA journal_mode = WAL")
+    cursor.execute(f"PRAGMA synchronous = {settings.sqlite_synchronous}")
+    cursor.execute(f"PRAGMA busy_timeout = {int(settings.sqlite_busy_timeout)}")
+    cursor.execute(f"PRAGMA cache_size = -{int(settings.sqlite_cache_size_kib)}")
+    cursor.execute(f"PRAGMA mmap_size = {int(settings.sqlite_mmap_size)}")
+    if not writer:
+        cursor.execute("PRAGMA query_only = ON")
+    cursor.close()
+    # Transactions are begun explicitly, see `begin_sqlite_transaction`
+    dbapi_connection.isolation_level = None
+
+
+def begin_sqlite_transaction(connection, writer: bool) -> None:
+    # Writers take the write lock up front: a deferred transaction that reads
+    # before writing can otherwise fail with SQLITE_BUSY without waiting out
+    # busy_timeout when another process committed in between
+    connection.exec_driver_sql("BEGIN IMMEDIATE" if writer else "BEGIN")
+
+
+def create_engine(url: str, writer: bool = True) -> AsyncEngine:
+    url, options = engine_options(url, writer)
+    engine = create_async_engine(url, **options)
+    if url.get_backend_name() == "sqlite" and "poolclass" in options:
+        event.listen(
+            engine.sync_engine,
+            "connect",
+            partial(set_sqlite_pragmas, writer=writer),
+        )
+        event.listen(
+            engine.sync_engine,
+            "begin",
+            partial(begin_sqlite_transaction, writer=writer),
+        )
+    instrument_statements(engine)
+    return engine
+
+
+class LazySessionMaker(async_sessionmaker):
+    """
+    A session factory that binds to its engine when the first session is made.
+
+    Engines are created on first use rather than at import, so importing the
+    models or the CLI does not build connection pools or load database drivers.
+
+    Parameters:
+    - get_engine (Callable[[], AsyncEngine]): Returns the engine to bind to.
+    """
+
+    def __init__(self, get_engine: Callable[[], AsyncEngine], **kw: Any) -> None:
+        super().__init__(**kw)
+        self.get_engine = get_engine
+
+    def __call__(self, **local_kw: Any) -> AsyncSession:
+        if self.kw.get("bind") is None:
+            self.configure(bind=self.get_engine())
+        return super().__call__(**local_kw)
+
+
+def is_memory_database(engine: AsyncEngine) -> bool:
+    return engine.dialect.name == "sqlite" and engine.url.database in (
+        None,
+        "",
+        ":memory:",
+    )
+
+
+@lru_cache
+def get_async_engine() -> AsyncEngine:
+    """
+    Returns the primary engine, creating it on first use.
+    """
+    return create_engine(get_settings().database_url)
+
+
+@lru_cache
+def get_async_read_engine() -> AsyncEngine:
+    """
+    Returns the engine for reads, creating it on first use.
+
+    That is the read replica if one is configured. Without one, reads go to the
+    primary, except on file based SQLite where they get their own pool so they
+    don't queue behind the writer.
+    """
+    settings = get_settings()
+    if settings.database_read_url:
+        return create_engine(settings.database_read_url, writer=False)
+    engine = get_async_engine()
+    if engine.dialect.name == "sqlite" and not is_memory_database(engine):
+        return create_engine(settings.database_url, writer=False)
+    return engine
 
-SQLALCHEMY_DATABASE_URL = get_settings().database_url
 
-async_engine: AsyncEngine = create_async_engine(
-    SQLALCHEMY_DATABASE_URL, echo=get_settings().debug
+AsyncSessionLocal = LazySessionMaker(
+    get_async_engine, autoflush=False, expire_on_commit=False
 )
 
-AsyncSessionLocal = async_sessionmaker(
-    bind=async_engine, autoflush=False, expire_on_commit=False
+AsyncReadSessionLocal = LazySessionMaker(
+    get_async_read_engine, autoflush=False, expire_on_commit=False
 )
 
 
@@ -42,3 +206,128 @@ async def get_async_session():
     """
     async with AsyncSessionLocal() as async_session:
         yield async_session
+
+
+# The signed session of the connection being served, see `ReadYourWritesMiddleware`
+_client_session: ContextVar[dict | None] = ContextVar("client_session", default=None)
+
+# Session key holding the time of the client's last write
+LAST_WRITE_KEY = "last_write_at"
+
+
+class ReadYourWritesMiddleware:
+    """
+    Exposes the connection's signed session to `mark_recent_write` and
+    `get_read_session_factory`, which are called far from the request.
+
+    Must run inside `SessionMiddleware`, so the session is loaded before and saved
+    after the application.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if "session" not in scope:
+            await self.app(scope, receive, send)
+            return
+        token = _client_session.set(scope["session"])
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _client_session.reset(token)
+
+
+def utcnow() -> datetime:
+    # Naive UTC, like the timestamps the database stores
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+async def mark_recent_write(async_session: AsyncSession, *user_ids: UUID) -> None:
+    """
+    Pins the reads of the current client and of the given users to the primary
+    for the read-your-writes window, so that data they just wrote is visible before
+    the replica catches up.
+
+    Call it within the write's transaction, before the commit. The time of the
+    write is kept in two places: the client's signed session cookie, which covers
+    clients that are not logged in yet, and `users.last_write_at`, which covers
+    writes whose cookie never reaches the client, such as those made over a
+    WebSocket or by a write-behind flush. Both hold whichever worker serves the
+    next request. Without a read replica this does nothing.
+
+    Parameters:
+    - async_session (AsyncSession): The session making the write.
+    - user_ids (UUID): The users whose data is written.
+    """
+    if not get_settings().database_read_url:
+        return
+    # Imported here because the models import this module
+    from .models import User
+
+    session = _client_session.get()
+    if session is not None:
+        session[LAST_WRITE_KEY] = time.time()
+    if user_ids:
+        await async_session.execute(
+            update(User)
+            .filter(User.id.in_(set(user_ids)))
+            # Not a change to the user, so `updated_at` is kept as it is
+            .values(last_write_at=utcnow(), updated_at=User.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+
+
+async def get_read_session_factory(user_id: UUID | None = None) -> async_sessionmaker:
+    """
+    Picks the session factory for the current client's reads: the primary within
+    the read-your-writes window, the replica otherwise.
+
+    The client's cookie is checked first. Failing that, the last write of the
+    user, given or logged in through the session, is looked up on the primary.
+
+    Parameters:
+    - user_id (UUID | None): The user reading, when not logged in by the session,
+      e.g. over a WebSocket.
+    """
+    settings = get_settings()
+    if not settings.database_read_url:
+        return AsyncReadSessionLocal
+    window = settings.read_your_writes_seconds
+    session = _client_session.get()
+    if session is not None:
+        last_write_at = session.get(LAST_WRITE_KEY)
+        if last_write_at is not None and time.time() - last_write_at < window:
+            return AsyncSessionLocal
+        if user_id is None and session.get("user_id") is not None:
+            try:
+                user_id = UUID(session["user_id"])
+            except ValueError:
+                pass
+    if user_id is not None:
+        from .models import User
+
+        async with AsyncSessionLocal() as primary:
+            last_write_at = await primary.scalar(
+                select(User.last_write_at).filter(User.id == user_id)
+            )
+        if last_write_at is not None and utcnow() - last_write_at < timedelta(
+            seconds=window
+        ):
+            return AsyncSessionLocal
+    return AsyncReadSessionLocal
+
+
+async def get_read_session():
+    """
+    Asynchronous generator function that returns a session for read-only queries.
+
+    The session is bound to the read replica, unless the client wrote within the
+    read-your-writes window, in which case it is bound to the primary. Never
+    write through this session.
+
+    Yields:
+        async_session: An async session object.
+    """
+    async with (await get_read_session_factory())() as async_session:
+        yield async_session
@@ -1,23 +1,104 @@
+import asyncio
+
+from sqlalchemy import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import QueuePool
+
 from .models import Base
-from .config import async_engine
+from .config import get_async_engine, get_async_read_engine, is_memory_database
+from ..planner.search import create_search_index
+
+ALEMBIC_CONFIG = "alembic.ini"
 
 
 async def init_db():
     """
-    Initializes the database by creating all the tables defined in the metadata.
+    Initializes the database by creating all the tables defined in the metadata,
+    along with the full-text search index.
 
     Returns:
         None
     """
-    async with async_engine.begin() as conn:
+    async with get_async_engine().begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await create_search_index(conn)
+
+
+def get_migration_heads() -> set[str]:
+    """
+    Returns the head revisions of the migration scripts.
+    """
+    # alembic is only needed for this startup check, so it is not imported with
+    # the module
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    script = ScriptDirectory.from_config(Config(ALEMBIC_CONFIG))
+    return set(script.get_heads())
+
+
+def get_schema_revisions(connection: Connection) -> set[str]:
+    from alembic.runtime.migration import MigrationContext
+
+    return set(MigrationContext.configure(connection).get_current_heads())
+
+
+async def check_schema_version() -> None:
+    """
+    Checks that the database has been migrated to the latest revision.
+
+    This reads the `alembic_version` table and never runs DDL, so any number of
+    workers can start at once. Migrations are applied with `manage.py migrate`.
+
+    Raises:
+        RuntimeError: If the database is behind or ahead of the migration scripts.
+    """
+    expected = get_migration_heads()
+    async with get_async_engine().connect() as conn:
+        current = await conn.run_sync(get_schema_revisions)
+    if current != expected:
+        raise RuntimeError(
+            f"Database schema is at revision {', '.join(sorted(current)) or 'none'} "
+            f"but the code expects {', '.join(sorted(expected))}. "
+            "Run `python manage.py migrate`."
+        )
+
+
+async def prepare_db() -> None:
+    """
+    Readies the database at startup.
+
+    An in-memory SQLite database starts empty and is private to this process, so
+    its schema is created directly. Any other database is managed by migrations
+    and only has its schema version checked.
+    """
+    if is_memory_database(get_async_engine()):
+        await init_db()
+    else:
+        await check_schema_version()
+
+
+async def warm_db_pools() -> None:
+    """
+    Opens the connection pools' connections at startup, so the first requests
+    after a deploy don't each wait for a new database connection.
+    """
+
+    async def connect(engine: AsyncEngine) -> None:
+        async with engine.connect():
+            pass
+
+    for engine in {get_async_engine(), get_async_read_engine()}:
+        size = engine.pool.size() if isinstance(engine.pool, QueuePool) else 1
+        await asyncio.gather(*(connect(engine) for _ in range(size)))
 
 
 async def dispose_db():
     """
     Dispose the database connection.
 
-    This function is responsible for disposing the database connection by calling the `dispose()` method of the `async_engine` object.
+    This function is responsible for disposing the database connection by calling the `dispose()` method of the primary engine,
+    and of the read replica engine if one is configured.
 
     Parameters:
         None
@@ -25,4 +106,6 @@ async def dispose_db():
     Returns:
         None
     """
-    await async_engine.dispose()
+    await get_async_engine().dispose()
+    if get_async_read_engine() is not get_async_engine():
+        await get_async_read_engine().dispose()
@@ -3,16 +3,26 @@ from uuid import uuid4, UUID
 
 from email_validator import validate_email, EmailNotValidError
 
-from sqlalchemy import func, ForeignKey
+from sqlalchemy import func, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import mapped_column, relationship, Mapped, validates
 
-from ..core.utils import generate_password_hash, verify_password
+from ..core.config import get_settings
+from ..core.utils import check_password_hash, hash_password
+from ..planner.questions import get_question_catalog
 from .config import Base
 from .enums import PlanType
+from .types import CompressedText
+
+# Relationships are never loaded implicitly: every query declares the loader
+# options it needs. With `db_raise_on_lazy_load` (meant for tests) a forgotten
+# option fails loudly instead of emitting an extra query.
+RELATIONSHIP_LAZY = "raise" if get_settings().db_raise_on_lazy_load else "select"
 
 
 class User(Base):
     __tablename__ = "users"
+    # Fetch server-side defaults with RETURNING so signup is a single round trip
+    __mapper_args__ = {"eager_defaults": True}
 
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
     username: Mapped[str] = mapped_column(unique=True, index=True)
@@ -23,12 +33,16 @@ class User(Base):
     updated_at: Mapped[datetime] = mapped_column(
         default=func.now(), onupdate=func.now(), index=True
     )
+    # Tokens issued to the user up to this time are rejected, see `revoke_tokens`
+    tokens_valid_after: Mapped[datetime | None] = mapped_column(default=None)
+    # Time of the user's last write, see `mark_recent_write`
+    last_write_at: Mapped[datetime | None] = mapped_column(default=None)
 
     questions: Mapped[list["Question"]] = relationship(
-        "Question", back_populates="user"
+        "Question", back_populates="user", lazy=RELATIONSHIP_LAZY
     )
     plans: Mapped[list["Plan"]] = relationship(
-        "Plan", back_populates="user", lazy="selectin"
+        "Plan", back_populates="user", lazy=RELATIONSHIP_LAZY
     )
 
     @validates("email")
@@ -40,38 +54,132 @@ class User(Base):
         return email
 
     async def set_password(self, password: str) -> None:
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = await hash_password(password)
 
     async def check_password(self, password: str) -> bool:
-        return verify_password(password, self.password_hash)
+        valid, new_hash = await check_password_hash(password, self.password_hash)
+        if valid and new_hash is not None:
+            # The bcrypt cost changed since this hash was made, so upgrade it
+            self.password_hash = new_hash
+        return valid
 
 
 class Plan(Base):
     __tablename__ = "plans"
+    # created_at comes back with RETURNING, so no refresh reopens a transaction
+    # (and holds a connection) after the commit
+    __mapper_args__ = {"eager_defaults": True}
 
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
     user_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"), index=True)
     plan_type: Mapped[PlanType] = mapped_column()
-    description: Mapped[str] = mapped_column()
+    description: Mapped[str] = mapped_column(
+        CompressedText(
+            threshold=get_settings().plan_compression_threshold,
+            level=get_settings().plan_compression_level,
+        )
+    )
     created_at: Mapped[datetime] = mapped_column(default=func.now(), index=True)
 
-    user: Mapped["User"] = relationship("User", back_populates="plans")
+    user: Mapped["User"] = relationship(
+        "User", back_populates="plans", lazy=RELATIONSHIP_LAZY
+    )
     questions: Mapped[list["Question"]] = relationship(
-        "Question", back_populates="plan", lazy="selectin"
+        "Question", back_populates="plan", lazy=RELATIONSHIP_LAZY
     )
 
 
+class PlanArchive(Base):
+    """
+    A batch of a user's old plans and their answers, moved out of the live
+    tables by the retention job.
+
+    `data` holds one JSON document per plan, in the same format as the plan
+    export, compressed as a whole.
+    """
+
+    __tablename__ = "plan_archives"
+
+    id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
+    user_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"), index=True)
+    plan_count: Mapped[int] = mapped_column()
+    answer_count: Mapped[int] = mapped_column()
+    oldest_plan_at: Mapped[datetime] = mapped_column()
+    newest_plan_at: Mapped[datetime] = mapped_column()
+    data: Mapped[str] = mapped_column(CompressedText(threshold=0, level=9))
+    created_at: Mapped[datetime] = mapped_column(default=func.now())
+
+
+class LLMUsage(Base):
+    """
+    One OpenAI request, attributed to the user and plan type it was made for.
+
+    Rows are written in batches by the usage ledger, so `created_at` is set when
+    the request finished rather than when the row was inserted.
+    """
+
+    __tablename__ = "llm_usage"
+    __table_args__ = (
+        Index("ix_llm_usage_user_id_created_at", "user_id", "created_at"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"))
+    operation: Mapped[str] = mapped_column()
+    plan_type: Mapped[PlanType | None] = mapped_column(nullable=True)
+    model: Mapped[str] = mapped_column()
+    prompt_version: Mapped[str] = mapped_column()
+    prompt_tokens: Mapped[int] = mapped_column()
+    completion_tokens: Mapped[int] = mapped_column()
+    cached_tokens: Mapped[int] = mapped_column()
+    latency_ms: Mapped[float] = mapped_column()
+    created_at: Mapped[datetime] = mapped_column()
+
+
+class CatalogQuestion(Base):
+    """
+    One version of a question from the question bank.
+
+    Answers reference a catalog row by its small integer ID instead of repeating
+    the question text. Rewording a question adds a new version, so older answers
+    keep pointing at the wording they were given for.
+    """
+
+    __tablename__ = "question_catalog"
+    __table_args__ = (UniqueConstraint("key", "version"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    key: Mapped[str] = mapped_column()
+    version: Mapped[int] = mapped_column(default=1)
+    plan_type: Mapped[PlanType] = mapped_column()
+    question: Mapped[str] = mapped_column()
+    purpose: Mapped[str] = mapped_column()
+    created_at: Mapped[datetime] = mapped_column(default=func.now())
+
+
 class Question(Base):
     __tablename__ = "questions"
+    __mapper_args__ = {"eager_defaults": True}
 
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
     user_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"), index=True)
     plan_id: Mapped[UUID | None] = mapped_column(
         ForeignKey("plans.id"), index=True, nullable=True
     )
-    question: Mapped[str] = mapped_column()
+    catalog_id: Mapped[int] = mapped_column(
+        ForeignKey("question_catalog.id"), index=True
+    )
     answer: Mapped[str] = mapped_column()
     created_at: Mapped[datetime] = mapped_column(default=func.now(), index=True)
 
-    user: Mapped["User"] = relationship("User", back_populates="questions")
-    plan: Mapped["Plan"] = relationship("Plan", back_populates="questions")
+    user: Mapped["User"] = relationship(
+        "User", back_populates="questions", lazy=RELATIONSHIP_LAZY
+    )
+    plan: Mapped["Plan"] = relationship(
+        "Plan", back_populates="questions", lazy=RELATIONSHIP_LAZY
+    )
+
+    @property
+    def question(self) -> str:
+        # Resolved from the in-memory catalog, so reads never join for the text
+        return get_question_catalog().get(self.catalog_id).question
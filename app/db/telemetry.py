@@ -0,0 +1,287 @@
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..core.config import get_settings
+from ..core.metrics import (
+    db_repeated_statements,
+    db_statements_per_unit,
+    db_time_per_unit_seconds,
+)
+
+logger = logging.getLogger(__name__)
+
+STATEMENTS_HEADER = b"x-db-statements"
+DB_TIME_HEADER = b"x-db-time-ms"
+
+
+@dataclass
+class PoolTelemetry:
+    checkouts: int = 0
+    timeouts: int = 0
+    wait_seconds_total: float = 0.0
+    wait_seconds_max: float = 0.0
+    connects: int = 0
+    connect_seconds_total: float = 0.0
+    connect_seconds_max: float = 0.0
+
+    def record_wait(self, seconds: float) -> None:
+        self.checkouts += 1
+        self.wait_seconds_total += seconds
+        if seconds > self.wait_seconds_max:
+            self.wait_seconds_max = seconds
+
+    def record_connect(self, seconds: float) -> None:
+        self.connects += 1
+        self.connect_seconds_total += seconds
+        if seconds > self.connect_seconds_max:
+            self.connect_seconds_max = seconds
+
+
+# Time spent opening connections during the checkout in progress in this
+# context, so that `InstrumentedAsyncQueuePool` can leave it out of the wait
+_checkout_connect_seconds: ContextVar[list[float] | None] = ContextVar(
+    "checkout_connect_seconds", default=None
+)
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """
+    The default asyncio queue pool, recording how long each checkout waited for
+    a connection to be free and, separately, how long new connections took to open.
+
+    A cold pool opens its connections during checkouts; counting that as waiting
+    would pass slow connects off as contention.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.telemetry = PoolTelemetry()
+
+    def _do_get(self):
+        if _checkout_connect_seconds.get() is not None:
+            # The base pool retries by calling itself, within the same checkout
+            return super()._do_get()
+        connect_seconds = [0.0]
+        token = _checkout_connect_seconds.set(connect_seconds)
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.telemetry.timeouts += 1
+            raise
+        finally:
+            _checkout_connect_seconds.reset(token)
+            self.telemetry.record_wait(
+                time.perf_counter() - started - connect_seconds[0]
+            )
+
+    def _create_connection(self):
+        started = time.perf_counter()
+        try:
+            return super()._create_connection()
+        finally:
+            seconds = time.perf_counter() - started
+            self.telemetry.record_connect(seconds)
+            connect_seconds = _checkout_connect_seconds.get()
+            if connect_seconds is not None:
+                connect_seconds[0] += seconds
+
+
+def pool_status(pool: Pool) -> dict:
+    """
+    Reports a pool's current occupancy, cumulative checkout wait statistics and
+    the time spent opening connections, which is not part of the wait.
+
+    Returns:
+        dict: Pool size and connection counts, plus wait telemetry if the pool records it.
+    """
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        status.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+            timeout_seconds=pool.timeout(),
+        )
+    telemetry: PoolTelemetry | None = getattr(pool, "telemetry", None)
+    if telemetry is not None:
+        status.update(
+            checkouts=telemetry.checkouts,
+            timeouts=telemetry.timeouts,
+            wait_seconds_total=telemetry.wait_seconds_total,
+            wait_seconds_max=telemetry.wait_seconds_max,
+            wait_seconds_avg=(
+                telemetry.wait_seconds_total / telemetry.checkouts
+                if telemetry.checkouts
+                else 0.0
+            ),
+            connects=telemetry.connects,
+            connect_seconds_total=telemetry.connect_seconds_total,
+            connect_seconds_max=telemetry.connect_seconds_max,
+        )
+    return status
+
+
+class RepeatedStatementError(RuntimeError):
+    """
+    Raised when one statement shape runs more often than
+    `db_statement_repeat_limit` in a single unit of work, with
+    `db_statement_repeat_action` set to "raise", as in tests.
+    """
+
+
+@dataclass
+class StatementStats:
+    """
+    The statements executed during one HTTP request, WebSocket message or
+    write-behind flush.
+
+    Statements are grouped by shape: the compiled SQL before parameters are
+    bound, so the same query for different rows counts as a repeat.
+    """
+
+    unit: str
+    route: str
+    statements: int = 0
+    seconds: float = 0.0
+    shapes: dict[str, int] = field(default_factory=dict)
+    repeated: int = 0
+
+    def record(self, shape: str, seconds: float) -> None:
+        self.statements += 1
+        self.seconds += seconds
+        count = self.shapes[shape] = self.shapes.get(shape, 0) + 1
+        settings = get_settings()
+        limit = settings.db_statement_repeat_limit
+        if limit <= 0 or count != limit + 1:
+            return
+        self.repeated += 1
+        message = (
+            f"Statement ran more than {limit} times in one {self.unit} unit "
+            f"({self.route}); likely an N+1 query: {shape[:500]}"
+        )
+        if settings.db_statement_repeat_action == "raise":
+            raise RepeatedStatementError(message)
+        logger.warning(message, extra={"unit": self.unit, "route": self.route})
+
+    def observe(self) -> None:
+        db_statements_per_unit.labels(self.unit, self.route).observe(self.statements)
+        db_time_per_unit_seconds.labels(self.unit, self.route).observe(self.seconds)
+        if self.repeated:
+            db_repeated_statements.labels(self.unit, self.route).inc(self.repeated)
+
+
+statement_stats: ContextVar[StatementStats | None] = ContextVar(
+    "statement_stats", default=None
+)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if statement_stats.get() is not None:
+        context._statement_started = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = statement_stats.get()
+    started = getattr(context, "_statement_started", None)
+    if stats is None or started is None:
+        return
+    compiled = context.compiled
+    stats.record(
+        compiled.string if compiled is not None else statement,
+        time.perf_counter() - started,
+    )
+
+
+def instrument_statements(engine: AsyncEngine) -> None:
+    """
+    Counts and times the engine's statements against the current unit of work.
+
+    Statements run outside `track_statements`, such as background jobs, cost a
+    context variable lookup and are not recorded.
+    """
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", after_cursor_execute)
+
+
+class track_statements:
+    """
+    Records the statements executed inside the `with` block as one unit of work,
+    and observes the totals in the metrics when it exits.
+    """
+
+    def __init__(self, unit: str, route: str) -> None:
+        self.stats = StatementStats(unit, route)
+
+    def __enter__(self) -> StatementStats:
+        self.token = statement_stats.set(self.stats)
+        return self.stats
+
+    def __exit__(self, *exc_info) -> None:
+        statement_stats.reset(self.token)
+        self.stats.observe()
+
+
+def start_unit(unit: str, route: str) -> None:
+    """
+    Starts a unit of work that a `with` block cannot delimit, such as a WebSocket
+    message whose handling waits for further messages. End it with `finish_unit`.
+    """
+    statement_stats.set(StatementStats(unit, route))
+
+
+def finish_unit() -> None:
+    """
+    Ends the unit of work started by `start_unit`, if any, and observes its totals.
+    """
+    stats = statement_stats.get()
+    if stats is not None:
+        statement_stats.set(None)
+        stats.observe()
+
+
+class StatementCountMiddleware:
+    """
+    ASGI middleware that tracks each HTTP request as a unit of work.
+
+    With `debug` enabled, the statement count and database time up to the start
+    of the response are returned in `X-DB-Statements` and `X-DB-Time-Ms`.
+    """
+
+    def __init__(self, app: ASGIApp, headers: bool = False) -> None:
+        self.app = app
+        self.headers = headers
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        tracker = track_statements("http", scope["path"])
+        stats = tracker.stats
+
+        async def send_wrapper(message: Message) -> None:
+            if self.headers and message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (STATEMENTS_HEADER, str(stats.statements).encode()),
+                    (DB_TIME_HEADER, f"{stats.seconds * 1000:.2f}".encode()),
+                ]
+            await send(message)
+
+        with tracker:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                # Labelled by route template once routing has happened, so
+                # path parameters do not create new series
+                stats.route = getattr(scope.get("route"), "path", "unmatched")
@@ -0,0 +1,72 @@
+import zlib
+
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+# First byte of every stored value, naming the format of the rest
+FORMAT_RAW = 0
+FORMAT_ZLIB = 1
+
+
+def compress_text(value: str, threshold: int, level: int = 6) -> bytes:
+    """
+    Encodes text for storage, compressing it if it is at least `threshold` bytes.
+
+    Compression is skipped when it would not make the value smaller.
+
+    Parameters:
+    - value (str): The text to store.
+    - threshold (int): The minimum encoded size, in bytes, worth compressing.
+    - level (int): The zlib compression level.
+
+    Returns:
+        bytes: A format byte followed by the payload.
+    """
+    data = value.encode("utf-8")
+    if len(data) >= threshold:
+        compressed = zlib.compress(data, level)
+        if len(compressed) < len(data):
+            return bytes((FORMAT_ZLIB,)) + compressed
+    return bytes((FORMAT_RAW,)) + data
+
+
+def decompress_text(value: bytes) -> str:
+    """
+    Decodes a value written by `compress_text`.
+
+    Raises:
+        ValueError: If the format byte is unknown.
+    """
+    value = bytes(value)
+    fmt, payload = value[0], value[1:]
+    if fmt == FORMAT_RAW:
+        return payload.decode("utf-8")
+    if fmt == FORMAT_ZLIB:
+        return zlib.decompress(payload).decode("utf-8")
+    raise ValueError(f"Unknown compressed text format {fmt}")
+
+
+class CompressedText(TypeDecorator):
+    """
+    Text stored as binary, compressed with zlib once it reaches `threshold` bytes.
+
+    Every value carries a leading format byte so the encoding can change later
+    without rewriting existing rows.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, threshold: int = 1024, level: int = 6) -> None:
+        super().__init__()
+        self.threshold = threshold
+        self.level = level
+
+    def process_bind_param(self, value: str | None, dialect) -> bytes | None:
+        if value is None:
+            return None
+        return compress_text(value, self.threshold, self.level)
+
+    def process_result_value(self, value: bytes | str | None, dialect) -> str | None:
+        if value is None or isinstance(value, str):
+            return value
+        return decompress_text(value)
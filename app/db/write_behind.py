@@ -0,0 +1,120 @@
+import asyncio
+import contextvars
+import logging
+from typing import Awaitable, Callable, Generic, TypeVar
+
+from .telemetry import track_statements
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue(Generic[T]):
+    """
+    Buffers rows in memory and writes them in groups, so many small writes share
+    one transaction and one commit.
+
+    A batch is written once it has `max_batch` rows or its first row has waited
+    `max_delay` seconds, whichever comes first. At most `max_size` rows wait in the
+    queue; `put` blocks when it is full, which pushes back on producers instead of
+    letting memory grow while the database is slow.
+
+    Parameters:
+    - flush (Callable[[list[T]], Awaitable[None]]): Writes and commits one batch.
+    - max_batch (int): The most rows written in one batch.
+    - max_delay (float): The longest a row waits for its batch to fill, in seconds.
+    - max_size (int): The most rows waiting to be written.
+    - name (str): Labels the queue's flushes, each a unit of work for the
+      statement counters.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[list[T]], Awaitable[None]],
+        max_batch: int = 200,
+        max_delay: float = 0.01,
+        max_size: int = 5000,
+        name: str = "write_behind",
+    ) -> None:
+        self.flush = flush
+        self.name = name
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: asyncio.Queue[tuple[T, asyncio.Future[T]]] = asyncio.Queue(
+            max_size
+        )
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    async def put(self, item: T) -> asyncio.Future[T]:
+        """
+        Queues a row for the next batch, waiting for room if the queue is full.
+
+        Returns:
+            asyncio.Future[T]: Resolves to the row once its batch is committed, or
+            to the error that made the batch fail.
+        """
+        if self._task is None or self._task.done():
+            # Started from whichever request queues first; a fresh context keeps
+            # that request's log context off the writer's records
+            self._task = asyncio.create_task(self._run(), context=contextvars.Context())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return future
+
+    async def close(self) -> None:
+        """
+        Writes every queued row and stops the writer task.
+        """
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _next_batch(self) -> list[tuple[T, asyncio.Future[T]]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_delay
+        while len(batch) < self.max_batch:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                # The writer runs in a fresh context, so its statements would
+                # otherwise be counted against nothing
+                with track_statements("write_behind", self.name):
+                    await self.flush([item for item, _ in batch])
+            except Exception as e:
+                logger.exception(
+                    "Write-behind flush failed", extra={"rows": len(batch)}
+                )
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for item, future in batch:
+                    if not future.done():
+                        future.set_result(item)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
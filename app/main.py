@@ -1,14 +1,35 @@
-from contextlib import asynccontextmanager
+# Imported first so that the startup timings cover the imports below
+from .core.startup import FirstRequestTimer, startup_timings
+
+import asyncio
+from contextlib import asynccontextmanager, suppress
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 
 from starlette.middleware.sessions import SessionMiddleware
 
-from .core.config import get_settings
-from .db.init_db import init_db, dispose_db
+from .core.config import get_password_context, get_settings
+from .core.log import RequestContextMiddleware, setup_logging, shutdown_logging
+from .core.metrics import CONTENT_TYPE, MetricsMiddleware, metrics_registry
+from .core.profiling import ProfilingMiddleware
+from .core.utils import shutdown_password_executor, start_password_executor
+from .db.config import (
+    AsyncSessionLocal,
+    ReadYourWritesMiddleware,
+    get_async_engine,
+    get_async_read_engine,
+)
+from .db.init_db import prepare_db, dispose_db, warm_db_pools
+from .db.telemetry import StatementCountMiddleware, pool_status
 from .auth import views as auth_views
 from .planner import views as planner_views
+from .planner.crud import get_answer_queue, sync_question_catalog
+from .planner.openai_client import get_openai_client
+from .planner.questions import load_question_bank
+from .planner.retention import start_retention_task
+from .planner.usage import get_usage_ledger
 
 
 @asynccontextmanager
@@ -28,9 +49,31 @@ async def lifespan(app: FastAPI):
         # Code to be executed within the lifespan of the application
     ```
     """
-    await init_db()
+    setup_logging()
+    await prepare_db()
+    await warm_db_pools()
+    async with AsyncSessionLocal() as session:
+        await sync_question_catalog(session, load_question_bank())
+    # Heavy libraries are imported on first use; build their clients here so the
+    # first chat or login after a deploy doesn't pay for it
+    get_openai_client()
+    get_password_context()
+    start_password_executor()
+    # Off in the workers of a multi-worker server, which runs it separately
+    retention_task = start_retention_task() if get_settings().retention_in_app else None
+    startup_timings.mark_ready()
     yield
+    if retention_task is not None:
+        retention_task.cancel()
+        # Wait for a sweep in progress to unwind before the engine is disposed
+        with suppress(asyncio.CancelledError):
+            await retention_task
+    # Answers still waiting for a group commit are written before the engine goes
+    await get_answer_queue().close()
+    await get_usage_ledger().close()
+    shutdown_password_executor()
     await dispose_db()
+    shutdown_logging()
 
 
 app = FastAPI(
@@ -38,6 +81,7 @@ app = FastAPI(
     title=get_settings().app_name,
     version=get_settings().app_version,
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     docs_url="/api/docs",
     redoc_url="/api/redoc",
     openapi_url="/api/openapi.json",
@@ -45,6 +89,9 @@ app = FastAPI(
 
 
 # ADD MIDDLEWARES
+## ADD READ-YOUR-WRITES ROUTING, INSIDE THE SESSION MIDDLEWARE
+app.add_middleware(ReadYourWritesMiddleware)
+
 ## ADD SESSION MIDDLEWARE
 app.add_middleware(
     SessionMiddleware,
@@ -62,6 +109,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+## ADD STARTUP TIMER
+app.add_middleware(FirstRequestTimer, timings=startup_timings)
+
+## ADD REQUEST METRICS
+app.add_middleware(MetricsMiddleware)
+
+## ADD SQL STATEMENT COUNTS, AS HEADERS IN DEBUG
+app.add_middleware(StatementCountMiddleware, headers=get_settings().debug)
+
+## ADD REQUEST AND SESSION IDS FOR LOGGING
+app.add_middleware(RequestContextMiddleware)
+
+## ADD PROFILER, ONLY WHEN ENABLED
+if get_settings().profile_token or get_settings().profile_sample_rate > 0:
+    app.add_middleware(
+        ProfilingMiddleware,
+        directory=get_settings().profile_dir,
+        token=get_settings().profile_token,
+        sample_rate=get_settings().profile_sample_rate,
+    )
+
 
 # ADD ROUTES
 app.include_router(auth_views.router)
@@ -91,3 +159,33 @@ async def read_root(request: Request):
             },
         },
     }
+
+
+@app.get("/health/db", include_in_schema=False)
+async def db_health():
+    """
+    Reports connection pool occupancy and checkout wait times, for sizing the pool
+    against the database's connection limit.
+    """
+    status = {"pool": pool_status(get_async_engine().pool)}
+    if get_async_read_engine() is not get_async_engine():
+        status["read_pool"] = pool_status(get_async_read_engine().pool)
+    return status
+
+
+@app.get("/health/startup", include_in_schema=False)
+async def startup_health():
+    """
+    Reports how long this worker took from import to being ready, and to serving
+    its first request.
+    """
+    return startup_timings.model_dump()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Exposes request, chat, database and OpenAI metrics in the Prometheus text
+    format.
+    """
+    return PlainTextResponse(metrics_registry.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,71 @@
+import hashlib
+from functools import lru_cache
+from typing import Iterable
+from uuid import UUID
+
+from ..core.cache import LRUCache
+from ..core.config import get_settings
+
+# Bump whenever the serialized shape of a plan changes so that clients holding
+# an old representation are not answered with 304 Not Modified.
+PLAN_REPRESENTATION_VERSION = 1
+
+
+@lru_cache
+def get_plan_response_cache() -> LRUCache[UUID, bytes]:
+    """
+    Returns the process-wide cache of serialized plan response bodies.
+
+    Deleting or archiving plans only invalidates this process's copy, so entries
+    expire after `plan_cache_ttl_seconds`; that bounds how long other workers
+    keep serving a plan that is gone.
+    """
+    settings = get_settings()
+    return LRUCache(
+        maxsize=settings.plan_cache_size, ttl=settings.plan_cache_ttl_seconds
+    )
+
+
+def plan_etag(plan_id: UUID) -> str:
+    """
+    Builds a strong ETag for a plan.
+
+    Plans are immutable once created, so the tag only depends on the plan ID
+    and the representation version and can be computed without loading the row.
+    """
+    digest = hashlib.sha256(
+        f"{plan_id}:{PLAN_REPRESENTATION_VERSION}:{get_settings().app_version}".encode()
+    ).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def plan_cache_headers(plan_id: UUID) -> dict[str, str]:
+    return {
+        "ETag": plan_etag(plan_id),
+        "Cache-Control": f"private, max-age={get_settings().plan_cache_max_age}, immutable",
+    }
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Checks an `If-None-Match` header value against an ETag using the weak
+    comparison required for conditional GET requests.
+
+    `*` is never treated as a match: it says nothing about which representation
+    the client holds, so the plan is sent (or found missing) as usual.
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def invalidate_plans(plan_ids: Iterable[UUID]) -> None:
+    cache = get_plan_response_cache()
+    for plan_id in plan_ids:
+        cache.pop(plan_id)
@@ -1,76 +1,446 @@
-from uuid import UUID
+import asyncio
+from datetime import datetime
+from functools import lru_cache
+from typing import AsyncIterator
+from uuid import UUID, uuid4
 
-from sqlalchemy import delete
+from sqlalchemy import Row, String, cast, delete, func, insert, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import noload, raiseload, selectinload
 
+from ..core.config import get_settings
+from ..core.metrics import db_operation_seconds
+from ..db.config import AsyncSessionLocal, mark_recent_write
 from ..db.enums import PlanType
-from ..db.models import Plan, Question
+from ..db.models import CatalogQuestion, LLMUsage, Plan, Question
+from ..db.write_behind import WriteBehindQueue
+from .cache import invalidate_plans
+from .similarity import forget_plans
+from .questions import CatalogEntry, get_question_catalog
+from .search import (
+    index_answers,
+    index_plan,
+    index_question,
+    remove_from_search_index,
+    search_documents,
+)
+from .schemas import SearchHit, UsageRollup
 
 
 async def create_plan(
-    async_session: AsyncSession, user_id: UUID, description: str, plan_type: PlanType
+    async_session: AsyncSession,
+    user_id: UUID,
+    description: str,
+    plan_type: PlanType,
+    question_ids: list[UUID] | None = None,
 ) -> Plan:
-    plan = Plan(user_id=user_id, description=description, plan_type=plan_type)
+    """
+    Creates a plan and tags the answers it was generated from with its ID, in one
+    transaction.
+
+    Queued answers must be committed before their IDs are passed here; see
+    `queue_question`.
+    """
+    plan = Plan(
+        user_id=user_id, description=description, plan_type=plan_type, questions=[]
+    )
     async_session.add(plan)
+    await async_session.flush()
+    if question_ids:
+        await async_session.execute(
+            update(Question)
+            .filter(Question.id.in_(question_ids))
+            .values(plan_id=plan.id)
+            .execution_options(synchronize_session=False)
+        )
+    await index_plan(async_session, plan)
+    await mark_recent_write(async_session, user_id)
     await async_session.commit()
-    await async_session.refresh(plan)
     return plan
 
 
 async def get_plan(async_session: AsyncSession, plan_id: UUID) -> Plan | None:
-    result = await async_session.execute(select(Plan).filter_by(id=plan_id))
+    result = await async_session.execute(
+        select(Plan).filter_by(id=plan_id).options(selectinload(Plan.questions))
+    )
     return result.scalar_one_or_none()
 
 
+async def purge_plans(
+    async_session: AsyncSession, plan_ids: list[UUID]
+) -> tuple[list[Row], list[Row]]:
+    """
+    Deletes plans together with their answers and search index entries, within
+    the current transaction.
+
+    Returns:
+        tuple[list[Row], list[Row]]: The deleted plan rows and answer rows.
+    """
+    questions = (
+        await async_session.execute(
+            delete(Question)
+            .filter(Question.plan_id.in_(plan_ids))
+            .returning(
+                Question.id,
+                Question.user_id,
+                Question.plan_id,
+                Question.catalog_id,
+                Question.answer,
+                Question.created_at,
+            )
+        )
+    ).all()
+    plans = (
+        await async_session.execute(
+            delete(Plan)
+            .filter(Plan.id.in_(plan_ids))
+            .returning(
+                Plan.id,
+                Plan.user_id,
+                Plan.plan_type,
+                Plan.description,
+                Plan.created_at,
+            )
+        )
+    ).all()
+    await remove_from_search_index(
+        async_session, [*plan_ids, *(question.id for question in questions)]
+    )
+    return plans, questions
+
+
 async def delete_plan(async_session: AsyncSession, plan_id: UUID) -> None:
-    await async_session.execute(delete(Plan).filter_by(id=plan_id))
+    await purge_plans(async_session, [plan_id])
     await async_session.commit()
+    invalidate_plans([plan_id])
+    forget_plans([plan_id])
 
 
 async def get_plans_by_user_id(
     async_session: AsyncSession, user_id: UUID
 ) -> list[Plan]:
-    result = await async_session.execute(select(Plan).filter_by(user_id=user_id))
+    result = await async_session.execute(
+        select(Plan).filter_by(user_id=user_id).options(selectinload(Plan.questions))
+    )
     return result.scalars().all()
 
 
-async def delete_plans_by_user_id(async_session: AsyncSession, user_id: UUID) -> None:
-    await async_session.execute(delete(Plan).filter_by(user_id=user_id))
-    await async_session.commit()
+async def stream_plan_history(
+    async_session: AsyncSession, user_id: UUID, batch_size: int = 500
+) -> AsyncIterator[list[tuple[Plan, list[Question]]]]:
+    """
+    Streams a user's plans in batches through a server-side cursor.
+
+    Each batch of plans is joined with its questions in a single query instead
+    of per-plan loads, and the session is cleared between batches so memory stays
+    bounded regardless of how many plans the user has.
+
+    Yields:
+        list[tuple[Plan, list[Question]]]: A batch of plans with their questions.
+    """
+    plans = await async_session.stream_scalars(
+        select(Plan)
+        .filter_by(user_id=user_id)
+        .order_by(Plan.created_at, Plan.id)
+        .options(noload(Plan.questions))
+        .execution_options(yield_per=batch_size)
+    )
+    async for partition in plans.partitions():
+        questions_by_plan: dict[UUID, list[Question]] = {
+            plan.id: [] for plan in partition
+        }
+        questions = await async_session.scalars(
+            select(Question)
+            .filter(Question.plan_id.in_(questions_by_plan))
+            .order_by(Question.created_at)
+        )
+        for question in questions:
+            questions_by_plan[question.plan_id].append(question)
+        yield [(plan, questions_by_plan[plan.id]) for plan in partition]
+        async_session.expunge_all()
+
+
+async def stream_unassigned_questions(
+    async_session: AsyncSession, user_id: UUID, batch_size: int = 500
+) -> AsyncIterator[list[Question]]:
+    """
+    Streams a user's answers that were never attached to a plan, in batches.
+    """
+    questions = await async_session.stream_scalars(
+        select(Question)
+        .filter_by(user_id=user_id, plan_id=None)
+        .order_by(Question.created_at, Question.id)
+        .execution_options(yield_per=batch_size)
+    )
+    async for partition in questions.partitions():
+        yield partition
+        async_session.expunge_all()
+
+
+async def delete_plans_by_user_id(
+    async_session: AsyncSession, user_id: UUID, batch_size: int = 500
+) -> None:
+    """
+    Deletes all of a user's plans and their answers.
+
+    Each batch of plans is deleted and committed in its own transaction, so no
+    lock is held for long however many plans the user has.
+    """
+    while plan_ids := (
+        await async_session.scalars(
+            select(Plan.id).filter_by(user_id=user_id).limit(batch_size)
+        )
+    ).all():
+        await purge_plans(async_session, plan_ids)
+        await mark_recent_write(async_session, user_id)
+        await async_session.commit()
+        invalidate_plans(plan_ids)
+        forget_plans(plan_ids)
+
+
+def _latest_versions(rows: list[CatalogQuestion]) -> dict[str, CatalogQuestion]:
+    latest: dict[str, CatalogQuestion] = {}
+    for row in rows:
+        if row.key not in latest or row.version > latest[row.key].version:
+            latest[row.key] = row
+    return latest
+
+
+async def sync_question_catalog(
+    async_session: AsyncSession, questions: list[dict[str, str]]
+) -> None:
+    """
+    Brings the `question_catalog` table in line with the question bank and loads
+    it into the in-memory catalog.
+
+    New keys are added as version 1. A key whose question or purpose changed gets
+    a new version; the old one is kept for the answers that reference it.
+
+    Parameters:
+    - async_session (AsyncSession): The database session.
+    - questions (list[dict[str, str]]): The question bank, as in `questions.json`.
+    """
+    for attempt in range(2):
+        latest = _latest_versions(
+            (await async_session.scalars(select(CatalogQuestion))).all()
+        )
+        for q in questions:
+            row = latest.get(q["key"])
+            if (
+                row is not None
+                and row.question == q["question"]
+                and row.purpose == q["purpose"]
+            ):
+                continue
+            latest[q["key"]] = CatalogQuestion(
+                key=q["key"],
+                version=row.version + 1 if row is not None else 1,
+                plan_type=PlanType(q["plan_type"]),
+                question=q["question"],
+                purpose=q["purpose"],
+            )
+            async_session.add(latest[q["key"]])
+        try:
+            await async_session.commit()
+            break
+        except IntegrityError:
+            # Another worker synced the same change first; reload its rows
+            await async_session.rollback()
+            if attempt:
+                raise
+    rows = (await async_session.scalars(select(CatalogQuestion))).all()
+    latest = _latest_versions(rows)
+    get_question_catalog().load(
+        (
+            CatalogEntry(
+                id=row.id,
+                key=row.key,
+                version=row.version,
+                plan_type=row.plan_type,
+                question=row.question,
+                purpose=row.purpose,
+            )
+            for row in rows
+        ),
+        [latest[q["key"]].id for q in questions],
+    )
 
 
 async def create_question(
-    async_session: AsyncSession, user_id: UUID, question: str, answer: str
+    async_session: AsyncSession, user_id: UUID, catalog_id: int, answer: str
 ) -> Question:
-    question = Question(user_id=user_id, question=question, answer=answer)
+    question = Question(user_id=user_id, catalog_id=catalog_id, answer=answer)
     async_session.add(question)
+    await async_session.flush()
+    await index_question(async_session, question)
+    await mark_recent_write(async_session, user_id)
     await async_session.commit()
-    await async_session.refresh(question)
     return question
 
 
+async def insert_questions(async_session: AsyncSession, rows: list[dict]) -> None:
+    """
+    Inserts answers and indexes them for search in a single multi-row insert and
+    transaction.
+
+    Parameters:
+    - async_session (AsyncSession): The database session.
+    - rows (list[dict]): The answers, each with `id`, `user_id`, `catalog_id` and
+      `answer`.
+    """
+    await async_session.execute(insert(Question), rows)
+    await index_answers(async_session, rows)
+    await mark_recent_write(async_session, *(row["user_id"] for row in rows))
+    await async_session.commit()
+
+
+async def write_questions(rows: list[dict]) -> None:
+    with db_operation_seconds.labels("insert_questions").time():
+        async with AsyncSessionLocal() as async_session:
+            await insert_questions(async_session, rows)
+
+
+@lru_cache
+def get_answer_queue() -> WriteBehindQueue[dict]:
+    """
+    Returns the process-wide write-behind queue for chat answers.
+    """
+    settings = get_settings()
+    return WriteBehindQueue(
+        write_questions,
+        max_batch=settings.answer_queue_batch_size,
+        max_delay=settings.answer_queue_flush_ms / 1000,
+        max_size=settings.answer_queue_max_size,
+        name="questions",
+    )
+
+
+async def queue_question(
+    user_id: UUID, catalog_id: int, answer: str
+) -> asyncio.Future[dict]:
+    """
+    Queues an answer for the next group commit instead of committing it on its own.
+
+    The answer's ID is assigned here, so it can be referenced before the row is
+    written. Await the returned future before creating a plan from the answer.
+
+    Returns:
+        asyncio.Future[dict]: Resolves to the answer's row once it is committed.
+    """
+    # Only slow when the queue is full and pushing back
+    with db_operation_seconds.labels("queue_question").time():
+        return await get_answer_queue().put(
+            {
+                "id": uuid4(),
+                "user_id": user_id,
+                "catalog_id": catalog_id,
+                "answer": answer,
+            }
+        )
+
+
 async def get_question(
     async_session: AsyncSession, question_id: UUID
 ) -> Question | None:
-    result = await async_session.execute(select(Question).filter_by(id=question_id))
+    result = await async_session.execute(
+        select(Question).filter_by(id=question_id).options(raiseload("*"))
+    )
     return result.scalar_one_or_none()
 
 
 async def get_questions_by_plan_id(
     async_session: AsyncSession, plan_id: UUID
 ) -> list[Question]:
-    result = await async_session.execute(select(Question).filter_by(plan_id=plan_id))
+    result = await async_session.execute(
+        select(Question).filter_by(plan_id=plan_id).options(raiseload("*"))
+    )
     return result.scalars().all()
 
 
 async def delete_question(async_session: AsyncSession, question_id: UUID) -> None:
     await async_session.execute(delete(Question).filter_by(id=question_id))
+    await remove_from_search_index(async_session, [question_id])
     await async_session.commit()
 
 
 async def delete_questions_by_plan_id(
     async_session: AsyncSession, plan_id: UUID
 ) -> None:
-    await async_session.execute(delete(Question).filter_by(plan_id=plan_id))
+    result = await async_session.execute(
+        delete(Question).filter_by(plan_id=plan_id).returning(Question.id)
+    )
+    await remove_from_search_index(async_session, result.scalars().all())
     await async_session.commit()
+
+
+async def search_plans(
+    async_session: AsyncSession,
+    user_id: UUID,
+    query: str,
+    limit: int = 20,
+    offset: int = 0,
+) -> list[SearchHit]:
+    return await search_documents(async_session, user_id, query, limit, offset)
+
+
+USAGE_GROUPS = {
+    "day": lambda: cast(func.date(LLMUsage.created_at), String),
+    "operation": lambda: LLMUsage.operation,
+    "plan_type": lambda: LLMUsage.plan_type,
+    "prompt_version": lambda: LLMUsage.prompt_version,
+    "model": lambda: LLMUsage.model,
+}
+
+
+async def get_tokens_used_since(
+    async_session: AsyncSession, user_id: UUID, since: datetime
+) -> int:
+    result = await async_session.scalar(
+        select(
+            func.coalesce(
+                func.sum(LLMUsage.prompt_tokens + LLMUsage.completion_tokens), 0
+            )
+        ).filter(LLMUsage.user_id == user_id, LLMUsage.created_at >= since)
+    )
+    return int(result)
+
+
+async def get_usage_rollup(
+    async_session: AsyncSession, user_id: UUID, since: datetime, group_by: str
+) -> list[UsageRollup]:
+    """
+    Sums a user's OpenAI usage since `since`, grouped by one of `USAGE_GROUPS`.
+
+    Returns:
+        list[UsageRollup]: One row per group, ordered by group.
+    """
+    group = USAGE_GROUPS[group_by]().label("group")
+    result = await async_session.execute(
+        select(
+            group,
+            func.count().label("calls"),
+            func.sum(LLMUsage.prompt_tokens).label("prompt_tokens"),
+            func.sum(LLMUsage.completion_tokens).label("completion_tokens"),
+            func.sum(LLMUsage.cached_tokens).label("cached_tokens"),
+            func.avg(LLMUsage.latency_ms).label("avg_latency_ms"),
+            func.max(LLMUsage.latency_ms).label("max_latency_ms"),
+        )
+        .filter(LLMUsage.user_id == user_id, LLMUsage.created_at >= since)
+        .group_by(group)
+        .order_by(group)
+    )
+    return [
+        UsageRollup(
+            group=row.group.value if isinstance(row.group, PlanType) else row.group,
+            calls=row.calls,
+            prompt_tokens=row.prompt_tokens,
+            completion_tokens=row.completion_tokens,
+            total_tokens=row.prompt_tokens + row.completion_tokens,
+            cached_tokens=row.cached_tokens,
+            avg_latency_ms=row.avg_latency_ms,
+            max_latency_ms=row.max_latency_ms,
+        )
+        for row in result
+    ]
@@ -1,10 +1,20 @@
+import time
+from functools import lru_cache
 from typing import Any
 
-from openai import OpenAI, LengthFinishReasonError, ContentFilterFinishReasonError
-
 from ..core.config import get_settings
+from ..core.metrics import llm_request_seconds, llm_tokens
 
 from .schemas import DecisionResponse, PlanType, MealPlan, WorkoutPlan
+from .usage import note_llm_call
+
+# Bump an operation's version whenever its prompt changes, so usage and latency
+# can be compared across prompt versions
+PROMPT_VERSIONS = {
+    "get_plan_choice": "1",
+    "generate_meal_plan": "1",
+    "generate_workout_plan": "1",
+}
 
 
 class OpenAIClient:
@@ -16,6 +26,10 @@ class OpenAIClient:
         model: str,
         max_tokens: int = 300,
     ) -> None:
+        # The SDK takes a few hundred milliseconds to import, so it is loaded with
+        # the first client, which the application builds during startup
+        from openai import OpenAI
+
         self.client = OpenAI(
             api_key=api_key,
             organization=organization,
@@ -24,10 +38,31 @@ class OpenAIClient:
         self.model = model
         self.max_tokens = max_tokens
 
-    def get_plan_choice(self, text: str) -> PlanType:
+    def _parse(self, operation: str, **kwargs: Any):
+        # Every completion goes through here, so latency and token use are
+        # recorded per operation, and per user by the usage ledger
+        started = time.perf_counter()
+        usage = None
         try:
             completion = self.client.beta.chat.completions.parse(
-                model=self.model,
+                model=self.model, **kwargs
+            )
+            usage = completion.usage
+        finally:
+            latency = time.perf_counter() - started
+            llm_request_seconds.labels(operation).observe(latency)
+            note_llm_call(
+                operation, self.model, PROMPT_VERSIONS[operation], usage, latency
+            )
+        if usage is not None:
+            llm_tokens.labels(operation, "prompt").inc(usage.prompt_tokens)
+            llm_tokens.labels(operation, "completion").inc(usage.completion_tokens)
+        return completion
+
+    def get_plan_choice(self, text: str) -> PlanType:
+        try:
+            completion = self._parse(
+                "get_plan_choice",
                 messages=[
                     {
                         "role": "system",
@@ -43,6 +78,8 @@ class OpenAIClient:
             decision: DecisionResponse = response.parsed
             return decision.plan_type
         except Exception as e:
+            from openai import LengthFinishReasonError, ContentFilterFinishReasonError
+
             if type(e) == LengthFinishReasonError:
                 raise ValueError(
                     {
@@ -65,8 +102,8 @@ class OpenAIClient:
             answers_str = "\n".join(
                 [f"{key}: {value}" for key, value in answers.items()]
             )
-            completion = self.client.beta.chat.completions.parse(
-                model=self.model,
+            completion = self._parse(
+                "generate_meal_plan",
                 messages=[
                     {
                         "role": "system",
@@ -95,6 +132,8 @@ class OpenAIClient:
                     response += f"Instructions: {snack.instructions}\n"
             return response
         except Exception as e:
+            from openai import LengthFinishReasonError, ContentFilterFinishReasonError
+
             if type(e) == LengthFinishReasonError:
                 raise ValueError(
                     {
@@ -117,8 +156,8 @@ class OpenAIClient:
             answers_str = "\n".join(
                 [f"{key}: {value}" for key, value in answers.items()]
             )
-            completion = self.client.beta.chat.completions.parse(
-                model=self.model,
+            completion = self._parse(
+                "generate_workout_plan",
                 messages=[
                     {
                         "role": "system",
@@ -145,6 +184,8 @@ class OpenAIClient:
                         response += f"Instructions: {item.instructions}\n"
             return response
         except Exception as e:
+            from openai import LengthFinishReasonError, ContentFilterFinishReasonError
+
             if type(e) == LengthFinishReasonError:
                 raise ValueError(
                     {
@@ -163,6 +204,7 @@ class OpenAIClient:
                 raise ValueError({"error": e, "message": "An error occurred."})
 
 
+@lru_cache
 def get_openai_client() -> OpenAIClient:
     settings = get_settings()
     return OpenAIClient(
@@ -1,7 +1,72 @@
 import json
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterable
 
+from ..db.enums import PlanType
 
-def load_questions(plan_type: str) -> list[dict[str, str]]:
+
+def load_question_bank() -> list[dict[str, str]]:
     with open("app/planner/questions.json", "r") as file:
-        questions = json.load(file)
-    return [q for q in questions if q["plan_type"] == plan_type]
+        return json.load(file)
+
+
+def load_questions(plan_type: str) -> list[dict[str, str]]:
+    return [q for q in load_question_bank() if q["plan_type"] == plan_type]
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogEntry:
+    id: int
+    key: str
+    version: int
+    plan_type: PlanType
+    question: str
+    purpose: str
+
+
+class QuestionCatalog:
+    """
+    In-memory copy of the `question_catalog` table.
+
+    Every version is kept so stored answers can be resolved to their text, while
+    `current` lists the versions new answers are collected for.
+    """
+
+    def __init__(self) -> None:
+        self._entries: dict[int, CatalogEntry] = {}
+        self._current: dict[PlanType, list[CatalogEntry]] = {}
+
+    def load(self, entries: Iterable[CatalogEntry], current_ids: list[int]) -> None:
+        """
+        Replaces the catalog contents.
+
+        Parameters:
+        - entries (Iterable[CatalogEntry]): Every catalog row.
+        - current_ids (list[int]): The IDs of the live versions, in the order they are asked.
+        """
+        self._entries = {entry.id: entry for entry in entries}
+        current: dict[PlanType, list[CatalogEntry]] = {}
+        for catalog_id in current_ids:
+            entry = self._entries[catalog_id]
+            current.setdefault(entry.plan_type, []).append(entry)
+        self._current = current
+
+    def get(self, catalog_id: int) -> CatalogEntry:
+        try:
+            return self._entries[catalog_id]
+        except KeyError:
+            raise LookupError(
+                f"Question {catalog_id} is not in the catalog; was it synced on startup?"
+            ) from None
+
+    def current(self, plan_type: PlanType) -> list[CatalogEntry]:
+        return self._current.get(plan_type, [])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+@lru_cache
+def get_question_catalog() -> QuestionCatalog:
+    return QuestionCatalog()
@@ -0,0 +1,238 @@
+import asyncio
+import logging
+import signal
+from contextlib import suppress
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from ..core.config import get_settings
+from ..db.config import AsyncSessionLocal
+from ..db.init_db import dispose_db
+from ..db.models import Plan, PlanArchive, Question
+from ..schemas.adapters import dump_plan_export
+from .cache import invalidate_plans
+from .similarity import forget_plans
+from .crud import purge_plans, sync_question_catalog
+from .questions import get_question_catalog, load_question_bank
+from .search import remove_from_search_index
+
+logger = logging.getLogger(__name__)
+
+
+def cutoff(older_than: timedelta) -> datetime:
+    # Timestamps are stored as naive UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None) - older_than
+
+
+@dataclass
+class RetentionReport:
+    archives: int = 0
+    archived_plans: int = 0
+    archived_answers: int = 0
+    swept_answers: int = 0
+
+    def model_dump(self) -> dict:
+        return asdict(self)
+
+
+async def archive_user_plans(
+    async_session: AsyncSession,
+    user_id: UUID,
+    before: datetime,
+    batch_size: int,
+    report: RetentionReport,
+) -> None:
+    """
+    Moves a user's plans created before `before`, with their answers, into
+    archive rows of up to `batch_size` plans each.
+
+    The rows are deleted first and the archive is built from what the delete
+    returned, in the same transaction, so concurrent runs never archive a plan
+    twice.
+    """
+    catalog = get_question_catalog()
+    while plan_ids := (
+        await async_session.scalars(
+            select(Plan.id)
+            .filter(Plan.user_id == user_id, Plan.created_at < before)
+            .order_by(Plan.created_at)
+            .limit(batch_size)
+        )
+    ).all():
+        plans, questions = await purge_plans(async_session, plan_ids)
+        if plans:
+            answers: dict[UUID, list[dict]] = {}
+            for question in questions:
+                answers.setdefault(question.plan_id, []).append(
+                    {
+                        **question._mapping,
+                        "question": catalog.get(question.catalog_id).question,
+                    }
+                )
+            async_session.add(
+                PlanArchive(
+                    user_id=user_id,
+                    plan_count=len(plans),
+                    answer_count=len(questions),
+                    oldest_plan_at=min(plan.created_at for plan in plans),
+                    newest_plan_at=max(plan.created_at for plan in plans),
+                    data=b"".join(
+                        dump_plan_export(plan, answers.get(plan.id, []))
+                        for plan in plans
+                    ).decode(),
+                )
+            )
+            report.archives += 1
+            report.archived_plans += len(plans)
+            report.archived_answers += len(questions)
+        await async_session.commit()
+        invalidate_plans(plan_ids)
+        forget_plans(plan_ids)
+
+
+async def archive_old_plans(
+    async_session: AsyncSession, older_than: timedelta, batch_size: int = 500
+) -> RetentionReport:
+    """
+    Archives every plan older than `older_than`, user by user.
+
+    Returns:
+        RetentionReport: The number of archives written and of plans and answers moved.
+    """
+    report = RetentionReport()
+    before = cutoff(older_than)
+    last_user_id = None
+    while True:
+        query = (
+            select(Plan.user_id)
+            .filter(Plan.created_at < before)
+            .distinct()
+            .order_by(Plan.user_id)
+            .limit(batch_size)
+        )
+        if last_user_id is not None:
+            query = query.filter(Plan.user_id > last_user_id)
+        user_ids = (await async_session.scalars(query)).all()
+        await async_session.commit()
+        if not user_ids:
+            return report
+        for user_id in user_ids:
+            await archive_user_plans(async_session, user_id, before, batch_size, report)
+        last_user_id = user_ids[-1]
+
+
+async def sweep_orphan_answers(
+    async_session: AsyncSession, older_than: timedelta, batch_size: int = 500
+) -> int:
+    """
+    Deletes answers from questionnaires that were abandoned before a plan was
+    created, once they are older than `older_than`.
+
+    Returns:
+        int: The number of answers deleted.
+    """
+    before = cutoff(older_than)
+    deleted = 0
+    while question_ids := (
+        await async_session.scalars(
+            select(Question.id)
+            .filter(Question.plan_id.is_(None), Question.created_at < before)
+            .limit(batch_size)
+        )
+    ).all():
+        # Re-checked in the DELETE in case an answer was tagged in the meantime
+        result = await async_session.execute(
+            delete(Question)
+            .filter(Question.id.in_(question_ids), Question.plan_id.is_(None))
+            .returning(Question.id)
+        )
+        deleted_ids = result.scalars().all()
+        await remove_from_search_index(async_session, deleted_ids)
+        await async_session.commit()
+        deleted += len(deleted_ids)
+    return deleted
+
+
+async def run_retention(async_session: AsyncSession) -> RetentionReport:
+    """
+    Runs one retention pass with the configured policies.
+    """
+    settings = get_settings()
+    report = RetentionReport()
+    if settings.retention_archive_after_days > 0:
+        report = await archive_old_plans(
+            async_session,
+            timedelta(days=settings.retention_archive_after_days),
+            settings.retention_batch_size,
+        )
+    if settings.retention_orphan_answer_hours > 0:
+        report.swept_answers = await sweep_orphan_answers(
+            async_session,
+            timedelta(hours=settings.retention_orphan_answer_hours),
+            settings.retention_batch_size,
+        )
+    return report
+
+
+async def retention_loop(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with AsyncSessionLocal() as async_session:
+                report = await run_retention(async_session)
+        except Exception:
+            logger.exception("Retention pass failed")
+        else:
+            logger.info("Retention pass complete", extra=report.model_dump())
+
+
+def retention_enabled() -> bool:
+    """
+    Whether the periodic retention job runs: it needs an interval and at least
+    one retention policy.
+    """
+    settings = get_settings()
+    return settings.retention_interval_seconds > 0 and (
+        settings.retention_archive_after_days > 0
+        or settings.retention_orphan_answer_hours > 0
+    )
+
+
+def start_retention_task() -> asyncio.Task | None:
+    """
+    Starts the periodic retention job, if any retention policy is enabled.
+    """
+    if not retention_enabled():
+        return None
+    return asyncio.create_task(
+        retention_loop(get_settings().retention_interval_seconds)
+    )
+
+
+async def serve_retention() -> None:
+    """
+    Runs the periodic retention job on its own, outside the application, until
+    SIGINT or SIGTERM. Multi-worker servers run it this way in a single process,
+    instead of once in every worker.
+    """
+    try:
+        # Archived answers are written out with their question text
+        async with AsyncSessionLocal() as async_session:
+            await sync_question_catalog(async_session, load_question_bank())
+        task = start_retention_task()
+        if task is None:
+            return
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            # Not supported on Windows, where the process is killed instead
+            with suppress(NotImplementedError):
+                loop.add_signal_handler(signum, task.cancel)
+        with suppress(asyncio.CancelledError):
+            await task
+    finally:
+        await dispose_db()
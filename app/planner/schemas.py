@@ -34,6 +34,31 @@ class Question(QuestionBase):
     created_at: datetime
 
 
+class SearchHit(BaseModel):
+    kind: str
+    plan_id: UUID | None = None
+    question_id: UUID | None = None
+    snippet: str
+    rank: float
+
+
+class UsageRollup(BaseModel):
+    group: str | None = None
+    calls: int
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+    cached_tokens: int
+    avg_latency_ms: float
+    max_latency_ms: float
+
+
+class UsageReport(BaseModel):
+    daily_token_budget: int | None = None
+    tokens_used_today: int
+    rollup: list[UsageRollup]
+
+
 class MealPlanItem(BaseModel):
     meal_type: str
     recipe: str
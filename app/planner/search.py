@@ -0,0 +1,303 @@
+import re
+from typing import Iterable
+from uuid import UUID
+
+from sqlalchemy import Uuid, bindparam, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from sqlalchemy.future import select
+
+from ..core.config import get_settings
+from ..db.models import Plan, Question
+from .schemas import SearchHit
+
+PLAN_DOCUMENT = "plan"
+ANSWER_DOCUMENT = "answer"
+
+# Both indexes keep an uncompressed copy of every document in `content`, from
+# which snippets are cut, so plan descriptions are stored compressed in `plans`
+# but in full here. On 5000 synthetic meal plans (`benchmarks.plan_compression`)
+# the SQLite index takes 29.7 MiB, about 24 MiB of it the copy, next to 6.4 MiB
+# for the compressed descriptions and 24.3 MiB had they been left as text.
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+        content, kind UNINDEXED, doc_id UNINDEXED, user_id UNINDEXED,
+        tokenize = 'porter unicode61'
+    )
+    """,
+]
+
+POSTGRES_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS search_index (
+        doc_id UUID PRIMARY KEY,
+        user_id UUID NOT NULL,
+        kind VARCHAR(16) NOT NULL,
+        content TEXT NOT NULL,
+        body TSVECTOR NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_search_index_body ON search_index USING GIN (body)",
+    "CREATE INDEX IF NOT EXISTS ix_search_index_user_id ON search_index (user_id)",
+]
+
+SQLITE_INSERT = text(
+    "INSERT INTO search_index (content, kind, doc_id, user_id) "
+    "VALUES (:content, :kind, :doc_id, :user_id)"
+)
+
+POSTGRES_INSERT = text(
+    "INSERT INTO search_index (doc_id, user_id, kind, content, body) "
+    "VALUES (:doc_id, :user_id, :kind, :content, "
+    "to_tsvector(CAST(:config AS regconfig), :content)) "
+    "ON CONFLICT (doc_id) DO NOTHING"
+)
+
+SQLITE_SEARCH = text(
+    "SELECT kind, doc_id, "
+    "snippet(search_index, 0, '[', ']', '...', 16) AS snippet, rank "
+    "FROM search_index "
+    "WHERE search_index MATCH :query AND user_id = :user_id "
+    "ORDER BY rank LIMIT :limit OFFSET :offset"
+)
+
+POSTGRES_SEARCH = text(
+    "SELECT kind, doc_id, "
+    "ts_headline(CAST(:config AS regconfig), content, query, "
+    "'StartSel=[, StopSel=], MaxFragments=1, MaxWords=16') AS snippet, "
+    "-ts_rank_cd(body, query) AS rank "
+    "FROM search_index, websearch_to_tsquery(CAST(:config AS regconfig), :query) query "
+    "WHERE body @@ query AND user_id = :user_id "
+    "ORDER BY rank LIMIT :limit OFFSET :offset"
+)
+
+SEARCH_DELETE = text("DELETE FROM search_index WHERE doc_id IN :doc_ids")
+
+
+def _dialect(bind: AsyncSession | AsyncConnection) -> str:
+    if isinstance(bind, AsyncSession):
+        return bind.get_bind().dialect.name
+    return bind.dialect.name
+
+
+def _uuid_params(statement, *names: str):
+    return statement.bindparams(*(bindparam(name, type_=Uuid) for name in names))
+
+
+def _fts5_query(query: str) -> str:
+    # Quote every term so user input can never be parsed as FTS5 syntax
+    return " ".join(f'"{term}"' for term in re.findall(r"\w+", query))
+
+
+async def create_search_index(connection: AsyncConnection) -> None:
+    """
+    Creates the full-text index for the connected database if it does not exist.
+
+    SQLite gets an FTS5 virtual table; Postgres gets a table with a `tsvector`
+    column and a GIN index. Other dialects are left without a search index.
+    """
+    dialect = _dialect(connection)
+    statements = {"sqlite": SQLITE_DDL, "postgresql": POSTGRES_DDL}.get(dialect, [])
+    for statement in statements:
+        await connection.execute(text(statement))
+
+
+async def index_documents(async_session: AsyncSession, documents: list[dict]) -> None:
+    """
+    Adds documents to the full-text index within the current transaction, in a
+    single multi-row insert.
+
+    Parameters:
+    - async_session (AsyncSession): The database session.
+    - documents (list[dict]): The documents, each with `doc_id`, `user_id`, `kind`
+      and `content`.
+    """
+    if not documents:
+        return
+    dialect = _dialect(async_session)
+    if dialect == "sqlite":
+        statement = SQLITE_INSERT
+    elif dialect == "postgresql":
+        statement = POSTGRES_INSERT
+        config = get_settings().search_text_config
+        documents = [{**document, "config": config} for document in documents]
+    else:
+        return
+    await async_session.execute(_uuid_params(statement, "doc_id", "user_id"), documents)
+
+
+async def index_document(
+    async_session: AsyncSession, doc_id: UUID, user_id: UUID, kind: str, content: str
+) -> None:
+    """
+    Adds a document to the full-text index within the current transaction.
+    """
+    await index_documents(
+        async_session,
+        [{"doc_id": doc_id, "user_id": user_id, "kind": kind, "content": content}],
+    )
+
+
+async def index_plan(async_session: AsyncSession, plan: Plan) -> None:
+    await index_document(
+        async_session, plan.id, plan.user_id, PLAN_DOCUMENT, plan.description
+    )
+
+
+async def index_question(async_session: AsyncSession, question: Question) -> None:
+    await index_document(
+        async_session, question.id, question.user_id, ANSWER_DOCUMENT, question.answer
+    )
+
+
+async def index_answers(async_session: AsyncSession, rows: list[dict]) -> None:
+    """
+    Adds answers given as `questions` rows (`id`, `user_id` and `answer`) to the
+    full-text index within the current transaction.
+    """
+    await index_documents(
+        async_session,
+        [
+            {
+                "doc_id": row["id"],
+                "user_id": row["user_id"],
+                "kind": ANSWER_DOCUMENT,
+                "content": row["answer"],
+            }
+            for row in rows
+        ],
+    )
+
+
+async def remove_from_search_index(
+    async_session: AsyncSession, doc_ids: Iterable[UUID]
+) -> None:
+    """
+    Removes plans or answers from the full-text index within the current transaction.
+    """
+    doc_ids = list(doc_ids)
+    if not doc_ids or _dialect(async_session) not in ("sqlite", "postgresql"):
+        return
+    await async_session.execute(
+        SEARCH_DELETE.bindparams(bindparam("doc_ids", type_=Uuid, expanding=True)),
+        {"doc_ids": doc_ids},
+    )
+
+
+def _snippet(content: str, terms: list[str], width: int = 60) -> str:
+    lowered = content.lower()
+    start = min((index for index in map(lowered.find, terms) if index >= 0), default=0)
+    end = min(len(content), start + width)
+    start = max(0, start - width // 2)
+    snippet = content[start:end]
+    for term in terms:
+        snippet = re.sub(
+            re.escape(term), lambda match: f"[{match.group(0)}]", snippet, flags=re.I
+        )
+    return ("..." if start else "") + snippet + ("..." if end < len(content) else "")
+
+
+async def scan_documents(
+    async_session: AsyncSession, user_id: UUID, query: str, limit: int, offset: int
+) -> list[SearchHit]:
+    """
+    Searches a user's plans and answers without an index, for databases that
+    have no full-text search.
+
+    Every plan and answer of the user is read and matched in Python, since plan
+    descriptions may be stored compressed. A document matches if it contains every
+    word of the query, and is ranked by how often those words occur.
+
+    Returns:
+        list[SearchHit]: The matching documents, best match first.
+    """
+    terms = [term.lower() for term in re.findall(r"\w+", query)]
+    if not terms:
+        return []
+    plans = await async_session.execute(
+        select(Plan.id, Plan.description).filter_by(user_id=user_id)
+    )
+    answers = await async_session.execute(
+        select(Question.id, Question.plan_id, Question.answer).filter_by(
+            user_id=user_id
+        )
+    )
+    documents = [
+        (PLAN_DOCUMENT, plan_id, plan_id, description)
+        for plan_id, description in plans.tuples()
+    ] + [
+        (ANSWER_DOCUMENT, question_id, plan_id, answer)
+        for question_id, plan_id, answer in answers.tuples()
+    ]
+
+    hits = []
+    for kind, doc_id, plan_id, content in documents:
+        lowered = content.lower()
+        if not all(term in lowered for term in terms):
+            continue
+        hits.append(
+            SearchHit(
+                kind=kind,
+                plan_id=plan_id,
+                question_id=doc_id if kind == ANSWER_DOCUMENT else None,
+                snippet=_snippet(content, terms),
+                rank=sum(lowered.count(term) for term in terms),
+            )
+        )
+    hits.sort(key=lambda hit: hit.rank, reverse=True)
+    return hits[offset : offset + limit]
+
+
+async def search_documents(
+    async_session: AsyncSession, user_id: UUID, query: str, limit: int, offset: int
+) -> list[SearchHit]:
+    """
+    Runs a ranked full-text search over a user's plans and answers.
+
+    Answers are resolved to the plan they were given for, if any. Databases
+    without full-text search fall back to `scan_documents`.
+
+    Returns:
+        list[SearchHit]: The matching documents, best match first.
+    """
+    dialect = _dialect(async_session)
+    params = {"user_id": user_id, "limit": limit, "offset": offset}
+    if dialect == "sqlite":
+        statement = SQLITE_SEARCH
+        params["query"] = _fts5_query(query)
+        if not params["query"]:
+            return []
+    elif dialect == "postgresql":
+        statement = POSTGRES_SEARCH
+        params["query"] = query
+        params["config"] = get_settings().search_text_config
+    else:
+        return await scan_documents(async_session, user_id, query, limit, offset)
+
+    result = await async_session.execute(
+        _uuid_params(statement, "user_id").columns(doc_id=Uuid), params
+    )
+    rows = result.all()
+
+    answer_ids = [row.doc_id for row in rows if row.kind == ANSWER_DOCUMENT]
+    answer_plans: dict[UUID, UUID | None] = {}
+    if answer_ids:
+        answers = await async_session.execute(
+            select(Question.id, Question.plan_id).filter(Question.id.in_(answer_ids))
+        )
+        answer_plans = dict(answers.tuples().all())
+
+    return [
+        SearchHit(
+            kind=row.kind,
+            plan_id=(
+                row.doc_id
+                if row.kind == PLAN_DOCUMENT
+                else answer_plans.get(row.doc_id)
+            ),
+            question_id=row.doc_id if row.kind == ANSWER_DOCUMENT else None,
+            snippet=row.snippet,
+            rank=-row.rank,
+        )
+        for row in rows
+    ]
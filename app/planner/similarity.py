@@ -0,0 +1,306 @@
+import asyncio
+import math
+import re
+import zlib
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterable
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from ..core.config import get_settings
+from ..db.enums import PlanType
+from ..db.models import Plan, Question
+from .questions import get_question_catalog
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Width of the hashed bag-of-words block for each question
+FEATURES_PER_QUESTION = 64
+# Numbers are bucketed on a log scale so that "5000" and "5,000" share a bucket
+# and nearby quantities such as 20 and 21 usually do too
+NUMBER_BUCKETS_PER_DECADE = 8
+
+SYNONYMS = {
+    "naira": "ngn",
+    "₦": "ngn",
+    "reps": "rep",
+    "pushups": "pushup",
+    "mins": "minute",
+    "min": "minute",
+    "minutes": "minute",
+    "hrs": "hour",
+    "hr": "hour",
+    "hours": "hour",
+}
+
+# Questions about what the user must avoid. A plan is only reused when these
+# answers match exactly once normalized: a single extra allergy changes the
+# plan, however close the rest of the answers are
+EXACT_MATCH_KEYS = frozenset({"food_restrictions"})
+
+STOPWORDS = frozenset(
+    "a about an and approx approximately around can do i is it just maybe my of "
+    "or per roughly the to up".split()
+)
+
+NUMBER = re.compile(r"(\d[\d,]*(?:\.\d+)?)\s*(k\b)?")
+WORD = re.compile(r"[^\W\d_]+|₦")
+
+
+def normalize_answer(answer: str) -> list[str]:
+    """
+    Reduces a free-text answer to a list of comparable tokens.
+
+    Numbers become log-scale bucket tokens, thousands separators and "k"
+    suffixes are folded, and common synonyms and filler words are normalized.
+    """
+    answer = answer.lower().replace("push-up", "pushup").replace("push up", "pushup")
+    tokens = []
+    for match in NUMBER.finditer(answer):
+        value = float(match.group(1).replace(",", ""))
+        if match.group(2):
+            value *= 1000
+        bucket = round(math.log10(value + 1) * NUMBER_BUCKETS_PER_DECADE)
+        tokens.append(f"#{bucket}")
+    answer = NUMBER.sub(" ", answer)
+    for word in WORD.findall(answer):
+        word = SYNONYMS.get(word, word)
+        if word not in STOPWORDS:
+            tokens.append(word)
+    return tokens
+
+
+def featurize(questions: list[str], answers: dict[str, str]) -> "np.ndarray":
+    """
+    Builds a unit-length feature vector for a questionnaire.
+
+    Each question gets its own hashed bag-of-words block so that answers are only
+    compared with answers to the same question, and every block carries equal weight.
+    Words that merely echo the question ("20 push-ups") are ignored.
+    """
+    import numpy as np
+
+    vector = np.zeros(len(questions) * FEATURES_PER_QUESTION, dtype=np.float32)
+    for position, question in enumerate(questions):
+        block = vector[
+            position * FEATURES_PER_QUESTION : (position + 1) * FEATURES_PER_QUESTION
+        ]
+        echoed = set(normalize_answer(question))
+        for token in normalize_answer(answers.get(question, "")):
+            if token in echoed:
+                continue
+            block[zlib.crc32(token.encode()) % FEATURES_PER_QUESTION] += 1.0
+        norm = np.linalg.norm(block)
+        if norm:
+            block /= norm
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector
+
+
+def exact_key(questions: list[str], answers: dict[str, str]) -> int:
+    """
+    Hashes the normalized answers to the given questions, ignoring word order.
+    """
+    return hash(
+        tuple(
+            tuple(sorted(normalize_answer(answers.get(question, ""))))
+            for question in questions
+        )
+    )
+
+
+class AnswerSimilarityIndex:
+    """
+    An in-memory nearest-neighbour index over questionnaire answers for one plan type.
+
+    Vectors are kept in a ring buffer of at most `capacity` rows, so the oldest
+    plans are forgotten first once the index is full. Plans are only matched
+    with plans of the same user whose answers to `exact_questions` are the same.
+    """
+
+    def __init__(
+        self, questions: list[str], capacity: int, exact_questions: list[str] = ()
+    ) -> None:
+        # numpy takes a while to import and is only needed once a plan is
+        # generated, which is when the index is first built
+        import numpy as np
+
+        self.questions = questions
+        self.exact_questions = list(exact_questions)
+        self.capacity = capacity
+        self.loaded = False
+        # Held while loading, so concurrent first requests load the index once
+        self.lock = asyncio.Lock()
+        self._vectors = np.zeros(
+            (min(capacity, 1024), len(questions) * FEATURES_PER_QUESTION),
+            dtype=np.float32,
+        )
+        self._plan_ids: list[UUID | None] = [None] * len(self._vectors)
+        # Hashes of the owner and of the exact-match answers of each row
+        self._owners = np.zeros(len(self._vectors), dtype=np.int64)
+        self._exact = np.zeros(len(self._vectors), dtype=np.int64)
+        self._size = 0
+        self._next = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, plan_id: UUID, user_id: UUID, answers: dict[str, str]) -> None:
+        import numpy as np
+
+        if self.capacity <= 0:
+            return
+        if self._next == len(self._vectors) and len(self._vectors) < self.capacity:
+            rows = min(self.capacity, len(self._vectors) * 2)
+            self._vectors = np.resize(self._vectors, (rows, self._vectors.shape[1]))
+            self._owners = np.resize(self._owners, rows)
+            self._exact = np.resize(self._exact, rows)
+            self._plan_ids.extend([None] * (rows - len(self._plan_ids)))
+        if self._next == len(self._vectors):
+            self._next = 0
+        self._vectors[self._next] = featurize(self.questions, answers)
+        self._owners[self._next] = hash(user_id)
+        self._exact[self._next] = exact_key(self.exact_questions, answers)
+        self._plan_ids[self._next] = plan_id
+        self._next += 1
+        self._size = min(self._size + 1, len(self._vectors))
+
+    def remove(self, plan_ids: Iterable[UUID]) -> None:
+        """
+        Forgets deleted plans. Their rows are zeroed, so they never match again,
+        and are reused as the ring buffer wraps around.
+        """
+        plan_ids = set(plan_ids)
+        for row, plan_id in enumerate(self._plan_ids):
+            if plan_id in plan_ids:
+                self._vectors[row] = 0
+                self._plan_ids[row] = None
+
+    def nearest(
+        self, user_id: UUID, answers: dict[str, str]
+    ) -> tuple[UUID, float] | None:
+        """
+        Finds the closest answer set stored for a user, among those with the same
+        answers to the exact-match questions.
+
+        Returns:
+            tuple[UUID, float] | None: The plan ID and its cosine distance, or None
+            if there is no candidate.
+        """
+        import numpy as np
+
+        if not self._size:
+            return None
+        candidates = (self._owners[: self._size] == hash(user_id)) & (
+            self._exact[: self._size] == exact_key(self.exact_questions, answers)
+        )
+        if not candidates.any():
+            return None
+        similarities = np.where(
+            candidates,
+            self._vectors[: self._size] @ featurize(self.questions, answers),
+            -np.inf,
+        )
+        best = int(np.argmax(similarities))
+        if self._plan_ids[best] is None:
+            return None
+        return self._plan_ids[best], 1.0 - float(similarities[best])
+
+
+@lru_cache
+def get_similarity_index(plan_type: PlanType) -> AnswerSimilarityIndex:
+    entries = get_question_catalog().current(plan_type)
+    return AnswerSimilarityIndex(
+        [entry.question for entry in entries],
+        get_settings().plan_similarity_index_size,
+        [entry.question for entry in entries if entry.key in EXACT_MATCH_KEYS],
+    )
+
+
+async def load_similarity_index(
+    async_session: AsyncSession, index: AnswerSimilarityIndex, plan_type: PlanType
+) -> None:
+    """
+    Fills an index with the answers behind the most recent plans of a type.
+    """
+    owners = dict(
+        (
+            await async_session.execute(
+                select(Plan.id, Plan.user_id)
+                .filter_by(plan_type=plan_type)
+                .order_by(Plan.created_at.desc())
+                .limit(index.capacity)
+            )
+        ).all()
+    )
+    plan_ids = list(owners)
+    catalog = get_question_catalog()
+    answer_sets: dict[UUID, dict[str, str]] = {}
+    for start in range(0, len(plan_ids), 500):
+        rows = await async_session.execute(
+            select(Question.plan_id, Question.catalog_id, Question.answer).filter(
+                Question.plan_id.in_(plan_ids[start : start + 500])
+            )
+        )
+        for plan_id, catalog_id, answer in rows:
+            question = catalog.get(catalog_id).question
+            answer_sets.setdefault(plan_id, {})[question] = answer
+    for plan_id in reversed(plan_ids):
+        if plan_id in answer_sets:
+            index.add(plan_id, owners[plan_id], answer_sets[plan_id])
+    index.loaded = True
+
+
+async def find_similar_plan(
+    async_session: AsyncSession,
+    user_id: UUID,
+    plan_type: PlanType,
+    answers: dict[str, str],
+) -> UUID | None:
+    """
+    Looks for an existing plan of the user whose questionnaire answers are close
+    enough to `answers` to be reused instead of generating a new one.
+
+    Plans are never shared between users: answers and plans may mention
+    personal details such as injuries.
+
+    Returns:
+        UUID | None: The ID of the reusable plan, if any.
+    """
+    settings = get_settings()
+    if settings.plan_similarity_max_distance <= 0:
+        return None
+    index = get_similarity_index(plan_type)
+    if not index.loaded:
+        async with index.lock:
+            if not index.loaded:
+                await load_similarity_index(async_session, index, plan_type)
+    match = index.nearest(user_id, answers)
+    if match is None or match[1] > settings.plan_similarity_max_distance:
+        return None
+    return match[0]
+
+
+def remember_plan_answers(
+    plan_id: UUID, user_id: UUID, plan_type: PlanType, answers: dict[str, str]
+) -> None:
+    index = get_similarity_index(plan_type)
+    if index.loaded:
+        index.add(plan_id, user_id, answers)
+
+
+def forget_plans(plan_ids: Iterable[UUID]) -> None:
+    """
+    Drops deleted or archived plans from this process's similarity indexes, so
+    they are not offered for reuse.
+    """
+    plan_ids = list(plan_ids)
+    for plan_type in PlanType:
+        index = get_similarity_index(plan_type)
+        if index.loaded:
+            index.remove(plan_ids)
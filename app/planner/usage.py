@@ -0,0 +1,175 @@
+import asyncio
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Callable, TypeVar
+from uuid import UUID
+
+from sqlalchemy import insert
+
+from ..core.config import get_settings
+from ..db.config import AsyncSessionLocal, get_read_session_factory
+from ..db.enums import PlanType
+from ..db.models import LLMUsage
+from ..db.write_behind import WriteBehindQueue
+from .crud import get_tokens_used_since
+
+T = TypeVar("T")
+
+# The calls made by the current `run_llm`. `asyncio.to_thread` copies the
+# context, so the client's worker thread appends to the same list
+_llm_calls: ContextVar[list[dict] | None] = ContextVar("llm_calls", default=None)
+
+
+class TokenBudgetExceeded(ValueError):
+    """
+    Raised before a generation when the user has used up their daily token budget.
+    """
+
+
+def start_of_day() -> datetime:
+    # Budgets reset at midnight UTC; timestamps are stored as naive UTC
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _cached_tokens(usage: Any) -> int:
+    # Only reported by newer API versions, as an untyped extra field
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        return details.get("cached_tokens") or 0
+    return getattr(details, "cached_tokens", None) or 0
+
+
+def note_llm_call(
+    operation: str, model: str, prompt_version: str, usage: Any, latency: float
+) -> None:
+    """
+    Notes an OpenAI request for the usage ledger. Does nothing outside `run_llm`.
+
+    Parameters:
+    - operation (str): The client method that made the request.
+    - model (str): The model the request was made to.
+    - prompt_version (str): The version of the operation's prompt.
+    - usage (Any): The completion's `usage`, or None if the request failed.
+    - latency (float): The request's duration, in seconds.
+    """
+    calls = _llm_calls.get()
+    if calls is None:
+        return
+    calls.append(
+        {
+            "operation": operation,
+            "model": model,
+            "prompt_version": prompt_version,
+            "prompt_tokens": usage.prompt_tokens if usage is not None else 0,
+            "completion_tokens": usage.completion_tokens if usage is not None else 0,
+            "cached_tokens": _cached_tokens(usage) if usage is not None else 0,
+            "latency_ms": latency * 1000,
+            "created_at": datetime.now(timezone.utc).replace(tzinfo=None),
+        }
+    )
+
+
+def _discard_outcome(future: asyncio.Future) -> None:
+    if not future.cancelled():
+        future.exception()
+
+
+class UsageLedger:
+    """
+    Records OpenAI usage rows through a write-behind queue, so requests never wait
+    on the insert.
+
+    Tokens of rows that are queued but not yet written are kept per user, so a
+    budget check in this process sees them straight away.
+    """
+
+    def __init__(self, max_batch: int, max_delay: float, max_size: int) -> None:
+        self.queue: WriteBehindQueue[dict] = WriteBehindQueue(
+            self.write,
+            max_batch=max_batch,
+            max_delay=max_delay,
+            max_size=max_size,
+            name="llm_usage",
+        )
+        self.pending_tokens: dict[UUID, int] = {}
+
+    async def record(self, row: dict) -> None:
+        tokens = row["prompt_tokens"] + row["completion_tokens"]
+        self.pending_tokens[row["user_id"]] = (
+            self.pending_tokens.get(row["user_id"], 0) + tokens
+        )
+        future = await self.queue.put(row)
+        # Nothing waits for a usage row, and the writer already logs failed
+        # flushes; retrieve the outcome so it isn't reported again as unretrieved
+        future.add_done_callback(_discard_outcome)
+
+    async def write(self, rows: list[dict]) -> None:
+        try:
+            async with AsyncSessionLocal() as async_session:
+                await async_session.execute(insert(LLMUsage), rows)
+                await async_session.commit()
+        finally:
+            for row in rows:
+                remaining = self.pending_tokens.get(row["user_id"], 0) - (
+                    row["prompt_tokens"] + row["completion_tokens"]
+                )
+                if remaining > 0:
+                    self.pending_tokens[row["user_id"]] = remaining
+                else:
+                    self.pending_tokens.pop(row["user_id"], None)
+
+    async def close(self) -> None:
+        await self.queue.close()
+
+
+@lru_cache
+def get_usage_ledger() -> UsageLedger:
+    settings = get_settings()
+    return UsageLedger(
+        max_batch=settings.llm_usage_batch_size,
+        max_delay=settings.llm_usage_flush_ms / 1000,
+        max_size=settings.llm_usage_max_size,
+    )
+
+
+async def run_llm(
+    user_id: UUID,
+    plan_type: PlanType | None,
+    func: Callable[..., T],
+    *args: Any,
+) -> T:
+    """
+    Runs a blocking `OpenAIClient` method in a thread and records the usage of
+    every request it made against the user and plan type.
+    """
+    calls: list[dict] = []
+    token = _llm_calls.set(calls)
+    try:
+        return await asyncio.to_thread(func, *args)
+    finally:
+        _llm_calls.reset(token)
+        ledger = get_usage_ledger()
+        for call in calls:
+            await ledger.record({"user_id": user_id, "plan_type": plan_type, **call})
+
+
+async def check_token_budget(user_id: UUID) -> None:
+    """
+    Raises TokenBudgetExceeded if the user has used their daily token budget.
+
+    The check is made before a generation starts, so the generation that crosses
+    the budget is allowed to finish.
+    """
+    budget = get_settings().llm_daily_token_budget
+    if budget <= 0:
+        return
+    async with (await get_read_session_factory(user_id))() as read_session:
+        used = await get_tokens_used_since(read_session, user_id, start_of_day())
+    used += get_usage_ledger().pending_tokens.get(user_id, 0)
+    if used >= budget:
+        raise TokenBudgetExceeded(
+            f"You have used your daily allowance of {budget} tokens. "
+            "It resets at midnight UTC"
+        )
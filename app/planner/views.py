@@ -1,45 +1,87 @@
 import asyncio
-from typing import Annotated
+import logging
+import zlib
+from datetime import timedelta
+from typing import Annotated, AsyncIterator, Callable, Literal
 from uuid import UUID
 
 from fastapi import (
     APIRouter,
     Depends,
+    Header,
     Path,
+    Query,
     Request,
+    Response,
     WebSocket,
     WebSocketDisconnect,
     WebSocketException,
     status,
 )
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse
 
 from fastapi.websockets import WebSocketState
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 
 from .openai_client import OpenAIClient
 
-from ..auth.crud import get_user_by_id
+from ..auth.crud import get_principal_by_id
 from ..auth.dependencies import get_current_active_user
+from ..auth.principal import Principal
 from ..core.config import get_settings
-from ..core.utils import create_jwt_token, verify_jwt_token
+from ..core.drain import plan_generations
+from ..core.metrics import (
+    db_operation_seconds,
+    plan_choice_seconds,
+    question_wait_seconds,
+    websocket_active,
+    websocket_connects,
+    websocket_disconnects,
+)
+from ..core.utils import create_jwt_token, token_revoked, verify_jwt_token
 from .crud import (
     create_plan,
-    create_question,
     get_plan as get_plan_crud,
     get_plans_by_user_id,
+    get_tokens_used_since,
+    get_usage_rollup,
+    queue_question,
+    search_plans,
+    stream_plan_history,
+    stream_unassigned_questions,
+)
+from ..db.config import (
+    get_async_session,
+    get_read_session,
+    get_read_session_factory,
 )
-from ..db.config import get_async_session
 from ..db.enums import PlanType
-from ..db.models import User as UserModel, Question as QuestionModel
+from ..db.telemetry import finish_unit, start_unit
+from ..schemas.adapters import (
+    RawJSONResponse,
+    dump_plan,
+    dump_plan_export,
+    dump_plans,
+    dump_question_export,
+)
+from .cache import (
+    etag_matches,
+    get_plan_response_cache,
+    plan_cache_headers,
+    plan_etag,
+)
 from .openai_client import get_openai_client
-from .schemas import Plan as PlanSchema
-from .questions import load_questions
-
+from .schemas import Plan as PlanSchema, SearchHit, UsageReport
+from .similarity import find_similar_plan, forget_plans, remember_plan_answers
+from .questions import get_question_catalog
+from .usage import check_token_budget, get_usage_ledger, run_llm, start_of_day
 
 router = APIRouter(prefix="/planner", tags=["planner"])
 
+logger = logging.getLogger(__name__)
+
 
 @router.get(
     "/get-ws-token",
@@ -63,7 +105,7 @@ router = APIRouter(prefix="/planner", tags=["planner"])
     },
 )
 async def get_ws_token(
-    user: Annotated[UserModel | None, Depends(get_current_active_user)]
+    user: Annotated[Principal | None, Depends(get_current_active_user)],
 ):
     if user is None:
         return JSONResponse(
@@ -74,12 +116,57 @@ async def get_ws_token(
     token = create_jwt_token(
         {"sub": str(user.id), "scopes": ["websocket"]},
         get_settings().jwt_secret_key,
-        get_settings().jwt_expires_in_days,
+        timedelta(minutes=get_settings().ws_token_expires_in_minutes),
     )
 
     return {"token": token}
 
 
+@router.get(
+    "/usage",
+    summary="Get the authenticated user's OpenAI token usage",
+    response_model=UsageReport,
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {
+            "description": "Unauthorized",
+            "content": {"application/json": {"example": {"message": "Unauthorized"}}},
+        }
+    },
+)
+async def get_usage(
+    user: Annotated[Principal | None, Depends(get_current_active_user)],
+    async_session: Annotated[AsyncSession, Depends(get_read_session)],
+    days: Annotated[
+        int, Query(ge=1, le=366, description="How many days back to include")
+    ] = 30,
+    group_by: Annotated[
+        Literal["day", "operation", "plan_type", "prompt_version", "model"],
+        Query(description="What to sum the usage by"),
+    ] = "day",
+):
+    if user is None:
+        return JSONResponse(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            content={"message": "Unauthorized"},
+        )
+
+    today = start_of_day()
+    budget = get_settings().llm_daily_token_budget
+    # Usage still waiting in the write-behind queue counts too, like in the
+    # budget check
+    tokens_used_today = await get_tokens_used_since(
+        async_session, user.id, today
+    ) + get_usage_ledger().pending_tokens.get(user.id, 0)
+    return UsageReport(
+        daily_token_budget=budget if budget > 0 else None,
+        tokens_used_today=tokens_used_today,
+        rollup=await get_usage_rollup(
+            async_session, user.id, today - timedelta(days=days - 1), group_by
+        ),
+    )
+
+
 @router.get("/{token}", summary="Chat with the planner", response_class=HTMLResponse)
 async def get(token: Annotated[str, Path(title="WebSocket Token")]):
     html = f"""
@@ -131,8 +218,8 @@ async def get(token: Annotated[str, Path(title="WebSocket Token")]):
     },
 )
 async def get_plans(
-    user: Annotated[UserModel | None, Depends(get_current_active_user)],
-    async_session: Annotated[AsyncSession, Depends(get_async_session)],
+    user: Annotated[Principal | None, Depends(get_current_active_user)],
+    async_session: Annotated[AsyncSession, Depends(get_read_session)],
 ):
     if user is None:
         return JSONResponse(
@@ -141,7 +228,99 @@ async def get_plans(
         )
 
     plans = await get_plans_by_user_id(async_session, user.id)
-    return plans
+    return RawJSONResponse(dump_plans(plans))
+
+
+async def export_plan_history(user_id: UUID) -> AsyncIterator[bytes]:
+    # The export outlives the request-scoped session, so it opens its own
+    async with (await get_read_session_factory(user_id))() as async_session:
+        async for batch in stream_plan_history(async_session, user_id):
+            yield b"".join(
+                dump_plan_export(plan, questions) for plan, questions in batch
+            )
+        async for batch in stream_unassigned_questions(async_session, user_id):
+            yield b"".join(dump_question_export(question) for question in batch)
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+@router.get(
+    "/plans/export",
+    summary="Export the authenticated user's plan and answer history as NDJSON",
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    responses={
+        status.HTTP_200_OK: {
+            "description": "One JSON document per line: plans with their questions, then unassigned answers",
+            "content": {"application/x-ndjson": {}, "application/gzip": {}},
+        },
+        status.HTTP_401_UNAUTHORIZED: {
+            "description": "Unauthorized",
+            "content": {"application/json": {"example": {"message": "Unauthorized"}}},
+        },
+    },
+)
+async def export_plans(
+    user: Annotated[Principal | None, Depends(get_current_active_user)],
+    compress: Annotated[
+        bool, Query(description="Gzip the export for download")
+    ] = False,
+):
+    if user is None:
+        return JSONResponse(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            content={"message": "Unauthorized"},
+        )
+
+    body = export_plan_history(user.id)
+    if compress:
+        return StreamingResponse(
+            gzip_stream(body),
+            media_type="application/gzip",
+            headers={"Content-Disposition": 'attachment; filename="plans.ndjson.gz"'},
+        )
+    return StreamingResponse(
+        body,
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="plans.ndjson"'},
+    )
+
+
+@router.get(
+    "/plans/search",
+    summary="Search the authenticated user's plans and answers",
+    response_model=list[SearchHit],
+    status_code=status.HTTP_200_OK,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {
+            "description": "Unauthorized",
+            "content": {"application/json": {"example": {"message": "Unauthorized"}}},
+        }
+    },
+)
+async def search(
+    q: Annotated[
+        str, Query(min_length=1, max_length=200, description="Words to search for")
+    ],
+    user: Annotated[Principal | None, Depends(get_current_active_user)],
+    async_session: Annotated[AsyncSession, Depends(get_read_session)],
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    offset: Annotated[int, Query(ge=0)] = 0,
+):
+    if user is None:
+        return JSONResponse(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            content={"message": "Unauthorized"},
+        )
+
+    return await search_plans(async_session, user.id, q, limit=limit, offset=offset)
 
 
 @router.get(
@@ -150,6 +329,9 @@ async def get_plans(
     response_model=PlanSchema,
     status_code=status.HTTP_200_OK,
     responses={
+        status.HTTP_304_NOT_MODIFIED: {
+            "description": "The plan matching the supplied ETag has not changed",
+        },
         status.HTTP_401_UNAUTHORIZED: {
             "description": "Unauthorized",
             "content": {"application/json": {"example": {"message": "Unauthorized"}}},
@@ -161,9 +343,10 @@ async def get_plans(
     },
 )
 async def get_plan(
-    plan_id: Annotated[str, Path(title="Plan ID", description="The ID of the plan")],
-    user: Annotated[UserModel | None, Depends(get_current_active_user)],
-    async_session: Annotated[AsyncSession, Depends(get_async_session)],
+    plan_id: Annotated[UUID, Path(title="Plan ID", description="The ID of the plan")],
+    user: Annotated[Principal | None, Depends(get_current_active_user)],
+    async_session: Annotated[AsyncSession, Depends(get_read_session)],
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
     if user is None:
         return JSONResponse(
@@ -171,14 +354,45 @@ async def get_plan(
             content={"message": "Unauthorized"},
         )
 
-    plan = await get_plan_crud(async_session, plan_id)
-    if plan is None:
-        return JSONResponse(
-            status_code=status.HTTP_404_NOT_FOUND,
-            content={"message": "Plan not found"},
+    # A cached body means the plan existed within the cache TTL; otherwise it is
+    # loaded, so a deleted or archived plan is a 404 rather than a 304
+    cache = get_plan_response_cache()
+    body = cache.get(plan_id)
+    if body is None:
+        plan = await get_plan_crud(async_session, plan_id)
+        if plan is None:
+            return JSONResponse(
+                status_code=status.HTTP_404_NOT_FOUND,
+                content={"message": "Plan not found"},
+            )
+        body = dump_plan(plan)
+        cache.set(plan_id, body)
+
+    # Plans are immutable, so the ETag only depends on the ID
+    if etag_matches(if_none_match, plan_etag(plan_id)):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers=plan_cache_headers(plan_id),
         )
 
-    return plan
+    return RawJSONResponse(body, headers=plan_cache_headers(plan_id))
+
+
+WEBSOCKET_ROUTE = "/planner/ws/{token}"
+
+
+async def receive_message(websocket: WebSocket) -> str:
+    """
+    Waits for the client's next message.
+
+    Everything a message triggers is one unit of work for the statement
+    counters, so the unit ends while waiting on the client and a new one starts
+    when the message arrives.
+    """
+    finish_unit()
+    message = await websocket.receive_text()
+    start_unit("websocket", WEBSOCKET_ROUTE)
+    return message
 
 
 @router.websocket("/ws/{token}", name="planner")
@@ -202,10 +416,28 @@ async def planner(
         )
         return
 
+    # Resolved on a short-lived read session, so the write session holds no
+    # connection while waiting on the user. Not from the principal cache: another
+    # worker may have revoked the token since the principal was cached
     user_id = UUID(payload["sub"])
-    user = await get_user_by_id(async_session, user_id)
+    async with (await get_read_session_factory(user_id))() as read_session:
+        user = await get_principal_by_id(read_session, user_id)
+    if user is None or not user.is_active:
+        await websocket.close(
+            code=status.WS_1008_POLICY_VIOLATION, reason="Inactive or unknown user"
+        )
+        return
+
+    if token_revoked(payload, user.tokens_valid_after):
+        await websocket.close(
+            code=status.WS_1008_POLICY_VIOLATION, reason="Token has been revoked"
+        )
+        return
 
     await websocket.accept()
+    logger.info("Client connected", extra={"user_id": str(user.id)})
+    websocket_connects.inc()
+    websocket_active.inc()
 
     # Initialize the OpenAI client
     openai_client = get_openai_client()
@@ -219,7 +451,7 @@ async def planner(
         while True:
             try:
                 # Try to receive user data
-                data = await websocket.receive_text()
+                data = await receive_message(websocket)
 
                 # Validate and process user input
                 if not data.strip():
@@ -228,27 +460,40 @@ async def planner(
                     )
                     continue
 
+                # Checked before classifying, which is an LLM call too
+                await check_token_budget(user.id)
+
                 # Call OpenAI to classify the user's intent (meal/workout/both)
-                choice = await asyncio.to_thread(openai_client.get_plan_choice, data)
-                print(f"User choice: {choice}")
+                with plan_choice_seconds.time():
+                    choice = await run_llm(
+                        user.id, None, openai_client.get_plan_choice, data
+                    )
+                logger.info(
+                    "Plan choice",
+                    extra={
+                        "choice": getattr(choice, "value", choice),
+                        "hot_path": True,
+                    },
+                )
 
-                # Determine appropriate response based on user choice
+                # Determine appropriate response based on user choice; the plan
+                # handlers reply with the plan themselves
                 if choice == PlanType.MEAL:
-                    response = await handle_meal_plan(
+                    await handle_meal_plan(
                         websocket, openai_client, user, async_session
                     )
                 elif choice == PlanType.WORKOUT:
-                    response = await handle_workout_plan(
+                    await handle_workout_plan(
                         websocket, openai_client, user, async_session
                     )
                 elif choice == PlanType.BOTH:
-                    response = await handle_both_plans(
+                    await handle_both_plans(
                         websocket, openai_client, user, async_session
                     )
                 else:
-                    response = "Invalid choice. Please reply with a message that properly references a meal plan, workout plan, or both."
-
-                await websocket.send_text(response)
+                    await websocket.send_text(
+                        "Invalid choice. Please reply with a message that properly references a meal plan, workout plan, or both."
+                    )
 
             except ValueError as ve:
                 await websocket.send_text(
@@ -257,10 +502,13 @@ async def planner(
                 continue  # Let the user try again
 
     except WebSocketDisconnect as e:
-        print(f"Client disconnected: {e}")
+        logger.info("Client disconnected", extra={"code": e.code, "reason": e.reason})
     except WebSocketException as e:
-        print(f"WebSocketException occurred: {e}")
+        logger.warning("WebSocket error", extra={"code": e.code, "reason": e.reason})
     finally:
+        finish_unit()
+        websocket_active.dec()
+        websocket_disconnects.inc()
         # Ensure proper closure of the WebSocket connection if not already closed
         if websocket.client_state != WebSocketState.DISCONNECTED:
             await websocket.close(
@@ -268,47 +516,100 @@ async def planner(
             )
 
 
+async def get_reusable_plan_description(
+    user: Principal, plan_type: PlanType, answers: dict[str, str]
+) -> str | None:
+    # Near-identical answers produce the same plan, so skip the LLM call
+    async with (await get_read_session_factory(user.id))() as read_session:
+        plan_id = await find_similar_plan(read_session, user.id, plan_type, answers)
+        if plan_id is None:
+            return None
+        plan = await get_plan_crud(read_session, plan_id)
+    if plan is None:
+        # Deleted by another worker; forget it so the next best match is used
+        forget_plans([plan_id])
+        return None
+    # The index matches owners by hash, so make sure of it before reusing
+    return plan.description if plan.user_id == user.id else None
+
+
+async def wait_for_answers(pending: list[asyncio.Future[dict]]) -> list[dict]:
+    """
+    Waits for the write-behind queue to commit a questionnaire's answers.
+
+    Raises:
+        ValueError: If a group commit holding any of them failed, so the chat
+        reports the error and carries on instead of closing.
+    """
+    # Every future is awaited, so no failure is left unretrieved
+    results = await asyncio.gather(*pending, return_exceptions=True)
+    for result in results:
+        if isinstance(result, SQLAlchemyError):
+            raise ValueError("Your answers could not be saved") from result
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+
 async def handle_meal_plan(
     websocket: WebSocket,
     openai_client: OpenAIClient,
-    user: UserModel,
+    user: Principal,
     async_session: AsyncSession,
+    reply: Callable[[str], str] | None = lambda plan: plan,
 ) -> str:
-    # load questions from the database or a file
-    question_objects = load_questions(plan_type="meal")
+    """
+    Asks the meal questionnaire and generates the plan, replying with
+    `reply(plan)` unless `reply` is None. The reply is sent before the generation
+    stops being tracked, so a shutdown waits for it to reach the user.
+    """
+    # Checked before the questionnaire, so the user is not asked for answers
+    # that cannot be turned into a plan today
+    await check_token_budget(user.id)
+
+    # Current question versions, from the catalog synced at startup
+    catalog_entries = get_question_catalog().current(PlanType.MEAL)
+    wait_timer = question_wait_seconds.labels(PlanType.MEAL.value)
 
     # Process the request for a meal plan here
     answers = {}
-    questions: list[QuestionModel] = []
-    for question_object in question_objects:
-        await websocket.send_text(
-            f"{question_object['question']}\nPurpose: {question_object['purpose']}"
-        )
-        answer = await websocket.receive_text()
-        answers[question_object["question"]] = answer
-        question = await create_question(
-            async_session=async_session,
-            user_id=user.id,
-            question=question_object["question"],
-            answer=answer,
+    pending: list[asyncio.Future[dict]] = []
+    for entry in catalog_entries:
+        await websocket.send_text(f"{entry.question}\nPurpose: {entry.purpose}")
+        with wait_timer.time():
+            answer = await receive_message(websocket)
+        answers[entry.question] = answer
+        # Group-committed with other chats' answers by the write-behind queue
+        pending.append(
+            await queue_question(user_id=user.id, catalog_id=entry.id, answer=answer)
         )
-        questions.append(question)
+    # The plan references the answers, so they must be committed first
+    questions = await wait_for_answers(pending)
 
     try:
         # Process the answers and generate a meal plan here
-        plan_description = await asyncio.to_thread(
-            openai_client.generate_meal_plan, answers
-        )
-        plan = await create_plan(
-            async_session=async_session,
-            user_id=user.id,
-            description=plan_description,
-            plan_type=PlanType.MEAL,
-        )
-        # Tag the questions with the plan ID
-        for question in questions:
-            question.plan_id = plan.id
-        await async_session.commit()
+        # Tracked so that a shutdown waits for the plan to reach the user
+        with plan_generations.track():
+            plan_description = await get_reusable_plan_description(
+                user, PlanType.MEAL, answers
+            )
+            reused = plan_description is not None
+            if not reused:
+                plan_description = await run_llm(
+                    user.id, PlanType.MEAL, openai_client.generate_meal_plan, answers
+                )
+            with db_operation_seconds.labels("create_plan").time():
+                plan = await create_plan(
+                    async_session=async_session,
+                    user_id=user.id,
+                    description=plan_description,
+                    plan_type=PlanType.MEAL,
+                    question_ids=[question["id"] for question in questions],
+                )
+            if not reused:
+                remember_plan_answers(plan.id, user.id, PlanType.MEAL, answers)
+            if reply is not None:
+                await websocket.send_text(reply(plan_description))
 
         # Return the generated meal plan description
         return plan_description
@@ -320,44 +621,65 @@ async def handle_meal_plan(
 async def handle_workout_plan(
     websocket: WebSocket,
     openai_client: OpenAIClient,
-    user: UserModel,
+    user: Principal,
     async_session: AsyncSession,
+    reply: Callable[[str], str] | None = lambda plan: plan,
 ) -> str:
-    # load questions from the database or a file
-    question_objects = load_questions(plan_type="workout")
+    """
+    Asks the workout questionnaire and generates the plan, replying with
+    `reply(plan)` unless `reply` is None. The reply is sent before the generation
+    stops being tracked, so a shutdown waits for it to reach the user.
+    """
+    # Checked before the questionnaire, so the user is not asked for answers
+    # that cannot be turned into a plan today
+    await check_token_budget(user.id)
+
+    # Current question versions, from the catalog synced at startup
+    catalog_entries = get_question_catalog().current(PlanType.WORKOUT)
+    wait_timer = question_wait_seconds.labels(PlanType.WORKOUT.value)
 
     # Process the request for a workout plan here
     answers = {}
-    questions: list[QuestionModel] = []
-    for question_object in question_objects:
-        await websocket.send_text(
-            f"{question_object['question']}\nPurpose: {question_object['purpose']}"
-        )
-        answer = await websocket.receive_text()
-        answers[question_object["question"]] = answer
-        question = await create_question(
-            async_session=async_session,
-            user_id=user.id,
-            question=question_object["question"],
-            answer=answer,
+    pending: list[asyncio.Future[dict]] = []
+    for entry in catalog_entries:
+        await websocket.send_text(f"{entry.question}\nPurpose: {entry.purpose}")
+        with wait_timer.time():
+            answer = await receive_message(websocket)
+        answers[entry.question] = answer
+        # Group-committed with other chats' answers by the write-behind queue
+        pending.append(
+            await queue_question(user_id=user.id, catalog_id=entry.id, answer=answer)
         )
-        questions.append(question)
+    # The plan references the answers, so they must be committed first
+    questions = await wait_for_answers(pending)
 
     # Process the answers and generate a workout plan here
     try:
-        plan_description = await asyncio.to_thread(
-            openai_client.generate_workout_plan, answers
-        )
-        plan = await create_plan(
-            async_session=async_session,
-            user_id=user.id,
-            description=plan_description,
-            plan_type=PlanType.WORKOUT,
-        )
-        # Tag the questions with the plan ID
-        for question in questions:
-            question.plan_id = plan.id
-        await async_session.commit()
+        # Tracked so that a shutdown waits for the plan to reach the user
+        with plan_generations.track():
+            plan_description = await get_reusable_plan_description(
+                user, PlanType.WORKOUT, answers
+            )
+            reused = plan_description is not None
+            if not reused:
+                plan_description = await run_llm(
+                    user.id,
+                    PlanType.WORKOUT,
+                    openai_client.generate_workout_plan,
+                    answers,
+                )
+            with db_operation_seconds.labels("create_plan").time():
+                plan = await create_plan(
+                    async_session=async_session,
+                    user_id=user.id,
+                    description=plan_description,
+                    plan_type=PlanType.WORKOUT,
+                    question_ids=[question["id"] for question in questions],
+                )
+            if not reused:
+                remember_plan_answers(plan.id, user.id, PlanType.WORKOUT, answers)
+            if reply is not None:
+                await websocket.send_text(reply(plan_description))
 
         return plan_description
     except ValueError as e:
@@ -368,7 +690,7 @@ async def handle_workout_plan(
 async def handle_both_plans(
     websocket: WebSocket,
     openai_client: OpenAIClient,
-    user: UserModel,
+    user: Principal,
     async_session: AsyncSession,
 ) -> str:
     # Send a message to the user to provide answers for both meal and workout plans
@@ -376,12 +698,17 @@ async def handle_both_plans(
 
     try:
         meal_plan = await handle_meal_plan(
-            websocket, openai_client, user, async_session
+            websocket, openai_client, user, async_session, reply=None
         )
+
+        def both_plans(workout_plan: str) -> str:
+            return f"# Meal Plan:\n{meal_plan}\n\n# Workout Plan:\n{workout_plan}"
+
+        # Both plans are delivered in one message, once the second is generated
         workout_plan = await handle_workout_plan(
-            websocket, openai_client, user, async_session
+            websocket, openai_client, user, async_session, reply=both_plans
         )
-        return f"# Meal Plan:\n{meal_plan}\n\n# Workout Plan:\n{workout_plan}"
+        return both_plans(workout_plan)
     except ValueError as e:
         await async_session.rollback()
         raise e
@@ -0,0 +1,71 @@
+from typing import Any, Iterable
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from ..auth.schemas import User as UserSchema
+from ..planner.schemas import Plan as PlanSchema, Question as QuestionSchema
+
+plan_adapter = TypeAdapter(PlanSchema)
+plan_list_adapter = TypeAdapter(list[PlanSchema])
+question_adapter = TypeAdapter(QuestionSchema)
+user_adapter = TypeAdapter(UserSchema)
+
+
+class RawJSONResponse(Response):
+    """
+    A response for bodies that have already been serialized to JSON bytes.
+    """
+
+    media_type = "application/json"
+
+
+def dump_plan(plan: Any) -> bytes:
+    """
+    Serializes a `Plan` ORM object straight to JSON bytes, validating it once.
+    """
+    return plan_adapter.dump_json(
+        plan_adapter.validate_python(plan, from_attributes=True)
+    )
+
+
+def dump_plans(plans: Iterable[Any]) -> bytes:
+    """
+    Serializes a list of `Plan` ORM objects straight to JSON bytes.
+    """
+    return plan_list_adapter.dump_json(
+        plan_list_adapter.validate_python(list(plans), from_attributes=True)
+    )
+
+
+def dump_user(user: Any) -> bytes:
+    """
+    Serializes a `User` ORM object straight to JSON bytes.
+    """
+    return user_adapter.dump_json(
+        user_adapter.validate_python(user, from_attributes=True)
+    )
+
+
+def dump_plan_export(plan: Any, questions: Iterable[Any]) -> bytes:
+    """
+    Serializes a plan and its questions as a single NDJSON export line.
+    """
+    record = plan_adapter.validate_python(plan, from_attributes=True)
+    record.questions = [
+        question_adapter.validate_python(question, from_attributes=True)
+        for question in questions
+    ]
+    return plan_adapter.dump_json(record) + b"\n"
+
+
+def dump_question_export(question: Any) -> bytes:
+    """
+    Serializes an answer that is not attached to a plan as an NDJSON export line.
+    """
+    return (
+        question_adapter.dump_json(
+            question_adapter.validate_python(question, from_attributes=True)
+        )
+        + b"\n"
+    )
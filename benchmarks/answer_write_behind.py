@@ -0,0 +1,117 @@
+"""
+Chat answer persistence: one commit per answer against the write-behind queue.
+
+Many chats answer their questionnaires concurrently against a freshly migrated
+SQLite file. Each answer is written first with `create_question`, which commits
+it on its own as the chat handler used to, then with `queue_question`, which
+group-commits it with other chats' answers. The chat-side latency is the time a
+chat is blocked before it can read its next message; the commit latency is how
+long a queued answer waits to be durable.
+
+Usage:
+    python -m benchmarks.answer_write_behind [chats] [answers]
+"""
+
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from uuid import uuid4
+
+
+def percentile(values: list[float], q: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100)[q - 1]
+
+
+async def run(mode: str, chats: int, count: int) -> tuple[float, dict]:
+    from sqlalchemy import event
+
+    from app.db.config import AsyncSessionLocal, get_async_engine
+    from app.planner.crud import create_question, get_answer_queue, queue_question
+
+    commits = 0
+
+    def count_commit(*args) -> None:
+        nonlocal commits
+        commits += 1
+
+    event.listen(get_async_engine().sync_engine, "commit", count_commit)
+    stats = {"blocked": [], "durable": []}
+
+    async def chat() -> None:
+        user_id = uuid4()
+        pending = []
+        async with AsyncSessionLocal() as async_session:
+            for n in range(count):
+                started = time.perf_counter()
+                if mode == "per answer":
+                    await create_question(async_session, user_id, 1, f"answer {n}")
+                    stats["blocked"].append(time.perf_counter() - started)
+                    stats["durable"].append(time.perf_counter() - started)
+                else:
+                    future = await queue_question(user_id, 1, f"answer {n}")
+                    stats["blocked"].append(time.perf_counter() - started)
+                    future.add_done_callback(
+                        lambda _, started=started: stats["durable"].append(
+                            time.perf_counter() - started
+                        )
+                    )
+                    pending.append(future)
+                # Users take a moment between answers
+                await asyncio.sleep(0.001)
+        await asyncio.gather(*pending)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(chat() for _ in range(chats)))
+    elapsed = time.perf_counter() - started
+    await get_answer_queue().close()
+    event.remove(get_async_engine().sync_engine, "commit", count_commit)
+    stats["commits"] = commits
+    return elapsed, stats
+
+
+async def benchmark(chats: int, count: int) -> None:
+    from app.db.init_db import dispose_db
+
+    print(f"{chats} chats x {count} answers")
+    print(
+        f"{'mode':>12} {'total (s)':>10} {'answers/s':>10} {'commits':>8} "
+        f"{'blocked p50/p99 (ms)':>21} {'durable p50/p99 (ms)':>21}"
+    )
+    for mode in ("per answer", "queued"):
+        elapsed, stats = await run(mode, chats, count)
+        blocked, durable = stats["blocked"], stats["durable"]
+        print(
+            f"{mode:>12} {elapsed:>10.2f} {chats * count / elapsed:>10.0f} "
+            f"{stats['commits']:>8} "
+            f"{percentile(blocked, 50) * 1000:>10.2f}/{percentile(blocked, 99) * 1000:<10.2f}"
+            f"{percentile(durable, 50) * 1000:>10.2f}/{percentile(durable, 99) * 1000:<10.2f}"
+        )
+    await dispose_db()
+
+
+def main(chats: int, count: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["DATABASE_URL"] = (
+            f"sqlite+aiosqlite:///{os.path.join(directory, 'app.db')}"
+        )
+        os.environ["DB_ECHO"] = "false"
+        subprocess.run(
+            ["alembic", "upgrade", "head"],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        asyncio.run(benchmark(chats, count))
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 10,
+    )
@@ -0,0 +1,126 @@
+"""
+Cold start to first request served.
+
+Starts uvicorn against a freshly migrated SQLite database several times and
+measures the wall time from spawning the process to the first successful
+response, alongside the worker's own `/health/startup` timings. It then times
+the startup schema step on its own: the old `create_all` path against the
+schema version check that replaced it.
+
+Usage:
+    python -m benchmarks.cold_start [runs]
+"""
+
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def cold_start(env: dict[str, str]) -> tuple[float, dict]:
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/") as response:
+                    response.read()
+                break
+            except (urllib.error.URLError, ConnectionError):
+                if server.poll() is not None:
+                    raise RuntimeError("Server exited during startup")
+                time.sleep(0.005)
+        elapsed = time.perf_counter() - started
+        with urllib.request.urlopen(
+            f"http://127.0.0.1:{port}/health/startup"
+        ) as response:
+            timings = json.loads(response.read())
+    finally:
+        server.terminate()
+        server.wait()
+    return elapsed, timings
+
+
+async def schema_step(runs: int) -> dict[str, tuple[list[float], int]]:
+    from sqlalchemy import event
+
+    from app.db.config import get_async_engine
+    from app.db.init_db import check_schema_version, dispose_db, init_db
+
+    statements = 0
+
+    def count(*args) -> None:
+        nonlocal statements
+        statements += 1
+
+    event.listen(get_async_engine().sync_engine, "before_cursor_execute", count)
+    results = {}
+    for name, step in (
+        ("create_all", init_db),
+        ("version check", check_schema_version),
+    ):
+        durations = []
+        for _ in range(runs):
+            statements = 0
+            started = time.perf_counter()
+            await step()
+            durations.append(time.perf_counter() - started)
+            await dispose_db()
+        results[name] = durations, statements
+    return results
+
+
+def main(runs: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite+aiosqlite:///{os.path.join(directory, 'app.db')}",
+            DEBUG="false",
+        )
+        subprocess.run(
+            ["alembic", "upgrade", "head"],
+            env=env,
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+        results = [cold_start(env) for _ in range(runs)]
+        spawn = [elapsed for elapsed, _ in results]
+        ready = [timings["ready"] for _, timings in results]
+        first = [timings["first_request"] for _, timings in results]
+        print(f"{runs} cold starts (median)")
+        print(f"  spawn to first response:   {statistics.median(spawn) * 1000:8.1f} ms")
+        print(f"  import to ready:           {statistics.median(ready) * 1000:8.1f} ms")
+        print(f"  import to first response:  {statistics.median(first) * 1000:8.1f} ms")
+
+        os.environ.update(env)
+        print("startup schema step (median)")
+        for name, (durations, statements) in asyncio.run(schema_step(runs)).items():
+            print(
+                f"  {name + ':':<26} {statistics.median(durations) * 1000:8.1f} ms, "
+                f"{statements} statements"
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,134 @@
+"""
+Event loop stalls caused by logging under load.
+
+Many tasks, standing in for chats, log concurrently while a monitor task
+measures how late the loop wakes it from 1 ms sleeps. Output goes to a pipe
+drained at a fixed rate, standing in for a log collector that cannot keep up. The same load is run with
+`print`, a synchronous JSON `StreamHandler`, and the queue handler and writer
+thread from `app.core.log`.
+
+Usage:
+    python -m benchmarks.logging_stall [tasks] [records]
+"""
+
+import asyncio
+import logging
+import os
+import queue
+import statistics
+import sys
+import threading
+import time
+from logging.handlers import QueueListener
+
+from app.core.log import BoundedQueueHandler, ContextFilter, JSONFormatter
+
+# Bytes per second the simulated collector reads
+DRAIN_RATE = 512 * 1024
+QUEUE_SIZE = 10000
+
+
+def drain(read_fd: int, stop: threading.Event) -> None:
+    chunk = 64 * 1024
+    while not stop.is_set():
+        if not os.read(read_fd, chunk):
+            return
+        time.sleep(chunk / DRAIN_RATE)
+
+
+async def monitor(stop: asyncio.Event, lags: list[float]) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - started - 0.001)
+
+
+async def load(emit, tasks: int, records: int) -> tuple[float, list[float]]:
+    async def worker(n: int) -> None:
+        for i in range(records):
+            emit(n, i)
+            # Roughly one chat message per task per millisecond
+            await asyncio.sleep(0.001)
+
+    stop = asyncio.Event()
+    lags: list[float] = []
+    watcher = asyncio.create_task(monitor(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(tasks)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await watcher
+    return elapsed, lags
+
+
+def run(mode: str, tasks: int, records: int) -> tuple[float, list[float], int]:
+    read_fd, write_fd = os.pipe()
+    stop = threading.Event()
+    reader = threading.Thread(target=drain, args=(read_fd, stop), daemon=True)
+    reader.start()
+    stream = os.fdopen(write_fd, "w", buffering=1)
+    logger = logging.getLogger(f"benchmark.{mode}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    listener = handler = None
+
+    if mode == "print":
+
+        def emit(n: int, i: int) -> None:
+            print(f"User choice: task {n} record {i}", file=stream, flush=True)
+
+    else:
+        writer = logging.StreamHandler(stream)
+        writer.setFormatter(JSONFormatter())
+        if mode == "sync json":
+            writer.addFilter(ContextFilter())
+            logger.addHandler(writer)
+        else:
+            handler = BoundedQueueHandler(queue.Queue(QUEUE_SIZE))
+            handler.addFilter(ContextFilter())
+            logger.addHandler(handler)
+            listener = QueueListener(handler.queue, writer)
+            listener.start()
+
+        def emit(n: int, i: int) -> None:
+            logger.info("Plan choice", extra={"task": n, "record": i})
+
+    elapsed, lags = asyncio.run(load(emit, tasks, records))
+    if listener is not None:
+        listener.stop()
+    stream.close()
+    stop.set()
+    reader.join()
+    os.close(read_fd)
+    return elapsed, lags, handler.dropped if handler is not None else 0
+
+
+def percentile(values: list[float], q: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100)[q - 1]
+
+
+def main(tasks: int, records: int) -> None:
+    print(
+        f"{tasks} tasks x {records} records, collector draining "
+        f"{DRAIN_RATE // 1024} KiB/s"
+    )
+    print(
+        f"{'mode':>10} {'total (s)':>10} {'lag p50 (ms)':>13} {'lag p99 (ms)':>13} "
+        f"{'lag max (ms)':>13} {'dropped':>8}"
+    )
+    for mode in ("print", "sync json", "queue"):
+        elapsed, lags, dropped = run(mode, tasks, records)
+        print(
+            f"{mode:>10} {elapsed:>10.2f} {percentile(lags, 50) * 1000:>13.2f} "
+            f"{percentile(lags, 99) * 1000:>13.2f} {max(lags) * 1000:>13.2f} "
+            f"{dropped:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 100,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 100,
+    )
@@ -0,0 +1,71 @@
+"""
+Event-loop latency during a login storm.
+
+Runs a burst of concurrent password verifications while a ticker coroutine
+measures how late the event loop wakes it up. Verification is done once inline
+on the loop (the old behaviour) and once through the password executor.
+
+Usage:
+    python -m benchmarks.login_storm [logins]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from app.core.utils import (
+    check_password_hash,
+    generate_password_hash,
+    shutdown_password_executor,
+    start_password_executor,
+    verify_password,
+)
+
+TICK = 0.005
+
+
+async def ticker(lags: list[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - started - TICK)
+
+
+async def storm(logins: int, verify) -> tuple[float, list[float]]:
+    lags: list[float] = []
+    stop = asyncio.Event()
+    task = asyncio.create_task(ticker(lags, stop))
+    await asyncio.sleep(TICK * 2)
+    started = time.perf_counter()
+    await asyncio.gather(*(verify() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await task
+    return elapsed, lags
+
+
+async def main(logins: int) -> None:
+    hashed = generate_password_hash("Password123)")
+
+    async def inline():
+        verify_password("Password123)", hashed)
+
+    async def offloaded():
+        await check_password_hash("Password123)", hashed)
+
+    start_password_executor()
+    print(f"{logins} concurrent logins")
+    print(f"{'mode':>10} {'total (s)':>10} {'p50 lag (ms)':>13} {'max lag (ms)':>13}")
+    for name, verify in (("inline", inline), ("executor", offloaded)):
+        elapsed, lags = await storm(logins, verify)
+        lags = lags or [0.0]
+        print(
+            f"{name:>10} {elapsed:>10.2f} {statistics.median(lags) * 1000:>13.1f} "
+            f"{max(lags) * 1000:>13.1f}"
+        )
+    shutdown_password_executor()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 16))
@@ -0,0 +1,83 @@
+"""
+Cost of recording metrics on the hot path.
+
+Times the recording calls the request and chat paths make, and a request to a
+trivial route with and without `MetricsMiddleware`, then renders a registry
+holding a realistic number of series.
+
+Usage:
+    python -m benchmarks.metrics_overhead [iterations]
+"""
+
+import sys
+import timeit
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.metrics import Counter, Histogram, MetricsMiddleware, MetricsRegistry
+
+
+def per_call(statement, number: int) -> float:
+    return min(timeit.repeat(statement, number=number, repeat=5)) / number
+
+
+def build_app(instrumented: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    if instrumented:
+        registry = MetricsRegistry()
+        app.add_middleware(
+            MetricsMiddleware,
+            histogram=Histogram(
+                "bench_seconds", "", ("method", "route", "status"), registry=registry
+            ),
+        )
+    return app
+
+
+def main(iterations: int) -> None:
+    registry = MetricsRegistry()
+    counter = Counter("bench_total", "", registry=registry)
+    histogram = Histogram("bench_seconds", "", ("operation",), registry=registry)
+    bound = histogram.labels("create_plan")
+
+    print(f"{'operation':>28} {'ns/call':>10}")
+    for name, statement in (
+        ("counter.inc()", counter.inc),
+        ("histogram.labels().observe()", lambda: histogram.labels("x").observe(0.02)),
+        ("bound.observe()", lambda: bound.observe(0.02)),
+    ):
+        print(f"{name:>28} {per_call(statement, iterations) * 1e9:>10.0f}")
+
+    def timed() -> None:
+        with bound.time():
+            pass
+
+    print(f"{'with bound.time()':>28} {per_call(timed, iterations) * 1e9:>10.0f}")
+
+    requests = max(iterations // 100, 100)
+    print(f"{'app':>28} {'us/request':>10}")
+    for instrumented in (False, True):
+        with TestClient(build_app(instrumented)) as client:
+            elapsed = per_call(lambda: client.get("/items/1"), requests)
+        name = "with middleware" if instrumented else "without middleware"
+        print(f"{name:>28} {elapsed * 1e6:>10.0f}")
+
+    registry = MetricsRegistry()
+    routes = Histogram(
+        "bench_seconds", "", ("method", "route", "status"), registry=registry
+    )
+    for route in range(30):
+        for status in ("200", "401", "404"):
+            routes.labels("GET", f"/route/{route}", status).observe(0.01)
+    elapsed = per_call(registry.render, 100)
+    print(f"render 90 histogram series: {elapsed * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,170 @@
+"""
+Write/read latency and storage of plan descriptions with and without compression.
+
+Stores the same synthetic 7-day meal plans, formatted like the model's output,
+once as plain text and once through `CompressedText`, then reads each back by
+primary key. Every plan is also added to the SQLite full-text search index, as
+`create_plan` does, and the index's size is reported next to the table's: it
+keeps its own uncompressed copy of each description for snippets, so it costs
+the same either way and bounds what compression saves on disk.
+
+Usage:
+    python -m benchmarks.plan_compression [plans]
+"""
+
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, select
+
+from app.db.types import CompressedText
+from app.planner.search import SQLITE_DDL
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+MEALS = {
+    "Breakfast": [
+        (
+            "Oatmeal with banana and groundnuts",
+            "1 cup oats, 1 banana, 2 tbsp groundnuts",
+        ),
+        ("Akara with pap", "6 bean cakes, 1 cup pap"),
+        ("Boiled yam with egg sauce", "2 slices yam, 2 eggs, tomatoes, onions"),
+        ("Whole wheat toast with avocado", "2 slices bread, half an avocado"),
+        ("Moi moi with custard", "1 wrap moi moi, 1 cup custard"),
+    ],
+    "Lunch": [
+        ("Jollof rice with grilled chicken", "1.5 cups rice, 1 chicken thigh, salad"),
+        ("Beans and plantain", "1 cup beans, 1 ripe plantain"),
+        ("Vegetable soup with eba", "1 bowl soup, 1 wrap eba"),
+        ("Fried rice with turkey", "1.5 cups rice, 150 g turkey"),
+        ("Ofada rice with ayamase", "1 cup rice, 1 ladle stew"),
+    ],
+    "Dinner": [
+        ("Pepper soup with yam", "1 bowl fish pepper soup, 2 slices yam"),
+        ("Egusi soup with pounded yam", "1 bowl soup, 1 wrap pounded yam"),
+        ("Grilled fish with sweet potatoes", "1 croaker, 2 sweet potatoes"),
+        ("Okra soup with amala", "1 bowl soup, 1 wrap amala"),
+        ("Spaghetti with minced beef", "1.5 cups pasta, 100 g beef"),
+    ],
+    "Snack": [
+        ("Roasted corn and coconut", "1 cob, 2 slices coconut"),
+        ("Greek yoghurt with honey", "1 cup yoghurt, 1 tsp honey"),
+        ("Chin chin", "1 small handful"),
+        ("Fruit salad", "pawpaw, pineapple, watermelon"),
+    ],
+}
+TIPS = [
+    "Cook soups in bulk on Sunday and freeze in portions.",
+    "Soak beans overnight to cut cooking time and fuel costs.",
+    "Buy staples like rice and garri in bulk to stay within budget.",
+    "Drink at least 2 litres of water a day.",
+    "Swap fried plantain for boiled plantain to reduce oil.",
+]
+
+
+def meal_plan(rng: random.Random) -> str:
+    lines = ["# 7-Day Meal Plan", ""]
+    groceries: set[str] = set()
+    for day in DAYS:
+        lines += [f"## {day}", ""]
+        total = 0
+        for meal, options in MEALS.items():
+            dish, portion = rng.choice(options)
+            kcal = rng.randrange(150, 750, 10)
+            cost = rng.randrange(300, 2500, 50)
+            total += kcal
+            groceries.update(portion.split(", "))
+            lines.append(
+                f"- **{meal}:** {dish} ({portion}) - about {kcal} kcal, "
+                f"estimated cost ₦{cost:,}"
+            )
+        lines += ["", f"*Daily total: about {total} kcal*", ""]
+    lines += ["## Grocery List", ""]
+    lines += [f"- {item}" for item in sorted(groceries)]
+    lines += ["", "## Tips", ""]
+    lines += [f"- {tip}" for tip in rng.sample(TIPS, 3)]
+    return "\n".join(lines)
+
+
+def run(
+    path: str, column_type, descriptions: list[str]
+) -> tuple[float, float, int, int]:
+    engine = create_engine(f"sqlite:///{path}")
+    table = Table(
+        "plans",
+        MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("description", column_type, nullable=False),
+    )
+    table.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for statement in SQLITE_DDL:
+            connection.exec_driver_sql(statement)
+
+    writes = []
+    with engine.begin() as connection:
+        for plan_id, description in enumerate(descriptions):
+            started = time.perf_counter()
+            connection.execute(
+                table.insert().values(id=plan_id, description=description)
+            )
+            connection.exec_driver_sql(
+                "INSERT INTO search_index (content, kind, doc_id, user_id) "
+                "VALUES (?, 'plan', ?, 0)",
+                (description, plan_id),
+            )
+            writes.append(time.perf_counter() - started)
+
+    reads = []
+    with engine.connect() as connection:
+        for plan_id, description in enumerate(descriptions):
+            started = time.perf_counter()
+            value = connection.execute(
+                select(table.c.description).where(table.c.id == plan_id)
+            ).scalar_one()
+            reads.append(time.perf_counter() - started)
+            assert value == description
+    engine.dispose()
+
+    connection = sqlite3.connect(path)
+    connection.execute("VACUUM")
+    (size,) = connection.execute(
+        "SELECT SUM(pgsize) FROM dbstat WHERE name = 'plans'"
+    ).fetchone()
+    (index_size,) = connection.execute(
+        "SELECT SUM(pgsize) FROM dbstat WHERE name LIKE 'search_index%'"
+    ).fetchone()
+    connection.close()
+    return statistics.mean(writes), statistics.mean(reads), size, index_size
+
+
+def main(count: int) -> None:
+    rng = random.Random(0)
+    descriptions = [meal_plan(rng) for _ in range(count)]
+    sizes = [len(description.encode()) for description in descriptions]
+    print(f"{count} plans, mean {statistics.mean(sizes) / 1024:.1f} KiB each")
+    print(
+        f"{'storage':>12} {'write (us)':>11} {'read (us)':>10} "
+        f"{'table (MiB)':>12} {'index (MiB)':>12}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for name, column_type in (
+            ("text", String()),
+            ("compressed", CompressedText(threshold=512)),
+        ):
+            write, read, size, index_size = run(
+                os.path.join(directory, f"{name}.db"), column_type, descriptions
+            )
+            print(
+                f"{name:>12} {write * 1e6:>11.0f} {read * 1e6:>10.0f} "
+                f"{size / 2**20:>12.1f} {index_size / 2**20:>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
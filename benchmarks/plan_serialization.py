@@ -0,0 +1,81 @@
+"""
+Micro-benchmark for serializing plan lists.
+
+Compares FastAPI's default `response_model` pipeline (validation, then
+`jsonable_encoder`, then `json.dumps`) against the prebuilt `TypeAdapter`
+that dumps straight to bytes.
+
+Usage:
+    python -m benchmarks.plan_serialization
+"""
+
+import asyncio
+import timeit
+from datetime import datetime
+from types import SimpleNamespace
+from uuid import uuid4
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.db.enums import PlanType
+from app.planner.schemas import Plan as PlanSchema
+from app.schemas.adapters import dump_plans
+
+SIZES = (10, 100, 1000)
+DESCRIPTION = "Monday\n\nBreakfast\nRecipe: Oatmeal with banana\n" * 20
+
+
+def make_plans(count: int) -> list[SimpleNamespace]:
+    user_id = uuid4()
+    return [
+        SimpleNamespace(
+            id=uuid4(),
+            user_id=user_id,
+            plan_type=PlanType.MEAL,
+            description=DESCRIPTION,
+            created_at=datetime.now(),
+            questions=[
+                SimpleNamespace(
+                    id=uuid4(),
+                    user_id=user_id,
+                    plan_id=None,
+                    question="How much time do you have available for cooking each day?",
+                    answer="About an hour",
+                    created_at=datetime.now(),
+                )
+                for _ in range(5)
+            ],
+        )
+        for _ in range(count)
+    ]
+
+
+def main() -> None:
+    field = create_response_field(name="Response", type_=list[PlanSchema])
+    loop = asyncio.new_event_loop()
+
+    def default_pipeline(plans):
+        content = loop.run_until_complete(
+            serialize_response(field=field, response_content=plans)
+        )
+        return JSONResponse(content).body
+
+    print(f"{'items':>6} {'default (ms)':>14} {'adapter (ms)':>14} {'speedup':>8}")
+    for size in SIZES:
+        plans = make_plans(size)
+        number = max(1, 2000 // size)
+        default = min(
+            timeit.repeat(lambda: default_pipeline(plans), number=number, repeat=5)
+        )
+        adapter = min(timeit.repeat(lambda: dump_plans(plans), number=number, repeat=5))
+        print(
+            f"{size:>6} {default / number * 1000:>14.3f} "
+            f"{adapter / number * 1000:>14.3f} {default / adapter:>7.1f}x"
+        )
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+On-disk size of the questions table with and without the question catalog.
+
+Builds two SQLite databases holding the same synthetic answers: one with the
+question text stored on every row (the old layout) and one referencing
+`question_catalog` by ID. Sizes come from the `dbstat` virtual table, so they
+cover each table and its indexes but not free pages.
+
+Usage:
+    python -m benchmarks.question_catalog_size [answers]
+"""
+
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+
+ANSWERS = [
+    "5000 NGN",
+    "rice, beans, plantain",
+    "none",
+    "gluten-free",
+    "3 meals and 2 snacks",
+    "chicken and vegetables",
+    "about 30 minutes a day",
+    "lose weight",
+    "bad knee",
+    "dumbbells at home",
+]
+
+COMMON_DDL = [
+    """
+    CREATE TABLE question_catalog (
+        id INTEGER NOT NULL PRIMARY KEY, key VARCHAR NOT NULL,
+        version INTEGER NOT NULL, plan_type VARCHAR(7) NOT NULL,
+        question VARCHAR NOT NULL, purpose VARCHAR NOT NULL,
+        created_at DATETIME NOT NULL, UNIQUE (key, version)
+    )
+    """,
+]
+
+BEFORE_DDL = [
+    """
+    CREATE TABLE questions (
+        id CHAR(32) NOT NULL PRIMARY KEY, user_id CHAR(32) NOT NULL,
+        plan_id CHAR(32), question VARCHAR NOT NULL, answer VARCHAR NOT NULL,
+        created_at DATETIME NOT NULL
+    )
+    """,
+    "CREATE INDEX ix_questions_user_id ON questions (user_id)",
+    "CREATE INDEX ix_questions_plan_id ON questions (plan_id)",
+    "CREATE INDEX ix_questions_created_at ON questions (created_at)",
+]
+
+AFTER_DDL = [
+    """
+    CREATE TABLE questions (
+        id CHAR(32) NOT NULL PRIMARY KEY, user_id CHAR(32) NOT NULL,
+        plan_id CHAR(32), catalog_id INTEGER NOT NULL, answer VARCHAR NOT NULL,
+        created_at DATETIME NOT NULL
+    )
+    """,
+    "CREATE INDEX ix_questions_user_id ON questions (user_id)",
+    "CREATE INDEX ix_questions_plan_id ON questions (plan_id)",
+    "CREATE INDEX ix_questions_created_at ON questions (created_at)",
+    "CREATE INDEX ix_questions_catalog_id ON questions (catalog_id)",
+]
+
+
+def synthetic_answers(bank: list[dict], count: int):
+    rng = random.Random(0)
+    user_id = plan_id = None
+    for n in range(count):
+        position = n % len(bank)
+        if position == 0:
+            plan_id = uuid.UUID(int=rng.getrandbits(128)).hex
+            if n % (len(bank) * 4) == 0:
+                user_id = uuid.UUID(int=rng.getrandbits(128)).hex
+        yield (
+            uuid.UUID(int=rng.getrandbits(128)).hex,
+            user_id,
+            plan_id,
+            position,
+            rng.choice(ANSWERS),
+            f"2026-01-01 00:{n // 60 % 60:02d}:{n % 60:02d}.{n % 1000000:06d}",
+        )
+
+
+def build(path: str, bank: list[dict], count: int, normalized: bool) -> None:
+    connection = sqlite3.connect(path)
+    for statement in COMMON_DDL + (AFTER_DDL if normalized else BEFORE_DDL):
+        connection.execute(statement)
+    connection.executemany(
+        "INSERT INTO question_catalog VALUES (?, ?, 1, ?, ?, ?, '2026-01-01')",
+        [
+            (
+                position + 1,
+                q["key"],
+                q["plan_type"].upper(),
+                q["question"],
+                q["purpose"],
+            )
+            for position, q in enumerate(bank)
+        ],
+    )
+    rows = (
+        (
+            row_id,
+            user_id,
+            plan_id,
+            position + 1 if normalized else bank[position]["question"],
+            answer,
+            created_at,
+        )
+        for row_id, user_id, plan_id, position, answer, created_at in synthetic_answers(
+            bank, count
+        )
+    )
+    connection.executemany("INSERT INTO questions VALUES (?, ?, ?, ?, ?, ?)", rows)
+    connection.commit()
+    connection.execute("VACUUM")
+    connection.close()
+
+
+def sizes(path: str) -> dict[str, int]:
+    connection = sqlite3.connect(path)
+    result = dict(
+        connection.execute(
+            "SELECT name, SUM(pgsize) FROM dbstat "
+            "WHERE name NOT LIKE 'sqlite_%' GROUP BY name"
+        ).fetchall()
+    )
+    connection.close()
+    return result
+
+
+def main(count: int) -> None:
+    with open("app/planner/questions.json", "r") as file:
+        bank = json.load(file)
+    with tempfile.TemporaryDirectory() as directory:
+        results = {}
+        for name, normalized in (("before", False), ("after", True)):
+            path = os.path.join(directory, f"{name}.db")
+            started = time.perf_counter()
+            build(path, bank, count, normalized)
+            results[name] = sizes(path)
+            print(f"built {name} in {time.perf_counter() - started:.1f}s")
+
+    print(f"{count} answers")
+    names = sorted(set(results["before"]) | set(results["after"]))
+    print(f"{'object':>28} {'before (MiB)':>13} {'after (MiB)':>12}")
+    for name in names:
+        before = results["before"].get(name, 0) / 2**20
+        after = results["after"].get(name, 0) / 2**20
+        print(f"{name:>28} {before:>13.1f} {after:>12.1f}")
+    before = sum(results["before"].values()) / 2**20
+    after = sum(results["after"].values()) / 2**20
+    print(f"{'total':>28} {before:>13.1f} {after:>12.1f} ({after / before:.0%})")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,118 @@
+"""
+Concurrent chat writes against a SQLite file.
+
+Simulates many WebSocket chats committing one answer at a time while other
+requests read, first with a plain aiosqlite engine (the old setup) and then with
+the engines from `app.db.config`: WAL, a single writer connection and a
+separate read pool.
+
+Usage:
+    python -m benchmarks.sqlite_concurrency [chats] [answers]
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, func, insert, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from app.db.config import create_engine
+
+READERS = 8
+
+answers = Table(
+    "answers",
+    MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("chat", Integer, nullable=False),
+    Column("answer", String, nullable=False),
+)
+
+
+async def chat(engine: AsyncEngine, chat_id: int, count: int, stats: dict) -> None:
+    for n in range(count):
+        started = time.perf_counter()
+        try:
+            async with engine.begin() as connection:
+                await connection.execute(
+                    insert(answers).values(chat=chat_id, answer=f"answer {n}")
+                )
+        except OperationalError:
+            stats["errors"] += 1
+        else:
+            stats["writes"].append(time.perf_counter() - started)
+        await asyncio.sleep(0)
+
+
+async def reader(engine: AsyncEngine, stop: asyncio.Event, stats: dict) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            async with engine.connect() as connection:
+                await connection.scalar(select(func.count()).select_from(answers))
+        except OperationalError:
+            stats["errors"] += 1
+        else:
+            stats["reads"].append(time.perf_counter() - started)
+        await asyncio.sleep(0.001)
+
+
+async def run(
+    writer: AsyncEngine, read: AsyncEngine, chats: int, count: int
+) -> tuple[float, dict]:
+    async with writer.begin() as connection:
+        await connection.run_sync(answers.metadata.create_all)
+    stats = {"writes": [], "reads": [], "errors": 0}
+    stop = asyncio.Event()
+    readers = [asyncio.create_task(reader(read, stop, stats)) for _ in range(READERS)]
+    started = time.perf_counter()
+    await asyncio.gather(*(chat(writer, n, count, stats) for n in range(chats)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await asyncio.gather(*readers)
+    await writer.dispose()
+    await read.dispose()
+    return elapsed, stats
+
+
+def percentile(values: list[float], q: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100)[q - 1]
+
+
+async def main(chats: int, count: int) -> None:
+    print(f"{chats} chats x {count} answers, {READERS} concurrent readers")
+    print(
+        f"{'mode':>8} {'total (s)':>10} {'writes/s':>9} {'errors':>7} "
+        f"{'write p50/p99 (ms)':>19} {'read p50/p99 (ms)':>18}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in ("default", "tuned"):
+            url = f"sqlite+aiosqlite:///{os.path.join(directory, mode)}.db"
+            if mode == "default":
+                writer = read = create_async_engine(url)
+            else:
+                writer, read = create_engine(url), create_engine(url, writer=False)
+            elapsed, stats = await run(writer, read, chats, count)
+            writes, reads = stats["writes"], stats["reads"]
+            print(
+                f"{mode:>8} {elapsed:>10.2f} {len(writes) / elapsed:>9.0f} "
+                f"{stats['errors']:>7} "
+                f"{percentile(writes, 50) * 1000:>9.1f}/{percentile(writes, 99) * 1000:<9.1f}"
+                f"{percentile(reads, 50) * 1000:>9.1f}/{percentile(reads, 99) * 1000:<8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(
+        main(
+            int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+            int(sys.argv[2]) if len(sys.argv) > 2 else 10,
+        )
+    )
@@ -1,11 +1,12 @@
+import asyncio
+import json
 import subprocess
+from pathlib import Path
 from typing import Annotated
 
 from rich import print
 import typer
 
-from app.core.config import get_settings
-
 app = typer.Typer()
 
 
@@ -25,12 +26,24 @@ def makemigrations(comment: Annotated[str, typer.Argument()] = "auto"):
 
 
 @app.command()
-def migrate():
+def migrate(
+    revision: Annotated[str, typer.Argument()] = "head",
+    baseline: Annotated[
+        bool,
+        typer.Option(
+            help="Mark a database whose tables were created before migrations as at the baseline revision first"
+        ),
+    ] = False,
+):
     """
     Run Alembic migrations
     """
     try:
-        upgrade_command = "alembic upgrade head"
+        if baseline:
+            stamp_command = "alembic stamp 0001"
+            print(f"Stamping the baseline revision: {stamp_command}")
+            subprocess.run(stamp_command, shell=True, check=True)
+        upgrade_command = f"alembic upgrade {revision}"
         print(f"Running Alembic upgrade: {upgrade_command}")
         subprocess.run(upgrade_command, shell=True, check=True)
     except subprocess.CalledProcessError as e:
@@ -40,16 +53,29 @@ def migrate():
 
 
 @app.command()
-def runserver():
+def runserver(
+    workers: Annotated[
+        int | None,
+        typer.Option(
+            min=1,
+            help="Worker processes; defaults to SERVER_WORKERS (1, or one per CPU this process may use when 0)",
+        ),
+    ] = None,
+):
     """
-    Run the FastAPI server
+    Run the FastAPI server: with reload in debug, otherwise with uvicorn workers configured by the SERVER_* settings
     """
+    from app.core.config import get_settings
+
+    if not get_settings().debug:
+        from app.core.server import run_server
+
+        print("Running FastAPI server with uvicorn")
+        run_server(workers)
+        return
+
     try:
-        server_command = (
-            f"fastapi dev app/main.py"
-            if get_settings().debug
-            else f"fastapi run app/main.py"
-        )
+        server_command = f"fastapi dev app/main.py"
         print(f"Running FastAPI server: {server_command}")
         subprocess.run(server_command, shell=True, check=True)
     except subprocess.CalledProcessError as e:
@@ -57,6 +83,119 @@ def runserver():
         return
 
 
+@app.command()
+def importusers(
+    path: Annotated[Path, typer.Argument(exists=True, dir_okay=False)],
+    batch_size: Annotated[int, typer.Option(min=1)] = 500,
+    report: Annotated[Path | None, typer.Option(dir_okay=False)] = None,
+):
+    """
+    Bulk import users from a CSV (with header) or JSONL file of username, email and password
+    """
+    from app.auth.bulk_import import import_users
+    from app.core.utils import shutdown_password_executor
+    from app.db.config import AsyncSessionLocal
+    from app.db.init_db import dispose_db
+
+    async def run():
+        try:
+            async with AsyncSessionLocal() as session:
+                return await import_users(session, path, batch_size)
+        finally:
+            shutdown_password_executor()
+            await dispose_db()
+
+    result = asyncio.run(run())
+    print(
+        f"[green]Imported {result.inserted} users[/green], "
+        f"{len(result.conflicts)} conflicts, {len(result.invalid)} invalid records"
+    )
+    if report is not None:
+        report.write_text(json.dumps(result.model_dump(), indent=2, default=str))
+        print(f"Report written to {report}")
+
+
+def run_retention_step(step):
+    from app.db.config import AsyncSessionLocal
+    from app.db.init_db import dispose_db
+    from app.planner.crud import sync_question_catalog
+    from app.planner.questions import load_question_bank
+
+    async def run():
+        try:
+            async with AsyncSessionLocal() as session:
+                # Archived answers are written out with their question text
+                await sync_question_catalog(session, load_question_bank())
+                return await step(session)
+        finally:
+            await dispose_db()
+
+    return asyncio.run(run())
+
+
+@app.command()
+def archiveplans(
+    older_than_days: Annotated[int | None, typer.Option(min=1)] = None,
+    batch_size: Annotated[int | None, typer.Option(min=1)] = None,
+):
+    """
+    Move plans older than the retention period, with their answers, into compressed per-user archives
+    """
+    from datetime import timedelta
+
+    from app.core.config import get_settings
+    from app.planner.retention import archive_old_plans
+
+    settings = get_settings()
+    days = older_than_days or settings.retention_archive_after_days
+    if days <= 0:
+        print(
+            "[red]Error:[/red] pass --older-than-days or set RETENTION_ARCHIVE_AFTER_DAYS"
+        )
+        raise typer.Exit(1)
+    report = run_retention_step(
+        lambda session: archive_old_plans(
+            session,
+            timedelta(days=days),
+            batch_size or settings.retention_batch_size,
+        )
+    )
+    print(
+        f"[green]Archived {report.archived_plans} plans[/green] and "
+        f"{report.archived_answers} answers into {report.archives} archives"
+    )
+
+
+@app.command()
+def sweepanswers(
+    older_than_hours: Annotated[int | None, typer.Option(min=1)] = None,
+    batch_size: Annotated[int | None, typer.Option(min=1)] = None,
+):
+    """
+    Delete answers from abandoned questionnaires that never produced a plan
+    """
+    from datetime import timedelta
+
+    from app.core.config import get_settings
+    from app.planner.retention import sweep_orphan_answers
+
+    settings = get_settings()
+    hours = older_than_hours or settings.retention_orphan_answer_hours
+    if hours <= 0:
+        print(
+            "[red]Error:[/red] pass --older-than-hours or set RETENTION_ORPHAN_ANSWER_HOURS"
+        )
+        raise typer.Exit(1)
+    deleted = run_retention_step(
+        lambda session: sweep_orphan_answers(
+            session,
+            timedelta(hours=hours),
+            batch_size or settings.retention_batch_size,
+        )
+    )
+    print(f"[green]Deleted {deleted} orphaned answers[/green]")
+
+
 @app.callback()
 def main(ctx: typer.Context):
     print(f"Executing the command: {ctx.invoked_subcommand}")
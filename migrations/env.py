@@ -31,6 +31,14 @@ target_metadata = models.Base.metadata
 config.set_main_option("sqlalchemy.url", get_settings().database_url)
 
 
+def include_name(name, type_, parent_names) -> bool:
+    # The full-text search index is created with raw DDL (see app/planner/search.py)
+    # and has no model, so keep autogenerate from proposing to drop it
+    if type_ == "table":
+        return not name.startswith("search_index")
+    return True
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -49,6 +57,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_name=include_name,
     )
 
     with context.begin_transaction():
@@ -56,7 +65,11 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: AsyncConnection):
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_name=include_name,
+    )
 
     with context.begin_transaction():
         context.run_migrations()
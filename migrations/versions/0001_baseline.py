@@ -0,0 +1,85 @@
+"""baseline schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Uuid(), nullable=False),
+        sa.Column("username", sa.String(), nullable=False),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("password_hash", sa.String(), nullable=False),
+        sa.Column("is_active", sa.Boolean(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_users_created_at"), "users", ["created_at"])
+    op.create_index(op.f("ix_users_email"), "users", ["email"], unique=True)
+    op.create_index(op.f("ix_users_updated_at"), "users", ["updated_at"])
+    op.create_index(op.f("ix_users_username"), "users", ["username"], unique=True)
+
+    op.create_table(
+        "plans",
+        sa.Column("id", sa.Uuid(), nullable=False),
+        sa.Column("user_id", sa.Uuid(), nullable=False),
+        sa.Column(
+            "plan_type",
+            sa.Enum("MEAL", "WORKOUT", "BOTH", name="plantype"),
+            nullable=False,
+        ),
+        sa.Column("description", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_plans_created_at"), "plans", ["created_at"])
+    op.create_index(op.f("ix_plans_user_id"), "plans", ["user_id"])
+
+    op.create_table(
+        "questions",
+        sa.Column("id", sa.Uuid(), nullable=False),
+        sa.Column("user_id", sa.Uuid(), nullable=False),
+        sa.Column("plan_id", sa.Uuid(), nullable=True),
+        sa.Column("question", sa.String(), nullable=False),
+        sa.Column("answer", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["plan_id"], ["plans.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_questions_created_at"), "questions", ["created_at"])
+    op.create_index(op.f("ix_questions_plan_id"), "questions", ["plan_id"])
+    op.create_index(op.f("ix_questions_user_id"), "questions", ["user_id"])
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_questions_user_id"), table_name="questions")
+    op.drop_index(op.f("ix_questions_plan_id"), table_name="questions")
+    op.drop_index(op.f("ix_questions_created_at"), table_name="questions")
+    op.drop_table("questions")
+    op.drop_index(op.f("ix_plans_user_id"), table_name="plans")
+    op.drop_index(op.f("ix_plans_created_at"), table_name="plans")
+    op.drop_table("plans")
+    sa.Enum(name="plantype").drop(op.get_bind(), checkfirst=True)
+    op.drop_index(op.f("ix_users_username"), table_name="users")
+    op.drop_index(op.f("ix_users_updated_at"), table_name="users")
+    op.drop_index(op.f("ix_users_email"), table_name="users")
+    op.drop_index(op.f("ix_users_created_at"), table_name="users")
+    op.drop_table("users")
@@ -0,0 +1,131 @@
+"""question catalog
+
+Replaces the question text repeated on every answer with a reference to a
+versioned row in `question_catalog`. Existing answers are backfilled by matching
+their text against the question bank; text that is no longer in the bank is kept
+as a legacy catalog entry.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+
+import hashlib
+import json
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PLAN_TYPE = sa.Enum("MEAL", "WORKOUT", "BOTH", name="plantype").with_variant(
+    postgresql.ENUM("MEAL", "WORKOUT", "BOTH", name="plantype", create_type=False),
+    "postgresql",
+)
+
+question_catalog = sa.table(
+    "question_catalog",
+    sa.column("id", sa.Integer),
+    sa.column("key", sa.String),
+    sa.column("version", sa.Integer),
+    sa.column("plan_type", PLAN_TYPE),
+    sa.column("question", sa.String),
+    sa.column("purpose", sa.String),
+    sa.column("created_at", sa.DateTime),
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "question_catalog",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("plan_type", PLAN_TYPE, nullable=False),
+        sa.Column("question", sa.String(), nullable=False),
+        sa.Column("purpose", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("key", "version"),
+    )
+
+    bind = op.get_bind()
+    with open("app/planner/questions.json", "r") as file:
+        bank = {q["question"]: q for q in json.load(file)}
+    now = datetime.now()
+    rows = [
+        {
+            "key": q["key"],
+            "version": 1,
+            "plan_type": q["plan_type"].upper(),
+            "question": q["question"],
+            "purpose": q["purpose"],
+            "created_at": now,
+        }
+        for q in bank.values()
+    ]
+    # Answers whose text has since left the bank keep their wording as legacy
+    # entries, typed after the plan they belong to when there is one
+    legacy = bind.execute(
+        sa.text(
+            "SELECT questions.question, MIN(CAST(plans.plan_type AS VARCHAR)) "
+            "FROM questions LEFT JOIN plans ON plans.id = questions.plan_id "
+            "GROUP BY questions.question"
+        )
+    ).all()
+    for text, plan_type in legacy:
+        if text in bank:
+            continue
+        rows.append(
+            {
+                "key": "legacy-" + hashlib.sha1(text.encode()).hexdigest()[:12],
+                "version": 1,
+                "plan_type": plan_type or "BOTH",
+                "question": text,
+                "purpose": "",
+                "created_at": now,
+            }
+        )
+    op.bulk_insert(question_catalog, rows)
+
+    op.add_column("questions", sa.Column("catalog_id", sa.Integer(), nullable=True))
+    op.execute(
+        "UPDATE questions SET catalog_id = ("
+        "SELECT question_catalog.id FROM question_catalog "
+        "WHERE question_catalog.question = questions.question)"
+    )
+    with op.batch_alter_table("questions") as batch_op:
+        batch_op.alter_column("catalog_id", existing_type=sa.Integer(), nullable=False)
+        batch_op.create_foreign_key(
+            "fk_questions_catalog_id_question_catalog",
+            "question_catalog",
+            ["catalog_id"],
+            ["id"],
+        )
+        batch_op.create_index(op.f("ix_questions_catalog_id"), ["catalog_id"])
+        batch_op.drop_column("question")
+
+
+def downgrade() -> None:
+    op.add_column("questions", sa.Column("question", sa.String(), nullable=True))
+    op.execute(
+        "UPDATE questions SET question = ("
+        "SELECT question_catalog.question FROM question_catalog "
+        "WHERE question_catalog.id = questions.catalog_id)"
+    )
+    with op.batch_alter_table("questions") as batch_op:
+        batch_op.alter_column("question", existing_type=sa.String(), nullable=False)
+        batch_op.drop_index(op.f("ix_questions_catalog_id"))
+        batch_op.drop_constraint(
+            "fk_questions_catalog_id_question_catalog", type_="foreignkey"
+        )
+        batch_op.drop_column("catalog_id")
+    op.drop_table("question_catalog")
@@ -0,0 +1,89 @@
+"""compress plan descriptions
+
+Moves `plans.description` to a binary column written by `CompressedText`.
+Existing rows are re-encoded in batches so memory stays flat on large tables.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.config import get_settings
+from app.db.types import compress_text, decompress_text
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+plans = sa.table(
+    "plans",
+    sa.column("id", sa.Uuid),
+    sa.column("description", sa.String),
+    sa.column("description_data", sa.LargeBinary),
+)
+
+
+def reencode(source, target, convert) -> None:
+    bind = op.get_bind()
+    last_id = None
+    while True:
+        query = sa.select(plans.c.id, source).order_by(plans.c.id).limit(BATCH_SIZE)
+        if last_id is not None:
+            query = query.where(plans.c.id > last_id)
+        rows = bind.execute(query).all()
+        if not rows:
+            break
+        bind.execute(
+            plans.update()
+            .where(plans.c.id == sa.bindparam("plan_id"))
+            .values({target.name: sa.bindparam("value")}),
+            [{"plan_id": id, "value": convert(value)} for id, value in rows],
+        )
+        last_id = rows[-1][0]
+
+
+def upgrade() -> None:
+    settings = get_settings()
+    op.add_column("plans", sa.Column("description_data", sa.LargeBinary()))
+    reencode(
+        plans.c.description,
+        plans.c.description_data,
+        lambda value: compress_text(
+            value,
+            settings.plan_compression_threshold,
+            settings.plan_compression_level,
+        ),
+    )
+    with op.batch_alter_table("plans") as batch_op:
+        batch_op.drop_column("description")
+        batch_op.alter_column(
+            "description_data",
+            new_column_name="description",
+            existing_type=sa.LargeBinary(),
+            nullable=False,
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("plans") as batch_op:
+        batch_op.alter_column(
+            "description",
+            new_column_name="description_data",
+            existing_type=sa.LargeBinary(),
+            nullable=True,
+        )
+    op.add_column("plans", sa.Column("description", sa.String()))
+    reencode(plans.c.description_data, plans.c.description, decompress_text)
+    with op.batch_alter_table("plans") as batch_op:
+        batch_op.drop_column("description_data")
+        batch_op.alter_column("description", existing_type=sa.String(), nullable=False)
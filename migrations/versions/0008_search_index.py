@@ -0,0 +1,138 @@
+"""search index
+
+Creates the full-text index of plans and answers used by
+`app/planner/search.py`. It used to be created by the baseline, which
+`manage.py migrate --baseline` only stamps, so databases adopted that way had
+none; the `IF NOT EXISTS` guards keep this a no-op where the baseline made it.
+
+Plans and answers written before the index existed are then indexed in
+batches. Documents already in the index are skipped, so the backfill can be
+rerun after an interruption.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.core.config import get_settings
+from app.db.types import decompress_text
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+        content, kind UNINDEXED, doc_id UNINDEXED, user_id UNINDEXED,
+        tokenize = 'porter unicode61'
+    )
+    """,
+]
+
+POSTGRES_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS search_index (
+        doc_id UUID PRIMARY KEY,
+        user_id UUID NOT NULL,
+        kind VARCHAR(16) NOT NULL,
+        content TEXT NOT NULL,
+        body TSVECTOR NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_search_index_body ON search_index USING GIN (body)",
+    "CREATE INDEX IF NOT EXISTS ix_search_index_user_id ON search_index (user_id)",
+]
+
+SQLITE_INSERT = sa.text(
+    "INSERT INTO search_index (content, kind, doc_id, user_id) "
+    "VALUES (:content, :kind, :doc_id, :user_id)"
+).bindparams(
+    sa.bindparam("doc_id", type_=sa.Uuid), sa.bindparam("user_id", type_=sa.Uuid)
+)
+
+POSTGRES_INSERT = sa.text(
+    "INSERT INTO search_index (doc_id, user_id, kind, content, body) "
+    "VALUES (:doc_id, :user_id, :kind, :content, "
+    "to_tsvector(CAST(:config AS regconfig), :content)) "
+    "ON CONFLICT (doc_id) DO NOTHING"
+).bindparams(
+    sa.bindparam("doc_id", type_=sa.Uuid), sa.bindparam("user_id", type_=sa.Uuid)
+)
+
+BATCH_SIZE = 1000
+
+plans = sa.table(
+    "plans",
+    sa.column("id", sa.Uuid),
+    sa.column("user_id", sa.Uuid),
+    sa.column("description", sa.LargeBinary),
+)
+
+questions = sa.table(
+    "questions",
+    sa.column("id", sa.Uuid),
+    sa.column("user_id", sa.Uuid),
+    sa.column("answer", sa.String),
+)
+
+search_index = sa.table("search_index", sa.column("doc_id", sa.Uuid))
+
+
+def backfill(table, content, kind: str, convert, insert, extra: dict) -> None:
+    bind = op.get_bind()
+    last_id = None
+    while True:
+        query = (
+            sa.select(table.c.id, table.c.user_id, content)
+            .where(table.c.id.not_in(sa.select(search_index.c.doc_id)))
+            .order_by(table.c.id)
+            .limit(BATCH_SIZE)
+        )
+        if last_id is not None:
+            query = query.where(table.c.id > last_id)
+        rows = bind.execute(query).all()
+        if not rows:
+            break
+        bind.execute(
+            insert,
+            [
+                {
+                    "doc_id": id,
+                    "user_id": user_id,
+                    "kind": kind,
+                    "content": convert(value),
+                    **extra,
+                }
+                for id, user_id, value in rows
+            ],
+        )
+        last_id = rows[-1][0]
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        ddl, insert, extra = SQLITE_DDL, SQLITE_INSERT, {}
+    elif dialect == "postgresql":
+        ddl, insert = POSTGRES_DDL, POSTGRES_INSERT
+        extra = {"config": get_settings().search_text_config}
+    else:
+        # Searched by scanning, see `scan_documents`
+        return
+    for statement in ddl:
+        op.execute(statement)
+    backfill(plans, plans.c.description, "plan", decompress_text, insert, extra)
+    backfill(questions, questions.c.answer, "answer", str, insert, extra)
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS search_index")
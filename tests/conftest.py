@@ -0,0 +1,182 @@
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import email_validator
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+DATABASE_DIR = tempfile.TemporaryDirectory()
+
+# Settings are read once, on first use, so the test configuration has to be in
+# the environment before anything from `app` is imported
+os.environ.update(
+    DATABASE_URL=f"sqlite+aiosqlite:///{DATABASE_DIR.name}/test.db",
+    DB_RAISE_ON_LAZY_LOAD="true",
+    DB_STATEMENT_REPEAT_ACTION="raise",
+    BCRYPT_ROUNDS="4",
+    DEBUG="false",
+)
+for name, value in {
+    "JWT_SECRET_KEY": "test-jwt-secret",
+    "OPENAI_KEY": "test",
+    "OPENAI_MODEL": "test",
+    "OPENAI_ORGANIZATION_ID": "test",
+    "OPENAI_PROJECT_ID": "test",
+    "SESSION_SECRET_KEY": "test-session-secret",
+}.items():
+    os.environ.setdefault(name, value)
+# Signups would otherwise look up the DNS records of every test address
+email_validator.CHECK_DELIVERABILITY = False
+# Paths such as alembic.ini and the question bank are relative to the root
+os.chdir(ROOT)
+
+from uuid import UUID, uuid4  # noqa: E402
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.auth.principal import get_principal_cache  # noqa: E402
+from app.core.utils import get_verified_token_cache  # noqa: E402
+from app.db.config import (  # noqa: E402
+    AsyncSessionLocal,
+    get_async_engine,
+    get_async_read_engine,
+)
+from app.db.enums import PlanType  # noqa: E402
+from app.main import app  # noqa: E402
+from app.planner import views as planner_views  # noqa: E402
+from app.planner.cache import get_plan_response_cache  # noqa: E402
+from app.planner.crud import create_plan, write_questions  # noqa: E402
+from app.planner.questions import get_question_catalog  # noqa: E402
+
+PASSWORD = "Passw0rd!"
+
+
+@pytest.fixture(scope="session")
+def client():
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"],
+        check=True,
+        capture_output=True,
+    )
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(autouse=True)
+def cold_caches():
+    """
+    Empties the in-process caches, so every test sees the queries a request
+    makes when nothing is cached.
+    """
+    for cache in (
+        get_principal_cache(),
+        get_plan_response_cache(),
+        get_verified_token_cache(),
+    ):
+        cache.clear()
+
+
+@pytest.fixture
+def user(client, request):
+    """
+    Signs up a fresh user and logs the client in as them.
+    """
+    username = f"user{abs(hash(request.node.nodeid)) % 10**8}"
+    credentials = {"email": f"{username}@example.com", "password": PASSWORD}
+    response = client.post("/auth/signup", data={"username": username, **credentials})
+    assert response.status_code == 201, response.text
+    response = client.post("/auth/login", data=credentials)
+    assert response.status_code == 200, response.text
+    yield {"id": response.json()["id"], "username": username, **credentials}
+    client.post("/auth/logout")
+
+
+@pytest.fixture
+def create_plans(client):
+    """
+    Creates meal plans with their answers for a user, as the chat would.
+
+    Returns a function taking the user ID and the number of plans, and
+    returning the new plan IDs.
+    """
+
+    def create(user_id: str, count: int, answer: str = "answer") -> list[UUID]:
+        async def run() -> list[UUID]:
+            plan_ids = []
+            for n in range(count):
+                rows = [
+                    {
+                        "id": uuid4(),
+                        "user_id": UUID(user_id),
+                        "catalog_id": entry.id,
+                        "answer": f"{answer} {n}",
+                    }
+                    for entry in get_question_catalog().current(PlanType.MEAL)
+                ]
+                await write_questions(rows)
+                async with AsyncSessionLocal() as async_session:
+                    plan = await create_plan(
+                        async_session,
+                        UUID(user_id),
+                        f"Plan {n}",
+                        PlanType.MEAL,
+                        question_ids=[row["id"] for row in rows],
+                    )
+                plan_ids.append(plan.id)
+            return plan_ids
+
+        return client.portal.call(run)
+
+    return create
+
+
+@pytest.fixture
+def statements():
+    """
+    Collects the SQL statements run on the primary and read engines, leaving out
+    the `BEGIN` the SQLite engines issue themselves.
+    """
+    collected: list[str] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany) -> None:
+        if not statement.startswith("BEGIN"):
+            collected.append(statement)
+
+    engines = {get_async_engine(), get_async_read_engine()}
+    for engine in engines:
+        event.listen(engine.sync_engine, "before_cursor_execute", record)
+    yield collected
+    for engine in engines:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+
+class FakeOpenAIClient:
+    """
+    Stands in for `OpenAIClient`, answering from the message instead of a model.
+    """
+
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+
+    def get_plan_choice(self, message: str) -> PlanType | None:
+        self.calls.append("get_plan_choice")
+        return {plan_type.value: plan_type for plan_type in PlanType}.get(message)
+
+    def generate_meal_plan(self, answers: dict[str, str]) -> str:
+        self.calls.append("generate_meal_plan")
+        return "Meal plan: " + ", ".join(answers.values())
+
+    def generate_workout_plan(self, answers: dict[str, str]) -> str:
+        self.calls.append("generate_workout_plan")
+        return "Workout plan: " + ", ".join(answers.values())
+
+
+@pytest.fixture
+def openai_client(monkeypatch):
+    fake = FakeOpenAIClient()
+    monkeypatch.setattr(planner_views, "get_openai_client", lambda: fake)
+    return fake
@@ -0,0 +1,37 @@
+import json
+
+from app.auth.bulk_import import import_users
+from app.db.config import AsyncSessionLocal
+
+
+def test_malformed_jsonl_lines_are_reported(client, tmp_path):
+    path = tmp_path / "users.jsonl"
+    records = [
+        {
+            "username": "import1",
+            "email": "import1@example.com",
+            "password": "Passw0rd!",
+        },
+        {
+            "username": "import2",
+            "email": "import2@example.com",
+            "password": "Passw0rd!",
+        },
+    ]
+    path.write_text(
+        "\n".join(
+            [json.dumps(records[0]), '{"username": "broken",', json.dumps(records[1])]
+        )
+    )
+
+    async def run():
+        async with AsyncSessionLocal() as session:
+            return await import_users(session, path, batch_size=1)
+
+    report = client.portal.call(run)
+    # The import carries on past the bad line, in a later batch than the first
+    assert report.inserted == 2
+    assert report.conflicts == []
+    [invalid] = report.invalid
+    assert invalid["line"] == 2
+    assert invalid["errors"][0]["type"] == "json_invalid"
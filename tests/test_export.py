@@ -0,0 +1,61 @@
+import gzip
+import json
+from uuid import UUID, uuid4
+
+from app.db.enums import PlanType
+from app.planner.crud import write_questions
+from app.planner.questions import get_question_catalog
+
+
+def export(client, **params) -> list[dict]:
+    response = client.get("/planner/plans/export", params=params)
+    assert response.status_code == 200, response.text
+    body = response.content
+    if params.get("compress"):
+        assert response.headers["content-type"] == "application/gzip"
+        body = gzip.decompress(body)
+    else:
+        assert response.headers["content-type"] == "application/x-ndjson"
+    return [json.loads(line) for line in body.splitlines()]
+
+
+def test_export_streams_plans_then_unassigned_answers(client, user, create_plans):
+    plan_ids = create_plans(user["id"], 3)
+    [entry, *_] = get_question_catalog().current(PlanType.MEAL)
+    unassigned = {
+        "id": uuid4(),
+        "user_id": UUID(user["id"]),
+        "catalog_id": entry.id,
+        "answer": "abandoned",
+    }
+    client.portal.call(write_questions, [unassigned])
+
+    records = export(client)
+    plans, answers = records[:3], records[3:]
+    assert sorted(plan["id"] for plan in plans) == sorted(map(str, plan_ids))
+    questions = len(get_question_catalog().current(PlanType.MEAL))
+    assert all(len(plan["questions"]) == questions for plan in plans)
+    assert [answer["id"] for answer in answers] == [str(unassigned["id"])]
+
+    assert export(client, compress=True) == records
+
+
+def test_export_statements_do_not_grow_with_plans(
+    client, user, create_plans, statements
+):
+    create_plans(user["id"], 1)
+    # Once the principal is cached, only the export's own queries are left
+    export(client)
+    statements.clear()
+    export(client)
+    one_plan = len(statements)
+
+    create_plans(user["id"], 5)
+    statements.clear()
+    assert len(export(client)) == 6
+    assert len(statements) == one_plan, statements
+
+
+def test_export_requires_login(client):
+    response = client.get("/planner/plans/export")
+    assert response.status_code == 401
@@ -0,0 +1,56 @@
+"""
+Import-time budget for the application and the CLI.
+
+Heavy libraries are loaded on first use or in the lifespan, so that workers and
+CLI commands start quickly. These tests import `app.main` and `manage` in fresh
+interpreters under `python -X importtime`, fail if one of those libraries was
+imported, and check the import time against a budget that is generous enough for
+a slow CI machine but still catches a library creeping back into the imports.
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Loaded on first use, or in the lifespan, never by importing the application
+DEFERRED = ("alembic", "numpy", "openai", "passlib")
+
+RUNS = 3
+
+
+def import_times(module: str) -> dict[str, tuple[int, int]]:
+    """
+    Imports a module in a fresh interpreter.
+
+    Returns:
+        dict[str, tuple[int, int]]: Self and cumulative import time per module, in
+        microseconds.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=os.environ,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = int(own), int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize("module, budget_ms", [("app.main", 5000), ("manage", 2000)])
+def test_import_time(module, budget_ms):
+    samples = [import_times(module) for _ in range(RUNS)]
+
+    imported = sorted(name for name in DEFERRED if name in samples[-1])
+    assert imported == [], f"{module} imports modules that should load on first use"
+
+    # The fastest run, so a busy machine doesn't fail the budget
+    took_ms = min(times[module][1] for times in samples) / 1000
+    assert took_ms <= budget_ms, f"{module} took {took_ms:.0f} ms to import"
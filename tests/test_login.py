@@ -0,0 +1,47 @@
+from passlib.hash import bcrypt
+from sqlalchemy import select, update
+
+from app.db.config import AsyncSessionLocal
+from app.db.models import User
+
+
+def set_password_hash(client, username: str, password_hash: str) -> None:
+    async def write() -> None:
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(User)
+                .filter_by(username=username)
+                .values(password_hash=password_hash)
+            )
+            await session.commit()
+
+    client.portal.call(write)
+
+
+def get_password_hash(client, username: str) -> str:
+    async def read() -> str:
+        async with AsyncSessionLocal() as session:
+            return await session.scalar(
+                select(User.password_hash).filter_by(username=username)
+            )
+
+    return client.portal.call(read)
+
+
+def test_login_rehashes_outdated_passwords(client, user, statements):
+    set_password_hash(
+        client, user["username"], bcrypt.using(rounds=5).hash(user["password"])
+    )
+    statements.clear()
+
+    response = client.post(
+        "/auth/login", data={"email": user["email"], "password": user["password"]}
+    )
+    assert response.status_code == 200, response.text
+    # The lookup and the plans on the read session, and the new hash on its own
+    assert [statement.split()[0] for statement in statements] == [
+        "SELECT",
+        "UPDATE",
+        "SELECT",
+    ]
+    assert bcrypt.from_string(get_password_hash(client, user["username"])).rounds == 4
@@ -0,0 +1,42 @@
+from uuid import UUID
+
+from app.db.config import AsyncSessionLocal
+from app.planner.crud import delete_plans_by_user_id
+
+
+def test_matching_etag_is_not_modified(client, user, create_plans, statements):
+    [plan_id] = create_plans(user["id"], 1)
+    response = client.get(f"/planner/plans/{plan_id}")
+    assert response.status_code == 200, response.text
+    etag = response.headers["ETag"]
+    assert "immutable" in response.headers["Cache-Control"]
+
+    # Answered from the cached body, without loading the plan
+    statements.clear()
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}'):
+        response = client.get(
+            f"/planner/plans/{plan_id}", headers={"If-None-Match": if_none_match}
+        )
+        assert response.status_code == 304, if_none_match
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+    assert statements == []
+
+    response = client.get(
+        f"/planner/plans/{plan_id}", headers={"If-None-Match": '"other"'}
+    )
+    assert response.status_code == 200
+    assert response.json()["id"] == str(plan_id)
+
+
+def test_deleted_plan_is_not_found_despite_its_etag(client, user, create_plans):
+    [plan_id] = create_plans(user["id"], 1)
+    etag = client.get(f"/planner/plans/{plan_id}").headers["ETag"]
+
+    async def delete() -> None:
+        async with AsyncSessionLocal() as async_session:
+            await delete_plans_by_user_id(async_session, UUID(user["id"]))
+
+    client.portal.call(delete)
+    response = client.get(f"/planner/plans/{plan_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 404
@@ -0,0 +1,39 @@
+import asyncio
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db.telemetry import InstrumentedAsyncQueuePool, pool_status
+
+CONNECT_SECONDS = 0.2
+
+
+def test_connect_time_is_not_counted_as_waiting(tmp_path):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_size=2,
+    )
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def slow_connect(dbapi_connection, connection_record):
+        time.sleep(CONNECT_SECONDS)
+
+    async def query_twice() -> dict:
+        # Both checkouts of a cold pool open a connection; nothing is contended
+        async def query() -> None:
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+
+        await asyncio.gather(query(), query())
+        # Disposing replaces the pool, and its telemetry with it
+        status = pool_status(engine.pool)
+        await engine.dispose()
+        return status
+
+    status = asyncio.run(query_twice())
+    assert status["checkouts"] == 2
+    assert status["connects"] == 2
+    assert status["connect_seconds_max"] >= CONNECT_SECONDS
+    assert status["wait_seconds_max"] < CONNECT_SECONDS / 2
@@ -0,0 +1,23 @@
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.core.profiling import ProfilingMiddleware
+
+
+def profiled_client(directory: str) -> TestClient:
+    app = Starlette(routes=[Route("/", lambda request: PlainTextResponse("ok"))])
+    app.add_middleware(ProfilingMiddleware, directory=directory, token="secret")
+    return TestClient(app)
+
+
+def test_token_is_only_accepted_in_the_header(tmp_path):
+    client = profiled_client(str(tmp_path))
+
+    response = client.get("/", params={"profile": "secret"})
+    assert "x-profile-file" not in response.headers
+    assert not list(tmp_path.iterdir())
+
+    response = client.get("/", headers={"X-Profile-Token": "secret"})
+    assert (tmp_path / response.headers["x-profile-file"]).exists()
@@ -0,0 +1,67 @@
+"""
+Statement counts for the main endpoints.
+
+Relationships raise on lazy loads in the tests (`DB_RAISE_ON_LAZY_LOAD`), so
+an endpoint that forgets a loader option fails outright; these counts catch the
+opposite mistake, an endpoint whose queries grow with the data it returns.
+"""
+
+
+def test_signup(client, statements):
+    response = client.post(
+        "/auth/signup",
+        data={
+            "username": "signup1",
+            "email": "signup1@example.com",
+            "password": "Passw0rd!",
+        },
+    )
+    assert response.status_code == 201, response.text
+    assert len(statements) == 1, statements
+
+
+def test_login(client, user, statements):
+    response = client.post(
+        "/auth/login", data={"email": user["email"], "password": user["password"]}
+    )
+    assert response.status_code == 200, response.text
+    # The user, then their plans; there are no answers to load
+    assert len(statements) == 2, statements
+
+
+def test_login_with_plans(client, user, statements, create_plans):
+    create_plans(user["id"], 3)
+    statements.clear()
+    response = client.post(
+        "/auth/login", data={"email": user["email"], "password": user["password"]}
+    )
+    assert response.status_code == 200, response.text
+    assert len(response.json()["plans"]) == 3
+    # The user, their plans, then the answers of all of them at once
+    assert len(statements) == 3, statements
+
+
+def test_plan_list(client, user, statements, create_plans):
+    create_plans(user["id"], 3)
+    statements.clear()
+    response = client.get("/planner/plans/")
+    assert response.status_code == 200, response.text
+    assert len(response.json()) == 3
+    # The principal, then the plans and their answers, however many plans there are
+    assert len(statements) == 3, statements
+
+
+def test_plan_detail(client, user, statements, create_plans):
+    [plan_id] = create_plans(user["id"], 1)
+    statements.clear()
+    response = client.get(f"/planner/plans/{plan_id}")
+    assert response.status_code == 200, response.text
+    assert len(response.json()["questions"]) > 0
+    # The principal, the plan, then its answers
+    assert len(statements) == 3, statements
+
+    # Served from the principal and plan body caches
+    statements.clear()
+    response = client.get(f"/planner/plans/{plan_id}")
+    assert response.status_code == 200, response.text
+    assert len(statements) == 0, statements
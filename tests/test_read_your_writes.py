@@ -0,0 +1,115 @@
+import asyncio
+import sqlite3
+import time
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core.config import get_settings
+from app.db import config as db_config
+from app.db.config import (
+    LAST_WRITE_KEY,
+    AsyncReadSessionLocal,
+    AsyncSessionLocal,
+    ReadYourWritesMiddleware,
+    get_read_session_factory,
+    mark_recent_write,
+    utcnow,
+)
+from app.db.enums import PlanType
+from app.db.models import User
+from app.planner.questions import get_question_catalog
+
+
+def serve(session: dict, write: bool = False):
+    """
+    Runs a request with the given session, returning the factory its reads use.
+    """
+    factories = []
+
+    async def app(scope, receive, send):
+        if write:
+            # No users are given, so no session is needed
+            await mark_recent_write(None)
+        factories.append(await get_read_session_factory())
+
+    asyncio.run(
+        ReadYourWritesMiddleware(app)({"type": "http", "session": session}, None, None)
+    )
+    return factories[0]
+
+
+def test_reads_follow_the_last_write_in_the_session(monkeypatch):
+    monkeypatch.setattr(get_settings(), "database_read_url", "sqlite:///replica.db")
+    session = {}
+    assert serve(session) is AsyncReadSessionLocal
+
+    # The write is recorded in the client's session, which a later request to
+    # any worker carries
+    assert serve(session, write=True) is AsyncSessionLocal
+    assert serve(dict(session)) is AsyncSessionLocal
+
+    session[LAST_WRITE_KEY] = time.time() - get_settings().read_your_writes_seconds
+    assert serve(session) is AsyncReadSessionLocal
+
+
+def test_writes_are_not_recorded_without_a_replica():
+    session = {}
+    serve(session, write=True)
+    assert session == {}
+
+
+@pytest.fixture
+def replica(client, user, monkeypatch, tmp_path):
+    """
+    Routes reads to a replica that stopped replicating once the user signed up.
+    """
+    primary = get_settings().database_url.split("///", 1)[1]
+    with sqlite3.connect(primary) as source, sqlite3.connect(
+        tmp_path / "replica.db"
+    ) as target:
+        source.backup(target)
+    url = f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}"
+    engine = create_async_engine(url)
+    monkeypatch.setattr(get_settings(), "database_read_url", url)
+    monkeypatch.setattr(
+        db_config,
+        "AsyncReadSessionLocal",
+        async_sessionmaker(engine, autoflush=False, expire_on_commit=False),
+    )
+    yield
+    client.portal.call(engine.dispose)
+
+
+def test_plans_created_over_the_websocket_are_read_back(
+    client, user, openai_client, replica
+):
+    token = client.get("/planner/get-ws-token").json()["token"]
+    with client.websocket_connect(f"/planner/ws/{token}") as websocket:
+        websocket.receive_text()
+        websocket.send_text("meal")
+        for _ in get_question_catalog().current(PlanType.MEAL):
+            websocket.receive_text()
+            websocket.send_text("rice")
+        assert websocket.receive_text().startswith("Meal plan")
+
+    # The WebSocket never sets the cookie, so the write is found on the user
+    [plan] = client.get("/planner/plans/").json()
+    response = client.get(f"/planner/plans/{plan['id']}")
+    assert response.status_code == 200, response.text
+
+    async def age_last_write() -> None:
+        window = timedelta(seconds=get_settings().read_your_writes_seconds)
+        async with AsyncSessionLocal() as async_session:
+            await async_session.execute(
+                update(User)
+                .filter_by(username=user["username"])
+                .values(last_write_at=utcnow() - window)
+            )
+            await async_session.commit()
+
+    # Once the window has passed, reads go to the lagging replica again
+    client.portal.call(age_last_write)
+    assert client.get("/planner/plans/").json() == []
@@ -0,0 +1,73 @@
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import threading
+
+from sqlalchemy import text
+
+from app.core.config import get_settings
+from app.db.config import get_async_engine
+from app.planner import retention
+
+
+def test_cancelled_pass_releases_its_connection(client, monkeypatch):
+    started = asyncio.Event()
+
+    async def slow_pass(async_session):
+        await async_session.execute(text("SELECT 1"))
+        started.set()
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(retention, "run_retention", slow_pass)
+    monkeypatch.setattr(get_settings(), "retention_interval_seconds", 0.01)
+    monkeypatch.setattr(get_settings(), "retention_orphan_answer_hours", 1)
+
+    async def stop_mid_pass() -> int:
+        task = retention.start_retention_task()
+        await asyncio.wait_for(started.wait(), 5)
+        assert get_async_engine().pool.checkedout() == 1
+        # As the lifespan does before disposing the engine
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return get_async_engine().pool.checkedout()
+
+    assert client.portal.call(stop_mid_pass) == 0
+
+
+def test_retention_process_stops_on_sigterm(client):
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            "from app.core.server import run_retention_process\n"
+            "run_retention_process()",
+        ],
+        env={
+            **os.environ,
+            "RETENTION_INTERVAL_SECONDS": "0.05",
+            "RETENTION_ORPHAN_ANSWER_HOURS": "1",
+        },
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+    # Unblocks the read below should the process hang before a pass
+    watchdog = threading.Timer(30, process.kill)
+    watchdog.start()
+    try:
+        for line in process.stdout:
+            if "Retention pass complete" in line:
+                break
+        else:
+            raise AssertionError("The retention process exited before a pass")
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(timeout=10) == 0
+    finally:
+        watchdog.cancel()
+        process.kill()
+        process.stdout.close()
@@ -0,0 +1,53 @@
+from app.db.enums import PlanType
+from app.planner.questions import get_question_catalog
+
+
+def search(client, q: str, **params) -> list[dict]:
+    response = client.get("/planner/plans/search", params={"q": q, **params})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_answers_are_found_with_their_plan(client, user, create_plans):
+    plan_ids = create_plans(user["id"], 2, answer="quinoa")
+    hits = search(client, "quinoa")
+    # Every answer of both plans, each resolved to its plan
+    assert len(hits) == 2 * len(get_question_catalog().current(PlanType.MEAL))
+    assert {hit["kind"] for hit in hits} == {"answer"}
+    assert {hit["plan_id"] for hit in hits} == {str(plan_id) for plan_id in plan_ids}
+    assert all("[quinoa]" in hit["snippet"] for hit in hits)
+
+    assert len(search(client, "quinoa", limit=3)) == 3
+    assert len(search(client, "quinoa", limit=3, offset=len(hits) - 1)) == 1
+
+
+def test_plans_are_found_by_description(client, user, create_plans):
+    [plan_id] = create_plans(user["id"], 1)
+    [hit] = search(client, "plan")
+    assert hit["kind"] == "plan"
+    assert hit["plan_id"] == str(plan_id)
+    assert hit["question_id"] is None
+
+
+def test_search_only_covers_the_users_own_documents(client, user, create_plans):
+    response = client.post(
+        "/auth/signup",
+        data={
+            "username": f"other{user['username']}",
+            "email": f"other{user['email']}",
+            "password": user["password"],
+        },
+    )
+    assert response.status_code == 201, response.text
+    create_plans(response.json()["id"], 1, answer="couscous")
+
+    assert search(client, "couscous") == []
+    [plan_id] = create_plans(user["id"], 1, answer="couscous")
+    assert {hit["plan_id"] for hit in search(client, "couscous")} == {str(plan_id)}
+
+
+def test_query_syntax_is_not_interpreted(client, user, create_plans):
+    create_plans(user["id"], 1, answer="quinoa")
+    # Quotes and operators are dropped rather than failing the query
+    assert search(client, 'quinoa"*') != []
+    assert search(client, '"*') == []
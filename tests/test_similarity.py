@@ -0,0 +1,54 @@
+from uuid import uuid4
+
+import pytest
+
+from app.planner.similarity import AnswerSimilarityIndex
+
+RESTRICTIONS = "Do you have any dietary restrictions or allergies?"
+QUESTIONS = [
+    "What is your weekly budget for groceries?",
+    "What are your preferred foods or ingredients?",
+    RESTRICTIONS,
+    "How much time do you have available for cooking each day?",
+]
+ANSWERS = {
+    QUESTIONS[0]: "5000 naira",
+    QUESTIONS[1]: "rice, beans, plantain",
+    RESTRICTIONS: "no pork no beef",
+    QUESTIONS[3]: "30 minutes",
+}
+
+
+def build_index(user_id, answers) -> tuple[AnswerSimilarityIndex, object]:
+    index = AnswerSimilarityIndex(QUESTIONS, 100, [RESTRICTIONS])
+    plan_id = uuid4()
+    index.add(plan_id, user_id, answers)
+    return index, plan_id
+
+
+def test_same_answers_match():
+    user_id = uuid4()
+    index, plan_id = build_index(user_id, ANSWERS)
+    reordered = {**ANSWERS, RESTRICTIONS: "No beef, no pork"}
+    assert index.nearest(user_id, reordered) == (plan_id, pytest.approx(0, abs=1e-6))
+
+
+def test_plans_of_other_users_never_match():
+    index, _ = build_index(uuid4(), ANSWERS)
+    assert index.nearest(uuid4(), ANSWERS) is None
+
+
+@pytest.mark.parametrize(
+    "stored, asked",
+    [
+        ("no pork no beef", "no pork no beef no shellfish"),
+        (
+            "lactose intolerant, no pork, no beef",
+            "lactose intolerant, no pork, no beef, shellfish allergy",
+        ),
+    ],
+)
+def test_one_more_restriction_does_not_match(stored, asked):
+    user_id = uuid4()
+    index, _ = build_index(user_id, {**ANSWERS, RESTRICTIONS: stored})
+    assert index.nearest(user_id, {**ANSWERS, RESTRICTIONS: asked}) is None
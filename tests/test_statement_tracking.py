@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy import select
+
+from app.core.metrics import db_statements_per_unit
+from app.db.config import AsyncReadSessionLocal
+from app.db.enums import PlanType
+from app.db.models import User
+from app.db.telemetry import RepeatedStatementError, track_statements
+from app.planner.questions import get_question_catalog
+from app.planner.views import WEBSOCKET_ROUTE
+
+
+def observations(unit: str, route: str) -> int:
+    return sum(db_statements_per_unit.labels(unit, route).counts)
+
+
+def test_repeated_statement_raises(client, user):
+    async def query_per_row() -> None:
+        with track_statements("test", "n+1"):
+            async with AsyncReadSessionLocal() as session:
+                for _ in range(21):
+                    await session.execute(
+                        select(User.id).filter_by(username=user["username"])
+                    )
+
+    with pytest.raises(RepeatedStatementError, match="n\\+1"):
+        client.portal.call(query_per_row)
+
+
+def test_each_websocket_message_is_a_unit(client, user, openai_client):
+    questions = len(get_question_catalog().current(PlanType.MEAL))
+    messages = observations("websocket", WEBSOCKET_ROUTE)
+    flushes = observations("write_behind", "questions")
+
+    token = client.get("/planner/get-ws-token").json()["token"]
+    with client.websocket_connect(f"/planner/ws/{token}") as websocket:
+        websocket.receive_text()
+        websocket.send_text("meal")
+        for _ in range(questions):
+            websocket.receive_text()
+            websocket.send_text("rice")
+        assert websocket.receive_text().startswith("Meal plan")
+
+    # The plan request and every answer, not the connection as a whole
+    assert observations("websocket", WEBSOCKET_ROUTE) - messages == 1 + questions
+    assert observations("write_behind", "questions") > flushes
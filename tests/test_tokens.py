@@ -0,0 +1,34 @@
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from app.core.config import get_settings
+from app.core.utils import verify_jwt_token
+
+
+def get_ws_token(client) -> str:
+    response = client.get("/planner/get-ws-token")
+    assert response.status_code == 200, response.text
+    return response.json()["token"]
+
+
+def test_verified_token_is_bound_to_its_key(client, user):
+    token = get_ws_token(client)
+    assert "error" not in verify_jwt_token(token, get_settings().jwt_secret_key)
+    assert verify_jwt_token(token, "another key") == {"error": "Invalid token"}
+
+
+def test_logout_revokes_tokens(client, user):
+    token = get_ws_token(client)
+    client.post("/auth/logout")
+    client.post(
+        "/auth/login", data={"email": user["email"], "password": user["password"]}
+    )
+
+    with pytest.raises(WebSocketDisconnect) as disconnect:
+        with client.websocket_connect(f"/planner/ws/{token}"):
+            pass
+    assert disconnect.value.reason == "Token has been revoked"
+
+    # Tokens issued after the logout still work
+    with client.websocket_connect(f"/planner/ws/{get_ws_token(client)}") as websocket:
+        assert websocket.receive_text().startswith("Welcome")
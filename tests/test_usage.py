@@ -0,0 +1,67 @@
+import asyncio
+import gc
+from datetime import datetime
+from uuid import UUID, uuid4
+
+from app.core.config import get_settings
+from app.db import write_behind
+from app.planner.usage import UsageLedger, get_usage_ledger
+
+
+def usage_row(user_id: UUID, tokens: int) -> dict:
+    return {
+        "user_id": user_id,
+        "operation": "get_plan_choice",
+        "plan_type": None,
+        "model": "test",
+        "prompt_version": "1",
+        "prompt_tokens": tokens,
+        "completion_tokens": 0,
+        "cached_tokens": 0,
+        "latency_ms": 1.0,
+        "created_at": datetime.utcnow(),
+    }
+
+
+def test_budget_is_checked_before_classifying(client, user, openai_client, monkeypatch):
+    monkeypatch.setattr(get_settings(), "llm_daily_token_budget", 10)
+    monkeypatch.setitem(get_usage_ledger().pending_tokens, UUID(user["id"]), 10)
+
+    token = client.get("/planner/get-ws-token").json()["token"]
+    with client.websocket_connect(f"/planner/ws/{token}") as websocket:
+        websocket.receive_text()
+        websocket.send_text("meal")
+        assert "daily allowance" in websocket.receive_text()
+    assert openai_client.calls == []
+
+
+def test_usage_includes_pending_tokens(client, user, monkeypatch):
+    monkeypatch.setitem(get_usage_ledger().pending_tokens, UUID(user["id"]), 42)
+
+    response = client.get("/planner/usage")
+    assert response.status_code == 200, response.text
+    assert response.json()["tokens_used_today"] == 42
+
+
+def test_failed_usage_write_is_not_reported_as_unretrieved(monkeypatch):
+    # A captured log record of the failure would keep the future alive
+    monkeypatch.setattr(write_behind.logger, "disabled", True)
+    unhandled = []
+
+    async def fail(rows: list[dict]) -> None:
+        raise RuntimeError("database is down")
+
+    async def record() -> None:
+        asyncio.get_running_loop().set_exception_handler(
+            lambda loop, context: unhandled.append(context)
+        )
+        ledger = UsageLedger(max_batch=1, max_delay=0, max_size=10)
+        ledger.queue.flush = fail
+        await ledger.record(usage_row(uuid4(), 5))
+        await ledger.close()
+        # Let the writer task finish, so the future is only referenced here
+        await asyncio.sleep(0)
+        gc.collect()
+
+    asyncio.run(record())
+    assert unhandled == []
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from uuid import UUID
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+
+from app.db.config import AsyncSessionLocal
+from app.db.enums import PlanType
+from app.db.models import Question
+from app.planner.crud import get_answer_queue, queue_question
+from app.planner.questions import get_question_catalog
+
+
+@pytest.fixture
+def quiet_write_behind():
+    # Failed flushes are logged with their traceback, which is expected here
+    logger = logging.getLogger("app.db.write_behind")
+    logger.disabled = True
+    yield
+    logger.disabled = False
+
+
+async def count_answers(user_id: UUID) -> int:
+    async with AsyncSessionLocal() as async_session:
+        return await async_session.scalar(
+            select(func.count()).select_from(Question).filter_by(user_id=user_id)
+        )
+
+
+@pytest.fixture
+def flushes(monkeypatch) -> list[list[dict]]:
+    """
+    Records the batches the answer queue writes.
+    """
+    queue = get_answer_queue()
+    flush = queue.flush
+    batches = []
+
+    async def recording_flush(rows):
+        batches.append(rows)
+        await flush(rows)
+
+    monkeypatch.setattr(queue, "flush", recording_flush)
+    return batches
+
+
+def test_concurrent_answers_share_a_commit(client, user, flushes):
+    user_id = UUID(user["id"])
+    entries = get_question_catalog().current(PlanType.MEAL)
+
+    async def answer_all() -> list[dict]:
+        # As many chats answering at once
+        pending = await asyncio.gather(
+            *(queue_question(user_id, entry.id, "rice") for entry in entries)
+        )
+        return await asyncio.gather(*pending)
+
+    rows = client.portal.call(answer_all)
+    assert [row["catalog_id"] for row in rows] == [entry.id for entry in entries]
+    assert len(flushes) == 1
+    assert len(flushes[0]) == len(entries)
+    assert client.portal.call(count_answers, user_id) == len(entries)
+
+
+def test_close_writes_queued_answers(client, user, flushes):
+    user_id = UUID(user["id"])
+    [entry, *_] = get_question_catalog().current(PlanType.MEAL)
+
+    async def queue_then_close() -> asyncio.Future:
+        future = await queue_question(user_id, entry.id, "rice")
+        # As the lifespan does on shutdown, before disposing the engine
+        await get_answer_queue().close()
+        return future
+
+    future = client.portal.call(queue_then_close)
+    assert future.done() and future.exception() is None
+    assert len(flushes) == 1
+    assert client.portal.call(count_answers, user_id) == 1
+
+
+def answer_questionnaire(websocket, plan_type: PlanType) -> str:
+    websocket.send_text(plan_type.value)
+    for _ in get_question_catalog().current(plan_type):
+        websocket.receive_text()
+        websocket.send_text("rice")
+    return websocket.receive_text()
+
+
+def test_failed_flush_keeps_the_chat_open(
+    client, user, openai_client, monkeypatch, quiet_write_behind
+):
+    queue = get_answer_queue()
+    flush = queue.flush
+    failures = []
+
+    async def failing_flush(rows):
+        if not failures:
+            failures.append(rows)
+            raise OperationalError("INSERT INTO questions", {}, Exception("disk I/O"))
+        await flush(rows)
+
+    monkeypatch.setattr(queue, "flush", failing_flush)
+
+    token = client.get("/planner/get-ws-token").json()["token"]
+    with client.websocket_connect(f"/planner/ws/{token}") as websocket:
+        websocket.receive_text()
+        reply = answer_questionnaire(websocket, PlanType.MEAL)
+        assert reply.startswith("Error processing your request"), reply
+        assert "could not be saved" in reply
+
+        # The chat carries on, and the next questionnaire is saved
+        assert answer_questionnaire(websocket, PlanType.MEAL).startswith("Meal plan")
+    assert failures